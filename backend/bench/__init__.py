@@ -0,0 +1 @@
+"""Бенчмарки горячих путей бэкенда. Запуск из каталога backend: ``python -m bench.<name>``."""
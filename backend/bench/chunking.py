@@ -0,0 +1,69 @@
+"""
+Пропускная способность чанкера на больших Markdown и HTML корпусах.
+
+    cd backend && python -m bench.chunking --mb 16 --docs 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Dict
+
+from server.services.chunking import split_with_metadata
+
+from .corpus import html_doc, markdown_doc
+
+
+def run(
+    mb: float, docs: int, chunk_size: int, overlap: int, seed: int
+) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(seed)
+    per_doc = int(mb * 1024 * 1024 / docs)
+    results: Dict[str, Dict[str, float]] = {}
+    for name, make in (("markdown", markdown_doc), ("html", html_doc)):
+        corpus = [make(rng, per_doc) for _ in range(docs)]
+        size = sum(len(d.encode("utf-8")) for d in corpus)
+        start = time.perf_counter()
+        chunks = sum(
+            len(split_with_metadata(d, chunk_size=chunk_size, overlap=overlap))
+            for d in corpus
+        )
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "mb": size / 1024 / 1024,
+            "seconds": elapsed,
+            "mb_per_sec": size / 1024 / 1024 / elapsed,
+            "chunks": chunks,
+            "chunks_per_sec": chunks / elapsed,
+        }
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    ap.add_argument("--mb", type=float, default=16.0, help="размер каждого корпуса, MB")
+    ap.add_argument("--docs", type=int, default=64, help="число документов в корпусе")
+    ap.add_argument("--chunk-size", type=int, default=800)
+    ap.add_argument("--overlap", type=int, default=120)
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = ap.parse_args()
+
+    results = run(args.mb, args.docs, args.chunk_size, args.overlap, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, r in results.items():
+        print(
+            f"{name:9s} {r['mb']:7.1f} MB  {r['seconds']:7.2f} s  "
+            f"{r['mb_per_sec']:6.2f} MB/s  {r['chunks_per_sec']:9.0f} chunks/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Детерминированный синтетический корпус для бенчмарков: Markdown, HTML и простой
+текст на русском и английском. Один и тот же seed даёт побайтно тот же корпус.
+"""
+
+from __future__ import annotations
+
+import random
+from typing import List, Sequence, Tuple
+
+# (filename, текст, content_type)
+Document = Tuple[str, str, str]
+
+_WORDS = {
+    "ru": (
+        "индекс поиск вектор документ фрагмент запрос ответ модель контекст система "
+        "хранилище ранжирование токен задержка пропускная способность кэш пакет запрос "
+        "сервис настройка метрика данные пользователь источник раздел"
+    ).split(),
+    "en": (
+        "index search vector document fragment query answer model context system "
+        "retrieval ranking embedding chunk token latency throughput cache batch store "
+        "service config metric data user source section"
+    ).split(),
+    # смесь языков в одном предложении (исходный словарь bench.chunking)
+    "mixed": (
+        "индекс поиск вектор документ фрагмент запрос ответ модель контекст система "
+        "retrieval ranking embedding chunk token latency throughput cache batch query"
+    ).split(),
+}
+
+LANGS = ("ru", "en")
+KINDS = ("markdown", "html", "text")
+
+
+def sentence(rng: random.Random, lang: str = "mixed") -> str:
+    words = [rng.choice(_WORDS[lang]) for _ in range(rng.randint(6, 18))]
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "!", "?"])
+
+
+def markdown_doc(rng: random.Random, size: int, lang: str = "mixed") -> str:
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        block = f"{'#' * rng.randint(1, 3)} {sentence(rng, lang)[:-1]}\n\n"
+        for _ in range(rng.randint(2, 5)):
+            if rng.random() < 0.2:
+                block += "\n".join(
+                    f"- {sentence(rng, lang)}" for _ in range(rng.randint(2, 6))
+                )
+            else:
+                block += " ".join(sentence(rng, lang) for _ in range(rng.randint(3, 9)))
+            block += "\n\n"
+        parts.append(block)
+        total += len(block)
+    return "".join(parts)
+
+
+def html_doc(rng: random.Random, size: int, lang: str = "mixed") -> str:
+    words = _WORDS[lang]
+    parts: List[str] = ["<html><body>"]
+    total = 0
+    while total < size:
+        block = f"<h2>{sentence(rng, lang)[:-1]}</h2>\n"
+        for _ in range(rng.randint(2, 5)):
+            sents = " ".join(sentence(rng, lang) for _ in range(rng.randint(3, 9)))
+            block += f'<p class="c{rng.randint(0, 9)}">{sents} &amp; <b>{rng.choice(words)}</b></p>\n'
+        parts.append(block)
+        total += len(block)
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def text_doc(rng: random.Random, size: int, lang: str = "mixed") -> str:
+    parts: List[str] = []
+    total = 0
+    while total < size:
+        para = " ".join(sentence(rng, lang) for _ in range(rng.randint(3, 9))) + "\n\n"
+        parts.append(para)
+        total += len(para)
+    return "".join(parts)
+
+
+_MAKERS = {"markdown": markdown_doc, "html": html_doc, "text": text_doc}
+_EXT = {
+    "markdown": ("md", "text/markdown"),
+    "html": ("html", "text/html"),
+    "text": ("txt", "text/plain"),
+}
+
+
+def documents(
+    n: int,
+    size: int,
+    seed: int = 13,
+    kinds: Sequence[str] = KINDS,
+    langs: Sequence[str] = LANGS,
+) -> List[Document]:
+    """n документов примерно по size символов, виды и языки чередуются по кругу."""
+    rng = random.Random(seed)
+    docs: List[Document] = []
+    for i in range(n):
+        kind = kinds[i % len(kinds)]
+        lang = langs[(i // len(kinds)) % len(langs)]
+        ext, content_type = _EXT[kind]
+        docs.append(
+            (f"doc-{i:05d}-{lang}.{ext}", _MAKERS[kind](rng, size, lang), content_type)
+        )
+    return docs
+
+
+def passages(n: int, seed: int = 13, langs: Sequence[str] = LANGS) -> List[str]:
+    """Короткие тексты размера чанка — для эмбеддингов, BM25 и запросов."""
+    rng = random.Random(seed)
+    return [
+        " ".join(sentence(rng, langs[i % len(langs)]) for _ in range(rng.randint(2, 8)))
+        for i in range(n)
+    ]
@@ -0,0 +1,121 @@
+"""
+Пропускная способность и латентность эмбеддингов: ONNX Runtime против torch (sbert).
+
+    cd backend && python -m bench.embeddings --onnx-path ./models/all-MiniLM-L6-v2-onnx
+
+Модель экспортируется так:
+    optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 <dir>
+Провайдер, который не удалось загрузить, пропускается. Для одной и той же модели
+выводится также максимальное расхождение векторов между провайдерами.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from server.core.config import settings
+from server.services.embeddings import OnnxEmbeddings, SbertEmbeddings
+from server.services.interfaces import Embeddings
+
+from .corpus import passages
+
+
+def _measure(
+    embedder: Embeddings, texts: List[str], batch: int, queries: int
+) -> Dict[str, float]:
+    embedder.embed(texts[:batch])  # прогрев
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch):
+        embedder.embed(texts[i : i + batch])
+    elapsed = time.perf_counter() - start
+
+    latencies = []
+    for text in texts[:queries]:
+        t0 = time.perf_counter()
+        embedder.embed([text])
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return {
+        "texts_per_sec": len(texts) / elapsed,
+        "seconds": elapsed,
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def run(
+    onnx_path: str,
+    model: str,
+    n: int,
+    batch: int,
+    queries: int,
+    threads: int,
+    seed: int,
+) -> Dict[str, Dict[str, float]]:
+    texts = passages(n, seed)
+    providers: Dict[str, Embeddings] = {}
+    try:
+        providers["onnx"] = OnnxEmbeddings(onnx_path, threads=threads)
+    except Exception as exc:  # noqa: BLE001 - бенчмарк просто пропускает провайдер
+        print(f"onnx skipped: {exc}")
+    try:
+        providers["torch"] = SbertEmbeddings(model)
+    except Exception as exc:  # noqa: BLE001
+        print(f"torch skipped: {exc}")
+
+    results = {
+        name: _measure(e, texts, batch, queries) for name, e in providers.items()
+    }
+    if len(providers) == 2:
+        sample = texts[:64]
+        diff = np.abs(
+            np.array(providers["onnx"].embed(sample))
+            - np.array(providers["torch"].embed(sample))
+        )
+        results["onnx"]["max_abs_diff_vs_torch"] = float(diff.max())
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    ap.add_argument("--onnx-path", default=settings.EMBED_ONNX_PATH)
+    ap.add_argument(
+        "--model", default=settings.EMBED_MODEL, help="модель для torch-пути"
+    )
+    ap.add_argument("--texts", type=int, default=2048, help="размер корпуса")
+    ap.add_argument("--batch", type=int, default=64)
+    ap.add_argument(
+        "--queries", type=int, default=200, help="одиночных запросов для латентности"
+    )
+    ap.add_argument("--threads", type=int, default=settings.EMBED_ONNX_THREADS)
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = ap.parse_args()
+
+    results = run(
+        args.onnx_path,
+        args.model,
+        args.texts,
+        args.batch,
+        args.queries,
+        args.threads,
+        args.seed,
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, r in results.items():
+        print(
+            f"{name:6s} {r['texts_per_sec']:9.1f} texts/s  "
+            f"p50 {r['latency_p50_ms']:6.2f} ms  p95 {r['latency_p95_ms']:6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Нагрузочный тест API с фейковым Ollama: открытая модель нагрузки (запросы уходят
+по расписанию с заданным RPS независимо от того, ответили ли предыдущие),
+смесь /chat и /ingest, перцентили по стадиям конвейера и end-to-end.
+
+    cd backend && python -m bench.loadtest --rps 20 --duration 30 --mix chat=0.9,ingest=0.1
+    cd backend && python -m bench.loadtest --url http://localhost:8000 --rps 50
+
+По умолчанию приложение поднимается в этом же процессе (httpx.ASGITransport,
+VECTOR_BACKEND=memory, EMBED_PROVIDER=hash, временный docstore), а OLLAMA_HOST
+указывает на фейковый Ollama в соседнем потоке (uvicorn) с задержкой
+--prefill-ms + --tokens * --token-ms на ответ. С --url нагрузка идёт на внешний
+сервер; чтобы он ходил в фейковый Ollama, запустите его с OLLAMA_HOST из вывода.
+
+Стадии берутся из заголовка Server-Timing (см. server.telemetry.timing).
+Латентность считается от запланированного момента отправки, поэтому задержки
+клиента под перегрузкой не прячутся (coordinated omission).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from .corpus import documents, passages
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def fake_ollama_app(
+    prefill_ms: float,
+    token_ms: float,
+    tokens: int,
+    jitter: float = 0.1,
+    parallel: int = 0,
+) -> Any:
+    """
+    Минимальный /api/generate: ждёт prefill + tokens * token_ms и отвечает текстом.
+    parallel > 0 — как у GPU, пропускная способность общая: когда генераций больше
+    parallel, каждая идёт во столько же раз медленнее.
+    """
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    rng = random.Random(0)
+    active = 0
+
+    @app.post("/api/generate")
+    async def generate(body: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal active
+        delay = max(
+            0.0,
+            (prefill_ms + tokens * token_ms)
+            / 1000
+            * (1 + rng.uniform(-jitter, jitter)),
+        )
+        active += 1
+        try:
+            if parallel <= 0:
+                await asyncio.sleep(delay)
+            while parallel > 0 and delay > 0:
+                await asyncio.sleep(0.005)
+                delay -= 0.005 * min(1.0, parallel / active)
+        finally:
+            active -= 1
+        return {
+            "model": body.get("model"),
+            "response": " ".join(["токен"] * tokens),
+            "done": True,
+            "prompt_eval_count": len(str(body.get("prompt", "")).split()),
+            "eval_count": tokens,
+            # как у Ollama: токены всего диалога для следующего хода сессии
+            "context": list(body.get("context") or [])
+            + [0] * (len(str(body.get("prompt", "")).split()) + tokens),
+        }
+
+    @app.post("/api/pull")
+    async def pull() -> Dict[str, str]:
+        return {"status": "success"}
+
+    return app
+
+
+def start_fake_ollama(port: int, **kwargs: Any) -> Any:
+    import uvicorn
+
+    config = uvicorn.Config(
+        fake_ollama_app(**kwargs), host="127.0.0.1", port=port, log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, name="fake-ollama", daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.01)
+    if not server.started:
+        raise RuntimeError("fake Ollama did not start")
+    return server
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """'embed;dur=1.20, llm;dur=30.5' -> {"embed": 1.2, "llm": 30.5} (мс)."""
+    out: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        for p in params.split(";"):
+            key, _, value = p.strip().partition("=")
+            if key == "dur" and name:
+                try:
+                    out[name] = float(value)
+                except ValueError:
+                    pass
+    return out
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.e2e: Dict[str, List[float]] = defaultdict(list)
+        self.stages: Dict[Tuple[str, str], List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        # 429/503 от контроля допуска — отказ, а не ошибка
+        self.shed: Dict[str, int] = defaultdict(int)
+
+    def add(
+        self, kind: str, latency_ms: float, response: Optional[httpx.Response]
+    ) -> None:
+        if response is not None and response.status_code in (429, 503):
+            self.shed[kind] += 1
+            return
+        if response is None or response.status_code >= 400:
+            self.errors[kind] += 1
+            return
+        self.e2e[kind].append(latency_ms)
+        for name, dur in parse_server_timing(
+            response.headers.get("server-timing", "")
+        ).items():
+            self.stages[(kind, name)].append(dur)
+
+
+def _pcts(values: List[float]) -> Dict[str, float]:
+    arr = np.asarray(values)
+    return {
+        "count": int(arr.size),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+    }
+
+
+def summarize(rec: Recorder, elapsed: float, slo_ms: float = 0.0) -> Dict[str, Any]:
+    done = sum(len(v) for v in rec.e2e.values())
+    # goodput — успешные ответы, уложившиеся в SLO (без SLO — все успешные)
+    good = sum(sum(1 for x in v if not slo_ms or x <= slo_ms) for v in rec.e2e.values())
+    return {
+        "elapsed_sec": elapsed,
+        "throughput_rps": done / elapsed if elapsed > 0 else 0.0,
+        "goodput_rps": good / elapsed if elapsed > 0 else 0.0,
+        "errors": dict(rec.errors),
+        "shed": dict(rec.shed),
+        "end_to_end": {kind: _pcts(v) for kind, v in sorted(rec.e2e.items())},
+        "stages": {
+            f"{kind}.{name}": _pcts(v)
+            for (kind, name), v in sorted(rec.stages.items())
+            if v
+        },
+    }
+
+
+def _parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {"chat", "ingest"}
+    if unknown:
+        raise ValueError(f"unknown request kinds in --mix: {sorted(unknown)}")
+    return mix
+
+
+async def _one(
+    client: httpx.AsyncClient, kind: str, payload: Any, rec: Recorder, scheduled: float
+) -> None:
+    response: Optional[httpx.Response] = None
+    try:
+        if kind == "chat":
+            response = await client.post("/chat", json=payload)
+        else:
+            response = await client.post("/ingest", files={"file": payload})
+    except httpx.HTTPError:
+        response = None
+    rec.add(kind, (time.perf_counter() - scheduled) * 1000, response)
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    rps: float,
+    duration: float,
+    mix: Dict[str, float],
+    seed: int,
+    warmup_docs: int,
+    slo_ms: float = 0.0,
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    for filename, text, ctype in documents(warmup_docs, 16 * 1024, seed):
+        r = await client.post(
+            "/ingest", files={"file": (filename, text.encode(), ctype)}
+        )
+        r.raise_for_status()
+
+    questions = passages(512, seed + 1)
+    docs = documents(256, 8 * 1024, seed + 2)
+    kinds, weights = zip(*mix.items())
+    rec = Recorder()
+    tasks: List[asyncio.Task[None]] = []
+    start = time.perf_counter()
+    next_at = start
+    i = 0
+    while next_at - start < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = rng.choices(kinds, weights)[0]
+        payload: Any
+        if kind == "chat":
+            payload = {"question": questions[i % len(questions)][:300], "top_k": 6}
+        else:
+            name, text, ctype = docs[i % len(docs)]
+            payload = (f"load-{i}-{name}", text.encode(), ctype)
+        tasks.append(asyncio.create_task(_one(client, kind, payload, rec, next_at)))
+        i += 1
+        # пуассоновский поток: экспоненциальные интервалы со средним 1/rps
+        next_at += rng.expovariate(rps)
+    await asyncio.gather(*tasks)
+    return summarize(rec, time.perf_counter() - start, slo_ms)
+
+
+def _configure_env(tmp: str, ollama_host: str) -> None:
+    os.environ.setdefault("VECTOR_BACKEND", "memory")
+    os.environ.setdefault("EMBED_PROVIDER", "hash")
+    os.environ.setdefault("DOCSTORE_PATH", os.path.join(tmp, "chunks"))
+    os.environ.setdefault("EMBED_PROJECTION_PATH", os.path.join(tmp, "projection.npz"))
+    os.environ["LLM_PROVIDER"] = "ollama"
+    os.environ["OLLAMA_HOST"] = ollama_host
+
+
+def _print(report: Dict[str, Any]) -> None:
+    print(
+        f"elapsed {report['elapsed_sec']:.1f} s, throughput {report['throughput_rps']:.1f} rps, "
+        f"goodput {report['goodput_rps']:.1f} rps, errors {report['errors'] or 0}, "
+        f"shed {report['shed'] or 0}"
+    )
+    for section in ("end_to_end", "stages"):
+        print(f"\n{section}:")
+        for name, p in report[section].items():
+            print(
+                f"  {name:24s} n={p['count']:<6d} p50 {p['p50_ms']:8.2f}  "
+                f"p95 {p['p95_ms']:8.2f}  p99 {p['p99_ms']:8.2f} ms"
+            )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    ap.add_argument(
+        "--url", help="нагружать внешний сервер вместо in-process приложения"
+    )
+    ap.add_argument(
+        "--rps", type=float, default=20.0, help="целевая интенсивность, запросов/с"
+    )
+    ap.add_argument(
+        "--duration", type=float, default=30.0, help="длительность, секунды"
+    )
+    ap.add_argument("--mix", default="chat=0.9,ingest=0.1", help="доли типов запросов")
+    ap.add_argument(
+        "--warmup-docs", type=int, default=30, help="документов до начала замера"
+    )
+    ap.add_argument(
+        "--prefill-ms", type=float, default=50.0, help="фейковый Ollama: prefill"
+    )
+    ap.add_argument(
+        "--token-ms", type=float, default=5.0, help="фейковый Ollama: на токен"
+    )
+    ap.add_argument(
+        "--tokens", type=int, default=64, help="фейковый Ollama: токенов в ответе"
+    )
+    ap.add_argument(
+        "--ollama-parallel",
+        type=int,
+        default=0,
+        help="фейковый Ollama: сколько генераций идут без замедления (0 — без предела)",
+    )
+    ap.add_argument(
+        "--slo-ms", type=float, default=0.0, help="порог для goodput (0 — без SLO)"
+    )
+    ap.add_argument(
+        "--no-fake-ollama", action="store_true", help="не поднимать фейковый Ollama"
+    )
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = ap.parse_args()
+    mix = _parse_mix(args.mix)
+
+    ollama_host = os.environ.get("OLLAMA_HOST", "")
+    if not args.no_fake_ollama:
+        port = _free_port()
+        start_fake_ollama(
+            port,
+            prefill_ms=args.prefill_ms,
+            token_ms=args.token_ms,
+            tokens=args.tokens,
+            parallel=args.ollama_parallel,
+        )
+        ollama_host = f"http://127.0.0.1:{port}"
+        if args.url:
+            print(f"fake Ollama: OLLAMA_HOST={ollama_host}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        client_kwargs: Dict[str, Any] = {"timeout": 300.0}
+        if args.url:
+            client_kwargs["base_url"] = args.url.rstrip("/")
+        else:
+            _configure_env(tmp, ollama_host)
+            from server.main import app  # после настройки окружения
+
+            client_kwargs["transport"] = httpx.ASGITransport(app=app)
+            client_kwargs["base_url"] = "http://loadtest"
+
+        async def run() -> Dict[str, Any]:
+            async with httpx.AsyncClient(**client_kwargs) as client:
+                return await drive(
+                    client,
+                    args.rps,
+                    args.duration,
+                    mix,
+                    args.seed,
+                    args.warmup_docs,
+                    args.slo_ms,
+                )
+
+        report = asyncio.run(run())
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Второй этап каскада rerank: late interaction (MaxSim) против CrossEncoder.
+
+    cd backend && python -m bench.rerank
+    cd backend && python -m bench.rerank --onnx-path ./models/all-MiniLM-L6-v2-onnx
+
+Для каждого формата хранения токенов (int8 / float16 / float32) — байты на чанк
+в docstore (npz на диске) и латентность скоринга ``--candidates`` кандидатов:
+чтение токенов из docstore + MaxSim, а с ONNX-моделью ещё и кодирование вопроса.
+Без модели токены синтетические: ``--tokens`` нормированных векторов ``--dim``.
+CrossEncoder замеряется на тех же текстах, если sentence-transformers и модель
+доступны; иначе пропускается.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from server.core.config import settings
+from server.db.docstore import LocalDocStore
+from server.services.embeddings import OnnxEmbeddings
+from server.services.interfaces import Embeddings
+from server.services.late_interaction import DTYPES, LateInteractionReranker, maxsim
+from server.services.packing import Candidate
+
+from .corpus import passages
+
+
+class _SyntheticTokens(Embeddings):
+    """Случайные нормированные токены: ~1 токен на 5 символов, не больше max_tokens."""
+
+    def __init__(self, dim: int, max_tokens: int, seed: int):
+        self.dim = dim
+        self.max_tokens = max_tokens
+        self.rng = np.random.default_rng(seed)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def embed_tokens(self, texts: List[str]) -> List[np.ndarray]:
+        out = []
+        for text in texts:
+            n = max(1, min(self.max_tokens, len(text) // 5))
+            mat = self.rng.normal(size=(n, self.dim)).astype(np.float32)
+            out.append(mat / np.linalg.norm(mat, axis=1, keepdims=True))
+        return out
+
+
+def _latency_ms(fn: Callable[[int], Any], n: int) -> Dict[str, float]:
+    fn(0)  # прогрев
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+    }
+
+
+def run(
+    onnx_path: str,
+    ce_model: str,
+    chunks: int,
+    candidates: int,
+    queries: int,
+    dim: int,
+    max_tokens: int,
+    seed: int,
+) -> Dict[str, Dict[str, float]]:
+    texts = passages(chunks, seed)
+    questions = [" ".join(t.split()[:8]) for t in passages(queries, seed + 1)]
+    rng = np.random.default_rng(seed)
+    pools = [rng.choice(chunks, size=candidates, replace=False) for _ in range(queries)]
+
+    encoder: Embeddings
+    try:
+        encoder = OnnxEmbeddings(onnx_path)
+    except Exception as exc:  # noqa: BLE001 - без модели токены синтетические
+        print(f"onnx skipped ({exc}), using synthetic tokens dim={dim}")
+        encoder = _SyntheticTokens(dim, max_tokens, seed)
+
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for dtype in DTYPES:
+            docstore = LocalDocStore(os.path.join(tmp, dtype))
+            reranker = LateInteractionReranker(
+                encoder, docstore, dtype=dtype, max_tokens=max_tokens
+            )
+            ids = [f"1:{i}" for i in range(chunks)]
+            reranker.store(ids, texts)
+            disk = sum(e.stat().st_size for e in os.scandir(docstore.tokens_dir))
+            tokens = [docstore.get_tokens(cid) for cid in ids]
+            raw = sum(c.nbytes + s.nbytes for c, s in tokens if c is not None)
+            query = encoder.embed_tokens(questions[:1])[0]
+
+            def score(i: int) -> Any:
+                pool = pools[i % queries]
+                cands = [Candidate(ids[j], texts[j], {}, 0.0) for j in pool]
+                return reranker.score(questions[i % queries], cands)
+
+            def maxsim_only(i: int) -> Any:
+                return maxsim(query, [tokens[j] for j in pools[i % queries]])  # type: ignore[misc]
+
+            results[f"late_{dtype}"] = {
+                "tokens_per_chunk": sum(len(c) for c, _ in tokens if c is not None)
+                / chunks,
+                "bytes_per_chunk": raw / chunks,
+                "disk_bytes_per_chunk": disk / chunks,
+                **_latency_ms(score, queries),
+                "maxsim_only_p50_ms": _latency_ms(maxsim_only, queries)["p50_ms"],
+            }
+
+    try:
+        from server.services.reranker import CrossEncoderReranker
+
+        ce = CrossEncoderReranker(ce_model)
+    except Exception as exc:  # noqa: BLE001 - бенчмарк просто пропускает CrossEncoder
+        print(f"cross_encoder skipped: {exc}")
+    else:
+        results["cross_encoder"] = {
+            "bytes_per_chunk": 0.0,
+            "disk_bytes_per_chunk": 0.0,
+            **_latency_ms(
+                lambda i: ce.score(
+                    questions[i % queries], [texts[j] for j in pools[i % queries]]
+                ),
+                queries,
+            ),
+        }
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    ap.add_argument("--onnx-path", default=settings.EMBED_ONNX_PATH)
+    ap.add_argument("--ce-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    ap.add_argument("--chunks", type=int, default=2000, help="чанков в docstore")
+    ap.add_argument("--candidates", type=int, default=12, help="кандидатов на запрос")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument(
+        "--dim", type=int, default=384, help="размерность синтетических токенов"
+    )
+    ap.add_argument(
+        "--max-tokens", type=int, default=settings.LATE_INTERACTION_MAX_TOKENS
+    )
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--json", action="store_true", help="вывести результат в JSON")
+    args = ap.parse_args()
+
+    results = run(
+        args.onnx_path,
+        args.ce_model,
+        args.chunks,
+        args.candidates,
+        args.queries,
+        args.dim,
+        args.max_tokens,
+        args.seed,
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, r in results.items():
+        maxsim_only = r.get("maxsim_only_p50_ms")
+        print(
+            f"{name:14s} {r['bytes_per_chunk']:8.0f} B/chunk ({r['disk_bytes_per_chunk']:.0f} on disk)"
+            f"  p50 {r['p50_ms']:7.2f} ms  p95 {r['p95_ms']:7.2f} ms"
+            + (
+                f"  (MaxSim only p50 {maxsim_only:.2f} ms)"
+                if maxsim_only is not None
+                else ""
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Набор микро-бенчмарков горячих путей на синтетическом корпусе (bench.corpus).
+
+    cd backend && python -m bench.suite --out bench.json
+    cd backend && python -m bench.suite --compare baseline.json --threshold 0.15
+
+Результат — JSON {"meta": ..., "metrics": {имя: {"value", "unit", "higher_is_better"}}}.
+В режиме --compare текущий прогон (или --current FILE) сравнивается с базовым,
+и процесс завершается с кодом 1, если хоть одна метрика ухудшилась больше порога.
+
+Сервисы поднимаются без внешних зависимостей: VECTOR_BACKEND=memory,
+EMBED_PROVIDER=hash, временный DOCSTORE_PATH, LLM в /chat заменён заглушкой.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from .corpus import documents, passages
+
+Metrics = Dict[str, Dict[str, Any]]
+
+
+def _metric(value: float, unit: str, higher_is_better: bool) -> Dict[str, Any]:
+    return {"value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def _median_seconds(fn: Callable[[], Any], repeat: int) -> float:
+    fn()  # прогрев
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def _latencies_ms(fn: Callable[[Any], Any], args: List[Any]) -> np.ndarray:
+    fn(args[0])
+    out = np.empty(len(args))
+    for i, a in enumerate(args):
+        start = time.perf_counter()
+        fn(a)
+        out[i] = (time.perf_counter() - start) * 1000
+    return out
+
+
+def bench_chunking(scale: float, seed: int) -> Metrics:
+    from server.services.chunking import split_with_metadata
+
+    out: Metrics = {}
+    for kind in ("markdown", "html"):
+        docs = documents(max(1, int(16 * scale)), 64 * 1024, seed, kinds=(kind,))
+        mb = sum(len(text.encode("utf-8")) for _, text, _ in docs) / 1024 / 1024
+        sec = _median_seconds(lambda: [split_with_metadata(t) for _, t, _ in docs], 3)
+        out[f"chunking.{kind}_mb_per_sec"] = _metric(mb / sec, "MB/s", True)
+    return out
+
+
+def bench_embeddings(scale: float, seed: int) -> Metrics:
+    from server.services.embeddings import HashEmbeddings
+
+    texts = passages(max(1, int(4000 * scale)), seed)
+    embedder = HashEmbeddings(384)
+    sec = _median_seconds(lambda: embedder.embed(texts), 3)
+    return {"embeddings.hash_texts_per_sec": _metric(len(texts) / sec, "texts/s", True)}
+
+
+def bench_vectorstore(scale: float, seed: int) -> Metrics:
+    from server.services.vectorstore import InMemoryVectorStore
+
+    rng = np.random.default_rng(seed)
+    n, dim = max(1, int(50_000 * scale)), 384
+    vecs = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [str(i) for i in range(n)]
+    payloads = [{"chunk_id": i} for i in ids]
+
+    def upsert() -> None:
+        InMemoryVectorStore(dim).upsert(ids, vecs, payloads)
+
+    sec = _median_seconds(upsert, 3)
+    store = InMemoryVectorStore(dim)
+    store.upsert(ids, vecs, payloads)
+    queries = list(rng.normal(size=(200, dim)).astype(np.float32))
+    lat = _latencies_ms(lambda q: store.search(q, 10), queries)
+    return {
+        "vectorstore.upsert_vectors_per_sec": _metric(n / sec, "vectors/s", True),
+        "vectorstore.search_p50_ms": _metric(np.percentile(lat, 50), "ms", False),
+        "vectorstore.search_p95_ms": _metric(np.percentile(lat, 95), "ms", False),
+    }
+
+
+def bench_bm25(scale: float, seed: int) -> Metrics:
+    from server.services.bm25 import BM25
+
+    corpus = passages(max(1, int(10_000 * scale)), seed)
+    sec = _median_seconds(lambda: BM25(corpus), 1)
+    index = BM25(corpus)
+    lat = _latencies_ms(lambda q: index.search(q, 10), passages(100, seed + 1))
+    return {
+        "bm25.build_docs_per_sec": _metric(len(corpus) / sec, "docs/s", True),
+        "bm25.search_p50_ms": _metric(np.percentile(lat, 50), "ms", False),
+    }
+
+
+def bench_docstore(scale: float, seed: int) -> Metrics:
+    from server.db.docstore import LocalDocStore
+
+    texts = passages(max(1, int(5000 * scale)), seed)
+    records = [
+        (
+            f"1:{i:016x}",
+            {"meta": {"chunk_id": f"1:{i:016x}", "document_id": 1}, "text": t},
+        )
+        for i, t in enumerate(texts)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LocalDocStore(tmp)
+        start = time.perf_counter()
+        store.bulk_put(records)
+        put_sec = time.perf_counter() - start
+        lat = _latencies_ms(
+            store.get, [cid for cid, _ in records[:: max(1, len(records) // 500)]]
+        )
+    return {
+        "docstore.bulk_put_records_per_sec": _metric(
+            len(records) / put_sec, "records/s", True
+        ),
+        "docstore.get_p50_ms": _metric(np.percentile(lat, 50), "ms", False),
+    }
+
+
+def bench_prompt(scale: float, seed: int) -> Metrics:
+    from server.services.prompting import build_user_prompt, get_system_instruction
+
+    contexts = passages(6, seed)
+    questions = passages(max(1, int(2000 * scale)), seed + 1)
+
+    def build() -> None:
+        for q in questions:
+            build_user_prompt(q, contexts, get_system_instruction())
+
+    sec = _median_seconds(build, 3)
+    return {"prompt.build_us": _metric(sec / len(questions) * 1e6, "us", False)}
+
+
+class _StubLLM:
+    async def generate(self, prompt: str) -> str:
+        return "ответ"
+
+
+def bench_chat(scale: float, seed: int) -> Metrics:
+    import httpx
+
+    from server.api.routers import chat as chat_router
+    from server.main import app
+
+    chat_router.get_llm = lambda: _StubLLM()  # type: ignore[assignment,return-value]
+
+    async def run() -> np.ndarray:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for filename, text, content_type in documents(
+                max(1, int(30 * scale)), 8 * 1024, seed
+            ):
+                files = {"file": (filename, text.encode("utf-8"), content_type)}
+                r = await client.post("/ingest", files=files)
+                r.raise_for_status()
+            questions = passages(max(10, int(200 * scale)), seed + 2)
+            lat = np.empty(len(questions))
+            for i, q in enumerate(questions):
+                start = time.perf_counter()
+                r = await client.post("/chat", json={"question": q[:200], "top_k": 6})
+                r.raise_for_status()
+                lat[i] = (time.perf_counter() - start) * 1000
+            return lat
+
+    lat = asyncio.run(run())
+    return {
+        "chat.e2e_p50_ms": _metric(np.percentile(lat, 50), "ms", False),
+        "chat.e2e_p95_ms": _metric(np.percentile(lat, 95), "ms", False),
+    }
+
+
+BENCHES: Dict[str, Callable[[float, int], Metrics]] = {
+    "chunking": bench_chunking,
+    "embeddings": bench_embeddings,
+    "vectorstore": bench_vectorstore,
+    "bm25": bench_bm25,
+    "docstore": bench_docstore,
+    "prompt": bench_prompt,
+    "chat": bench_chat,
+}
+
+
+def run(
+    scale: float = 1.0, seed: int = 13, only: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    metrics: Metrics = {}
+    for name, fn in BENCHES.items():
+        if only and name not in only:
+            continue
+        metrics.update(fn(scale, seed))
+    return {
+        "meta": {
+            "scale": scale,
+            "seed": seed,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "timestamp": time.time(),
+        },
+        "metrics": metrics,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Список ухудшений больше threshold (доля) по метрикам, которые есть в обоих прогонах."""
+    regressions = []
+    for name, base in baseline.get("metrics", {}).items():
+        cur = current.get("metrics", {}).get(name)
+        if cur is None or not base["value"]:
+            continue
+        change = (cur["value"] - base["value"]) / base["value"]
+        worse = -change if base["higher_is_better"] else change
+        if worse > threshold:
+            regressions.append(
+                f"{name}: {base['value']:.4g} -> {cur['value']:.4g} {base['unit']} "
+                f"({worse:+.1%} worse)"
+            )
+    return regressions
+
+
+def _configure_env(tmp: str) -> None:
+    # до импорта server.*: настройки читаются один раз при импорте
+    os.environ.setdefault("VECTOR_BACKEND", "memory")
+    os.environ.setdefault("EMBED_PROVIDER", "hash")
+    os.environ.setdefault("DOCSTORE_PATH", os.path.join(tmp, "chunks"))
+    os.environ.setdefault("EMBED_PROJECTION_PATH", os.path.join(tmp, "projection.npz"))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    ap.add_argument(
+        "--scale", type=float, default=1.0, help="множитель размера корпусов"
+    )
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument(
+        "--only", nargs="*", choices=sorted(BENCHES), help="запустить только эти"
+    )
+    ap.add_argument("--out", help="записать результат в JSON-файл")
+    ap.add_argument("--compare", metavar="BASELINE", help="сравнить с базовым JSON")
+    ap.add_argument("--current", help="взять текущий результат из файла вместо прогона")
+    ap.add_argument(
+        "--threshold", type=float, default=0.10, help="допустимое ухудшение, доля"
+    )
+    args = ap.parse_args()
+
+    if args.current:
+        with open(args.current, encoding="utf-8") as f:
+            result = json.load(f)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            _configure_env(tmp)
+            result = run(args.scale, args.seed, args.only)
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    if not args.compare:
+        print(text)
+        return
+
+    with open(args.compare, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, result, args.threshold)
+    for name, m in sorted(result["metrics"].items()):
+        print(f"{name:42s} {m['value']:12.4g} {m['unit']}")
+    if regressions:
+        print(f"\nRegressions over {args.threshold:.0%}:")
+        print("\n".join(f"  {r}" for r in regressions))
+        sys.exit(1)
+    print(f"\nNo regressions over {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
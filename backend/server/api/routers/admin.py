@@ -1,9 +1,96 @@
-from fastapi import APIRouter
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, PlainTextResponse
+
+from ...services.reindex import get_reindex_job, start_reindex
+from ...telemetry.profiling import (
+    admin_enabled,
+    collapsed,
+    list_profiles,
+    profile_path,
+    profile_text,
+    sample_stacks,
+    token_matches,
+)
 
 router = APIRouter()
 
 
+def _profile_access(authorization: Optional[str] = Header(None)) -> None:
+    # стеки и профили раскрывают код и данные запросов: только по PROFILE_TOKEN
+    if not admin_enabled():
+        raise HTTPException(404, "profiling is disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token_matches(token.strip()):
+        raise HTTPException(403, "invalid profile token")
+
+
 @router.post("/reindex", tags=["admin"])
-async def reindex() -> dict[str, bool | str]:
-    # Заглушка; позднее добавим реальную переиндексацию
-    return {"ok": True, "message": "reindex scheduled"}
+async def reindex() -> Dict[str, Any]:
+    """Перестроить векторный индекс из docstore в теневой коллекции и переключить чтения."""
+    try:
+        job = start_reindex()
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    return {"ok": True, "message": "reindex started", **job.status()}
+
+
+@router.get("/reindex", tags=["admin"])
+async def reindex_status() -> Dict[str, Any]:
+    job = get_reindex_job()
+    if job is None:
+        return {"ok": True, "state": "idle"}
+    return {"ok": True, **job.status()}
+
+
+@router.get("/profiles", tags=["admin"], dependencies=[Depends(_profile_access)])
+async def profiles() -> List[Dict[str, Any]]:
+    """
+    Сохранённые профили запросов (X-Profile / PROFILE_SAMPLE_RATE), новые первыми.
+    cProfile снимается только с потока event loop: в профиль попадают корутины
+    параллельных запросов, а то, что идёт в threadpool, — нет. В /chat это
+    эмбеддинг, поиск, docstore, rerank и упаковка контекста, в /ingest — весь
+    ingest; их показывает POST /admin/profile. Нужен заголовок Authorization:
+    Bearer <PROFILE_TOKEN>.
+    """
+    return list_profiles()
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    tags=["admin"],
+    response_model=None,
+    dependencies=[Depends(_profile_access)],
+)
+async def download_profile(
+    profile_id: str, format: str = Query("prof", pattern="^(prof|text)$")
+) -> FileResponse | PlainTextResponse:
+    """format=prof — файл pstats (snakeviz, gprof2dot), format=text — таблица по cumulative."""
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(404, "profile not found")
+    if format == "text":
+        return PlainTextResponse(profile_text(path))
+    return FileResponse(
+        path, media_type="application/octet-stream", filename=f"{profile_id}.prof"
+    )
+
+
+@router.post("/profile", tags=["admin"], dependencies=[Depends(_profile_access)])
+async def sample_profile(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+) -> PlainTextResponse:
+    """
+    Семплирующий профиль всего процесса на seconds секунд, включая потоки
+    threadpool. Ответ — collapsed stacks ("поток;функция;... N"), пригодный
+    для flamegraph.pl/speedscope. Нужен заголовок Authorization: Bearer
+    <PROFILE_TOKEN>.
+    """
+    try:
+        counts = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    return PlainTextResponse(collapsed(counts))
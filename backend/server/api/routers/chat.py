@@ -1,17 +1,27 @@
 from __future__ import annotations
 
 import os
-from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException
+import numpy as np
+from fastapi import APIRouter, Header, HTTPException
+from starlette.concurrency import run_in_threadpool
 
+from ...core.config import settings
+from ...services.admission import get_admission, normalize_priority
+from ...services.cascade import RerankFn, rerank_cascade
+from ...services.compression import compress_contexts
 from ...services.embeddings import get_embeddings
 from ...services.llm import get_llm
+from ...services.packing import Candidate, Passage, pack_contexts
 from ...services.retriever import HybridRetriever
+from ...services.sessions import Session, build_session_prompt, get_session_store
 from ...services.vectorstore import get_vectorstore
 from ...schemas.chat import ChatRequest, ChatResponse, Reference
 from ...services.prompting import get_system_instruction, build_user_prompt
 from ...db import get_docstore
+from ...telemetry.metrics import chat_session_turns_total
+from ...telemetry.timing import stage
 
 if TYPE_CHECKING:
     from ...services.reranker import CrossEncoderReranker
@@ -23,11 +33,6 @@ _reranker: "CrossEncoderReranker | None" = None
 
 router = APIRouter()
 
-TOP_POOL = 24
-FIRST_K = 12
-FINAL_K = 6
-MAX_CTX_LEN = 4000
-
 
 def _get_reranker() -> "CrossEncoderReranker | None":
     """Ленивая инициализация CrossEncoderReranker, чтобы старт сервиса не падал без сети."""
@@ -38,13 +43,29 @@ def _get_reranker() -> "CrossEncoderReranker | None":
         try:
             from ...services.reranker import CrossEncoderReranker
 
-            _reranker = CrossEncoderReranker(model_name="cross-encoder/ms-marco-MiniLM-L-6-v2")
+            _reranker = CrossEncoderReranker(
+                model_name="cross-encoder/ms-marco-MiniLM-L-6-v2"
+            )
         except Exception:
             # Не выбрасываем — просто оставляем _reranker = None, чтобы был graceful degrade
             _reranker = None
     return _reranker
 
 
+def _get_rerank_fn() -> Optional[RerankFn]:
+    """Второй этап каскада по RERANK_MODE; None — только дешёвый первый этап."""
+    mode = (settings.RERANK_MODE or "cross_encoder").lower()
+    if mode == "late":
+        from ...services.late_interaction import get_late_reranker
+
+        return get_late_reranker().score
+    if mode == "cross_encoder":
+        rr = _get_reranker()
+        if rr is not None:
+            return lambda q, cands: rr.score(q, [c.text for c in cands])
+    return None
+
+
 def _normalize_candidate(c: Any) -> Tuple[str, Dict[str, Any], float]:
     """
     Приводит кандидат к виду (chunk_id, payload, score).
@@ -57,7 +78,13 @@ def _normalize_candidate(c: Any) -> Tuple[str, Dict[str, Any], float]:
         return str(chunk_id), (payload or {}), float(score or 0.0)
 
     if isinstance(c, dict):
-        cid = c.get("id") or c.get("chunk_id") or c.get("point_id") or c.get("uuid") or "unknown"
+        cid = (
+            c.get("id")
+            or c.get("chunk_id")
+            or c.get("point_id")
+            or c.get("uuid")
+            or "unknown"
+        )
         payload = c.get("payload") or {}
         score = c.get("score") or 0.0
         return str(cid), payload, float(score)
@@ -66,22 +93,25 @@ def _normalize_candidate(c: Any) -> Tuple[str, Dict[str, Any], float]:
     return "unknown", {}, 0.0
 
 
-def _collect_contexts_and_refs(
-    candidates: List[Any], max_ctx: int = 6
-) -> Tuple[List[str], List[Reference]]:
+def _collect_candidates(
+    candidates: List[Any], vectors: Optional[np.ndarray] = None
+) -> List[Candidate]:
     """
-    По id чанков достаём тексты из docstore и формируем ссылки.
+    По id чанков достаём тексты из docstore (вместе с исходником и байтовым
+    диапазоном — по ним packer склеивает соседние чанки). vectors — строки,
+    выровненные с candidates (из ретрива), для MMR.
     """
     docstore = get_docstore()
-    contexts: List[str] = []
-    refs: List[Reference] = []
+    out: List[Candidate] = []
 
-    for c in candidates[:max_ctx]:
+    for i, c in enumerate(candidates):
         chunk_id, payload, score = _normalize_candidate(c)
 
         # сначала пробуем взять текст прямо из payload (если retriever его кладёт)
         text = (payload or {}).get("text")
-        meta: Dict[str, Any] = (payload or {}).get("meta") or {}
+        meta: Dict[str, Any] = (payload or {}).get("meta") or payload or {}
+        source: Optional[str] = None
+        offsets: Optional[Tuple[int, int]] = None
 
         # если нет текста в payload — берём из docstore
         if not text:
@@ -89,85 +119,183 @@ def _collect_contexts_and_refs(
             if rec and isinstance(rec, dict):
                 text = rec.get("text")
                 meta = rec.get("meta") or meta
+                if rec.get("source") and rec.get("offsets"):
+                    source = str(rec["source"])
+                    offsets = (int(rec["offsets"][0]), int(rec["offsets"][1]))
 
         if not text:
             continue  # пропускаем пустые
 
-        filename = str((meta or {}).get("filename", "unknown"))
-        doc_id_raw = (meta or {}).get("document_id", 0)
+        vector = vectors[i] if vectors is not None and i < len(vectors) else None
+        out.append(Candidate(chunk_id, str(text), meta, score, source, offsets, vector))
+
+    return out
+
+
+def _reference(passage: Passage) -> Reference:
+    best = passage.best
+    meta = best.meta or {}
+    try:
+        doc_id = int(meta.get("document_id", 0))
+    except (TypeError, ValueError):
+        doc_id = 0
+    return Reference(
+        document_id=doc_id,
+        filename=str(meta.get("filename", "unknown")),
+        score=float(best.score),
+        chunk_ord=int(meta.get("chunk_ord", 0)),
+        preview=passage.text[:200],
+    )
+
+
+async def _generate(prompt: str, priority: str) -> str:
+    """Генерация через слот контроля допуска; Overloaded (429/503) пробрасывается."""
+    async with get_admission().slot(priority):
         try:
-            doc_id = int(doc_id_raw)
-        except (TypeError, ValueError):
-            doc_id = 0
-        chunk_ord = int((meta or {}).get("chunk_ord", 0))
-
-        safe_text = text[:MAX_CTX_LEN]
-        contexts.append(safe_text)
-        refs.append(
-            Reference(
-                document_id=doc_id,
-                filename=str(filename),
-                score=float(score),
-                chunk_ord=chunk_ord,
-                preview=safe_text[:200],
+            with stage("llm"):
+                answer = await get_llm().generate(prompt)
+        except Exception:
+            answer = ""
+    return (answer or "").strip() or "я не знаю"
+
+
+async def _session_turn(
+    session: Session, q: str, contexts: List[str], priority: str
+) -> str:
+    """Ход сессии: промпт с тем же префиксом, что и раньше, плюс context от Ollama."""
+    async with session.lock:  # ходы одной сессии строго по очереди
+        with stage("prompt"):
+            prompt, llm_context = build_session_prompt(
+                session, q, contexts, get_system_instruction()
             )
+        chat_session_turns_total.labels("incremental" if llm_context else "full").inc()
+        async with get_admission().slot(priority):
+            try:
+                with stage("llm"):
+                    answer, new_context = await get_llm().generate_with_context(
+                        prompt, llm_context
+                    )
+            except Exception:
+                return "я не знаю"  # историю не трогаем: следующий ход продолжит с того же места
+        answer = (answer or "").strip() or "я не знаю"
+        session.record(q, answer, contexts, new_context)
+        if session.size_tokens() > settings.SESSION_MAX_TOKENS:
+            session.compact(
+                settings.SESSION_KEEP_TURNS, settings.SESSION_SUMMARY_TOKENS
+            )
+        return answer
+
+
+def _prepare_contexts(
+    q: str, depth: int
+) -> Optional[Tuple[List[str], List[Reference]]]:
+    """
+    Ретрив, каскад rerank, упаковка и сжатие контекста для вопроса.
+    None — кандидатов не нашлось.
+    """
+    pool = depth * settings.RETRIEVAL_POOL_PER_K
+
+    # 1) гибридный ретрив (векторы найденных чанков нужны packer-у для MMR)
+    retriever = HybridRetriever(get_embeddings(), get_vectorstore(), top_pool=pool)
+    try:
+        first_hits, hit_vectors = retriever.search_with_vectors(q, top_k=pool)
+    except Exception:
+        first_hits, hit_vectors = [], None
+
+    # 2) поднимаем тексты
+    with stage("docstore"):
+        candidates = _collect_candidates(first_hits, hit_vectors)
+    if not candidates:
+        return None
+
+    # 3) каскад: дешёвый скор (dense + покрытие слов вопроса) по пулу, реранкер —
+    # только на неуверенной голове и только если граница top-k не очевидна
+    candidates = rerank_cascade(
+        q,
+        candidates,
+        depth,
+        _get_rerank_fn(),
+        keep=depth * settings.RERANK_CANDIDATES_PER_K,
+        margin=settings.RERANK_MARGIN,
+        max_pairs=settings.RERANK_MAX_PAIRS,
+        lexical_weight=settings.RETRIEVAL_LEXICAL_WEIGHT,
+    ).candidates
+
+    # 4) контекст в бюджет токенов: склейка соседних чанков, MMR, без дубликатов
+    with stage("pack"):
+        passages = pack_contexts(
+            candidates,
+            settings.CONTEXT_TOKEN_BUDGET,
+            read_source=get_docstore().read_source,
+            lam=settings.CONTEXT_MMR_LAMBDA,
+            dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD,
+            max_passages=depth,
         )
+    contexts = [p.text for p in passages]
+    refs = [_reference(p) for p in passages]
 
+    # 5) опционально: только предложения, близкие к вопросу
+    if settings.CONTEXT_COMPRESSION and contexts:
+        try:
+            with stage("compress"):
+                compressed, _ = compress_contexts(
+                    q,
+                    contexts,
+                    get_embeddings(),
+                    ratio=settings.CONTEXT_COMPRESSION_RATIO,
+                    target_tokens=settings.CONTEXT_COMPRESSION_TOKENS or None,
+                    neighbours=settings.CONTEXT_COMPRESSION_NEIGHBOURS,
+                )
+            kept = [i for i, text in enumerate(compressed) if text]
+            contexts = [compressed[i] for i in kept]
+            refs = [refs[i] for i in kept]
+        except Exception:
+            pass  # graceful degrade: несжатый контекст
     return contexts, refs
 
 
 @router.post("/chat", response_model=ChatResponse, tags=["chat"])
-async def chat(req: ChatRequest) -> ChatResponse:
+async def chat(
+    req: ChatRequest, x_priority: Optional[str] = Header(None)
+) -> ChatResponse:
     q = (req.question or "").strip()
     if not q:
         raise HTTPException(status_code=400, detail="question is empty")
 
-    # 1) гибридный ретрив
-    retriever = HybridRetriever(get_embeddings(), get_vectorstore(), top_pool=TOP_POOL)
-    try:
-        first_hits = retriever.search(q, top_k=FIRST_K)
-    except Exception:
-        first_hits = []
+    # 0) очередь к LLM полна — отказываем до ретрива (429 + Retry-After)
+    priority = normalize_priority(x_priority)
+    get_admission().check(priority)
 
-    # 2) поднимаем тексты и ссылки
-    contexts_raw, refs_raw = _collect_contexts_and_refs(
-        first_hits, max_ctx=len(first_hits) or FIRST_K
+    # глубина — из запроса, в пределах сервера; пул и каскад масштабируются от неё
+    depth = max(1, min(req.top_k, settings.CHAT_MAX_TOP_K))
+    session = (
+        get_session_store().get_or_create(req.session_id) if req.session_id else None
     )
 
-    # Если контекстов нет — честный ответ
-    if not contexts_raw:
+    # эмбеддинг вопроса (в т.ч. ожидание EmbeddingPool), поиск, rerank и упаковка
+    # синхронные — в threadpool, чтобы не держать event loop для других запросов
+    prepared = await run_in_threadpool(_prepare_contexts, q, depth)
+
+    # Если контекстов нет — честный ответ (в сессии отвечаем с учётом истории)
+    if prepared is None and session is None:
         sys_instr = get_system_instruction()
         prompt = build_user_prompt(q, [], sys_instr)
-        try:
-            answer = await get_llm().generate(prompt)
-        except Exception:
-            answer = ""
-        answer = (answer or "").strip() or "я не знаю"
-        return ChatResponse(answer=answer, references=[])
+        return ChatResponse(answer=await _generate(prompt, priority), references=[])
+    contexts, refs = prepared or ([], [])
 
-    # 3) попытка rerank; если не получилось — используем как есть
-    order = list(range(len(contexts_raw)))
-    rr = _get_reranker()
-    if rr is not None:
-        try:
-            scores = rr.score(q, contexts_raw)  # List[float]
-            order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
-        except Exception:
-            pass  # graceful degrade
+    if session is not None:
+        answer = await _session_turn(session, q, contexts, priority)
+        return ChatResponse(answer=answer, references=refs, session_id=session.id)
 
-    k = min(FINAL_K, len(order))
-    contexts = [contexts_raw[i] for i in order[:k]]
-    refs = [refs_raw[i] for i in order[:k]]
+    # 6) системная инструкция
+    with stage("prompt"):
+        sys_instr = get_system_instruction()
+        prompt = build_user_prompt(q, contexts, sys_instr)
 
-    # 4) системная инструкция
-    sys_instr = get_system_instruction()
+    # 7) генерация ответа (ждёт слот, если Ollama уже занят)
+    return ChatResponse(answer=await _generate(prompt, priority), references=refs)
 
-    # 5) генерация ответа
-    prompt = build_user_prompt(q, contexts, sys_instr)
-    try:
-        answer = await get_llm().generate(prompt)
-    except Exception:
-        answer = ""
-    answer = (answer or "").strip() or "я не знаю"
 
-    return ChatResponse(answer=answer, references=refs)
+@router.delete("/chat/sessions/{session_id}", tags=["chat"])
+async def delete_session(session_id: str) -> Dict[str, Any]:
+    return {"session_id": session_id, "deleted": get_session_store().delete(session_id)}
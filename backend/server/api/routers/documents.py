@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from ...services.embeddings import get_embeddings
+from ...services.vectorstore import get_vectorstore
+from ...services.indexing import Indexer
+from ...services.ingestion import delete_document as delete_document_chunks
+from ...db import get_docstore
+
+router = APIRouter()
+
+
+class DeleteDocumentResponse(BaseModel):
+    ok: bool
+    document_id: int
+    chunks: int
+
+
+@router.delete(
+    "/{document_id}", response_model=DeleteDocumentResponse, tags=["documents"]
+)
+async def delete_document(document_id: int) -> DeleteDocumentResponse:
+    removed = delete_document_chunks(
+        document_id,
+        docstore=get_docstore(),
+        indexer=Indexer(get_embeddings(), get_vectorstore()),
+    )
+    if not removed:
+        raise HTTPException(404, "Document not found")
+    return DeleteDocumentResponse(ok=True, document_id=document_id, chunks=removed)
@@ -1,16 +1,22 @@
 from __future__ import annotations
-import hashlib
-from typing import Dict, List
 
-from typing import Tuple
+from typing import List, Optional
 
 from fastapi import APIRouter, File, HTTPException, UploadFile
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
+from ...core.config import settings
 from ...services.embeddings import get_embeddings
 from ...services.vectorstore import get_vectorstore
 from ...services.indexing import Indexer
-from ...services.chunking import split_with_metadata
+from ...services.ingestion import (
+    Upload,
+    expand_upload,
+    get_chunk_pool,
+    ingest_document,
+    ingest_many,
+)
 from ...db import get_docstore
 
 router = APIRouter()
@@ -22,16 +28,30 @@ class IngestResponse(BaseModel):
     document_hash: str
     filename: str
     chunks: int
+    # created | updated | unchanged | reindexed (точки были потеряны индексом)
+    status: str = "created"
+    embedded: int = 0
+    retired: int = 0
 
 
-def _stable_document_id(filename: str, document_hash: str) -> int:
-    """Build a deterministic integer identifier for a document."""
+class BulkIngestItem(BaseModel):
+    ok: bool
+    filename: str
+    # created | updated | unchanged | reindexed | error
+    status: str
+    document_id: Optional[int] = None
+    document_hash: Optional[str] = None
+    chunks: int = 0
+    embedded: int = 0
+    retired: int = 0
+    error: Optional[str] = None
 
-    hasher = hashlib.blake2b(digest_size=8)
-    hasher.update(filename.encode("utf-8", errors="ignore"))
-    hasher.update(b"\0")
-    hasher.update(document_hash.encode("ascii"))
-    return int.from_bytes(hasher.digest(), "big", signed=False)
+
+class BulkIngestResponse(BaseModel):
+    ok: bool
+    documents: int
+    embedded: int
+    files: List[BulkIngestItem]
 
 
 @router.post("", response_model=IngestResponse, tags=["ingest"])
@@ -40,67 +60,60 @@ async def ingest_file(file: UploadFile = File(...)) -> IngestResponse:
     if not content_bytes:
         raise HTTPException(400, "Empty file")
 
+    # чанкинг и эмбеддинг — CPU-bound, уводим из event loop
     try:
-        text = content_bytes.decode("utf-8", errors="ignore")
-    except Exception as e:
-        raise HTTPException(400, f"Decode error: {e}")
-
-    document_hash = hashlib.sha256(content_bytes).hexdigest()
-    document_size = len(content_bytes)
-    content_type = file.content_type or "application/octet-stream"
-
-    filename = file.filename or ""
-
-    document_id = _stable_document_id(filename, document_hash)
-
-    rich_chunks = split_with_metadata(
-        text=text,
-        filename=file.filename,
-        document_id=document_id,
-        chunk_size=800,
-        overlap=120,
-        strip_html=True,
-        markdown_aware=True,
+        result = await run_in_threadpool(
+            ingest_document,
+            content_bytes,
+            filename=file.filename or "",
+            content_type=file.content_type or "application/octet-stream",
+            docstore=get_docstore(),
+            indexer=Indexer(get_embeddings(), get_vectorstore()),
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    return IngestResponse(ok=True, **result)
+
+
+@router.post("/bulk", response_model=BulkIngestResponse, tags=["ingest"])
+async def ingest_bulk(files: List[UploadFile] = File(...)) -> BulkIngestResponse:
+    """
+    Пакетная загрузка: несколько файлов и/или zip/tar-архивов за один запрос.
+    Чанкинг идёт параллельно в пуле процессов, эмбеддинги — общими батчами.
+    """
+    uploads: List[Upload] = []
+    items: List[BulkIngestItem] = []
+    for file in files:
+        data = await file.read()
+        name = file.filename or ""
+        try:
+            uploads.extend(
+                expand_upload(
+                    name, data, file.content_type or "application/octet-stream"
+                )
+            )
+        except (
+            Exception
+        ) as e:  # noqa: BLE001 - битый архив не должен ронять остальные файлы
+            items.append(
+                BulkIngestItem(ok=False, filename=name, status="error", error=str(e))
+            )
+    if not uploads and not items:
+        raise HTTPException(400, "No files")
+
+    results = await run_in_threadpool(
+        ingest_many,
+        uploads,
+        docstore=get_docstore(),
+        indexer=Indexer(get_embeddings(), get_vectorstore()),
+        pool=get_chunk_pool(),
+        wave_size=settings.INGEST_BULK_WAVE,
     )
-    if not rich_chunks:
-        raise HTTPException(400, "No chunks produced")
-
-    chunks: List[str] = []
-    metas: List[Dict[str, object]] = []
-    items_for_store: List[Tuple[str, Dict[str, object]]] = []
-
-    chunk_total = len(rich_chunks)
-
-    for idx, rc in enumerate(rich_chunks):
-        cid = f"{document_id}:{idx}"
-        meta = {
-            "chunk_id": cid,
-            "chunk_index": idx,
-            "filename": filename,
-            "document_id": document_id,
-            "document_sha256": document_hash,
-            "document_size": document_size,
-            "chunk_total": chunk_total,
-            "content_type": content_type,
-            "heading": rc.get("heading", ""),
-            "level": rc.get("level", "0"),
-            "span": rc.get("span", [0, 0]),
-        }
-        metas.append(meta)
-        chunks.append(rc["text"])
-        items_for_store.append((cid, {"meta": meta, "text": rc["text"]}))
-
-    # Persist сырые тексты
-    get_docstore().bulk_put(items_for_store)
-
-    # Апсерт в векторку
-    indexer = Indexer(get_embeddings(), get_vectorstore())
-    n = indexer.upsert_chunks(chunks, metas)
-
-    return IngestResponse(
-        ok=True,
-        document_id=document_id,
-        document_hash=document_hash,
-        filename=filename,
-        chunks=n,
+    items.extend(BulkIngestItem(ok=r["status"] != "error", **r) for r in results)
+    return BulkIngestResponse(
+        ok=all(i.ok for i in items),
+        documents=sum(1 for i in items if i.ok),
+        embedded=sum(i.embedded for i in items),
+        files=items,
     )
@@ -12,6 +12,8 @@ class Settings(BaseSettings):
     API_PORT: int = 8000
     CORS_ORIGINS: str = "http://localhost:5173"
     MAX_UPLOAD_MB: int = 25
+    # прогрев моделей и соединений при старте (/readyz отвечает 200 после него)
+    WARMUP_ENABLED: bool = True
 
     # --- Auth ---
     JWT_SECRET: str = "change_me"
@@ -21,6 +23,13 @@ class Settings(BaseSettings):
     LLM_PROVIDER: str = "ollama"
     LLM_MODEL: str = "qwen2.5:3b"
     OLLAMA_HOST: str = "http://ollama:11434"
+    # сколько Ollama держит модель загруженной после запроса (KV-кэш сессий живёт столько же)
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    # контроль допуска (services.admission): генераций одновременно (0 — без ограничений),
+    # мест в очереди и сколько ждать в ней до 503
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_MAX_QUEUE: int = 32
+    LLM_QUEUE_TIMEOUT_SEC: float = 20.0
     OPENAI_API_KEY: str | None = None
     HF_API_TOKEN: str | None = None
 
@@ -28,11 +37,83 @@ class Settings(BaseSettings):
     EMBED_PROVIDER: str = "sbert"
     EMBED_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMBED_DIM: int = 384
+    # EMBED_PROVIDER=onnx: каталог с model.onnx/model_quantized.onnx и tokenizer.json
+    EMBED_ONNX_PATH: str = "./models/all-MiniLM-L6-v2-onnx"
+    # intra-op потоки onnxruntime (0 — по умолчанию onnxruntime)
+    EMBED_ONNX_THREADS: int = 0
+    EMBED_MAX_LENGTH: int = 256
+    # размер батча модели; тексты предварительно группируются по длине
+    EMBED_BATCH_SIZE: int = 64
+    # >0 — эмбеддинги считает пул из стольких процессов (по копии модели в каждом)
+    EMBED_POOL_SIZE: int = 0
 
     # --- Vector store ---
     VECTOR_BACKEND: str = "qdrant"
     QDRANT_URL: str = "http://qdrant:6333"
     QDRANT_COLLECTION: str = "kb"
+    # разреженные BM25-векторы рядом с dense и гибридный запрос со слиянием RRF в Qdrant
+    QDRANT_HYBRID: bool = True
+    # средняя длина чанка в словах — нормировка длины в весах BM25
+    QDRANT_SPARSE_AVGDL: float = 300.0
+    # доля tombstone-строк в локальном индексе, после которой запускается компакция
+    VECTOR_COMPACT_THRESHOLD: float = 0.25
+    # >1 — локальный индекс из стольких шардов, поиск по ним параллельно (обычно = числу ядер)
+    VECTOR_SHARDS: int = 1
+    # размер пачки чанков при /admin/reindex
+    REINDEX_BATCH_SIZE: int = 512
+    # Понижение размерности, обучаемое при reindex: none | pca | truncate (Matryoshka)
+    EMBED_PROJECTION: str = "none"
+    EMBED_PROJECTION_DIM: int = 192
+    # сколько векторов корпуса берётся для обучения проекции
+    EMBED_PROJECTION_SAMPLE: int = 20000
+    EMBED_PROJECTION_PATH: str = "./data/projection.npz"
+
+    # --- Ingest ---
+    # процессов для чанкинга в /ingest/bulk (0 — по числу ядер)
+    INGEST_WORKERS: int = 0
+    # документов на одну волну эмбеддинга/записи в /ingest/bulk
+    INGEST_BULK_WAVE: int = 256
+
+    # --- Retrieval / rerank cascade ---
+    # ChatRequest.top_k (число фрагментов в контексте) ограничивается сверху этим значением
+    CHAT_MAX_TOP_K: int = 12
+    # dense-пул: top_k * RETRIEVAL_POOL_PER_K кандидатов из векторного поиска
+    RETRIEVAL_POOL_PER_K: int = 4
+    # вес лексического покрытия вопроса в дешёвом скоре первого этапа
+    RETRIEVAL_LEXICAL_WEIGHT: float = 0.3
+    # после первого этапа остаётся top_k * RERANK_CANDIDATES_PER_K кандидатов
+    RERANK_CANDIDATES_PER_K: int = 2
+    # разрыв дешёвого скора на границе top_k, при котором CrossEncoder не нужен;
+    # он же — ширина «неуверенной» полосы, которая уходит в CrossEncoder
+    RERANK_MARGIN: float = 0.1
+    RERANK_MAX_PAIRS: int = 12
+    # второй этап каскада: cross_encoder | late (MaxSim по токенам, services.late_interaction) | none
+    RERANK_MODE: str = "cross_encoder"
+    # хранение токенов чанка для late: int8 (масштаб на строку) | float16 | float32
+    LATE_INTERACTION_DTYPE: str = "int8"
+    LATE_INTERACTION_MAX_TOKENS: int = 128
+
+    # --- Prompt context ---
+    # бюджет контекстных фрагментов в токенах (токенайзер чанкера)
+    CONTEXT_TOKEN_BUDGET: int = 1500
+    # MMR: вес релевантности против разнообразия (1.0 — только релевантность)
+    CONTEXT_MMR_LAMBDA: float = 0.7
+    # косинус, начиная с которого фрагмент считается дубликатом уже выбранного
+    CONTEXT_DEDUP_THRESHOLD: float = 0.95
+    # сжатие контекста под вопрос: оставляем ближайшие к вопросу предложения с соседями
+    CONTEXT_COMPRESSION: bool = False
+    # целевая доля токенов; CONTEXT_COMPRESSION_TOKENS > 0 задаёт объём явно
+    CONTEXT_COMPRESSION_RATIO: float = 0.4
+    CONTEXT_COMPRESSION_TOKENS: int = 0
+    CONTEXT_COMPRESSION_NEIGHBOURS: int = 1
+
+    # --- Chat sessions ---
+    SESSION_MAX_SESSIONS: int = 1000
+    SESSION_TTL_SEC: float = 3600.0
+    # бюджет истории сессии в токенах; при превышении старые ходы сворачиваются
+    SESSION_MAX_TOKENS: int = 3000
+    SESSION_KEEP_TURNS: int = 2
+    SESSION_SUMMARY_TOKENS: int = 256
 
     # --- DB / storage ---
     DB_URL: str = "sqlite+aiosqlite:///./data/app.db"
@@ -40,11 +121,34 @@ class Settings(BaseSettings):
 
     # --- Redis/Celery ---
     REDIS_URL: str = "redis://redis:6379/0"
+    # пул потоков: модели грузятся один раз на процесс, а параллельные задачи
+    # ingest склеиваются в общий батч эмбеддинга (tasks.batching)
+    WORKER_POOL: str = "threads"
+    WORKER_CONCURRENCY: int = 16
+    WORKER_PREFETCH_MULTIPLIER: int = 4
+    # батч воркера: до WORKER_BATCH_DOCS документов, ждём добора не дольше WORKER_BATCH_WAIT_MS
+    WORKER_BATCH_DOCS: int = 32
+    WORKER_BATCH_WAIT_MS: int = 50
+    # предел на вызов ingest для пачки, сек (0 — без предела): task_time_limit Celery
+    # соблюдается только в пуле prefork, в пуле потоков задачи ограничивает этот таймаут
+    WORKER_TASK_TIMEOUT: float = 600.0
+    # метка worker в метриках (пусто — hostname)
+    WORKER_NAME: str = ""
 
     # --- Telemetry ---
+    # OpenTelemetry: спаны стадий конвейера по OTLP (OTEL_EXPORTER_OTLP_ENDPOINT)
+    OTEL_ENABLED: bool = False
+    OTEL_SERVICE_NAME: str = "rag-api"
     PROMETHEUS_ENABLED: bool = True
     API_METRICS_PATH: str = "/metrics"
     WORKER_METRICS_PORT: int = 8001
+    # профилирование запросов: заголовок "X-Profile: <PROFILE_TOKEN>" (пусто — выключено)
+    # и/или доля случайных запросов; профили — в PROFILE_DIR, хранятся последние PROFILE_KEEP.
+    # Тот же токен (Authorization: Bearer) открывает /admin/profile*
+    PROFILE_TOKEN: str = ""
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_DIR: str = "./data/profiles"
+    PROFILE_KEEP: int = 100
 
     model_config = {
         "env_file": ".env",
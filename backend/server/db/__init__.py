@@ -1,6 +1,6 @@
 from __future__ import annotations
 import os
-from ..core.config import settings
+from ..core import config as core_config
 from .docstore import LocalDocStore
 
 __docstore_singleton: LocalDocStore | None = None
@@ -9,7 +9,8 @@ __docstore_singleton: LocalDocStore | None = None
 def get_docstore() -> LocalDocStore:
     global __docstore_singleton
     if __docstore_singleton is None:
-        base = settings.DOCSTORE_PATH
+        # settings читаем при создании: тесты и скрипты подменяют core_config.settings
+        base = core_config.settings.DOCSTORE_PATH
         os.makedirs(base, exist_ok=True)
         __docstore_singleton = LocalDocStore(base)
     return __docstore_singleton
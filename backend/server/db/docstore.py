@@ -1,18 +1,47 @@
 from __future__ import annotations
 import json
+import mmap
 import os
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# сколько mmap-ов исходных документов держать открытыми одновременно
+_MAX_OPEN_SOURCES = 128
 
 
 class LocalDocStore:
+    """
+    Файловое хранилище чанков.
+
+    Нормализованный текст документа хранится один раз (``_sources/<key>.txt``),
+    а запись чанка содержит только метаданные и байтовые смещения в нём.
+    Текст чанка вырезается при чтении из memory-mapped файла; старые записи
+    с полем ``text`` читаются как раньше.
+    """
+
     def __init__(self, base_dir: str):
         self.base_dir = os.path.abspath(base_dir)
         os.makedirs(self.base_dir, exist_ok=True)
+        # Манифесты документов лежат отдельно, чтобы не попадать в list_by_document
+        self.manifest_dir = os.path.join(self.base_dir, "_documents")
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        self.source_dir = os.path.join(self.base_dir, "_sources")
+        os.makedirs(self.source_dir, exist_ok=True)
+        self.tokens_dir = os.path.join(self.base_dir, "_tokens")
+        os.makedirs(self.tokens_dir, exist_ok=True)
+        self._maps: "OrderedDict[str, mmap.mmap]" = OrderedDict()
+        self._maps_lock = threading.Lock()
 
     def _chunk_path(self, chunk_id: str) -> str:
         safe = chunk_id.replace("/", "_")
         return os.path.join(self.base_dir, f"{safe}.json")
 
+    def _manifest_path(self, document_id: int) -> str:
+        return os.path.join(self.manifest_dir, f"{int(document_id)}.json")
+
     def put(self, chunk_id: str, record: Dict[str, Any]) -> None:
         path = self._chunk_path(chunk_id)
         with open(path, "w", encoding="utf-8") as f:
@@ -24,12 +53,115 @@ class LocalDocStore:
             return None
         with open(path, "r", encoding="utf-8") as f:
             data: Dict[str, Any] = json.load(f)
-            return data
+            return self._hydrate(data)
+
+    def _hydrate(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        if "text" not in record and "source" in record:
+            start, end = record["offsets"]
+            record["text"] = self.read_source(record["source"], start, end)
+        return record
+
+    def get_window(self, chunk_id: str, before: int, after: int) -> Optional[str]:
+        """Текст чанка вместе с before/after байтами окружающего документа."""
+        rec = self.get(chunk_id)
+        if rec is None:
+            return None
+        if "source" not in rec:
+            return str(rec.get("text") or "")
+        start, end = rec["offsets"]
+        return self.read_source(rec["source"], max(0, start - before), end + after)
+
+    def _source_path(self, key: str) -> str:
+        return os.path.join(self.source_dir, f"{key}.txt")
+
+    def put_source(self, key: str, text: str) -> None:
+        """Сохранить нормализованный документ. Файлы неизменяемы: новая версия — новый key."""
+        path = self._source_path(key)
+        if os.path.exists(path):
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def delete_source(self, key: str) -> bool:
+        with self._maps_lock:
+            mm = self._maps.pop(key, None)
+        if mm is not None:
+            mm.close()
+        try:
+            os.remove(self._source_path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def read_source(self, key: str, start: int, end: int) -> str:
+        """Срез [start, end) байт исходного документа; концы, попавшие внутрь символа, отбрасываются."""
+        # срез копируется под локом: иначе delete_source/вытеснение из LRU
+        # может закрыть mmap посреди чтения
+        with self._maps_lock:
+            mm = self._source_map(key)
+            data = mm[start:end] if mm is not None else b""
+        return data.decode("utf-8", errors="ignore")
+
+    def _source_map(self, key: str) -> Optional[mmap.mmap]:
+        mm = self._maps.get(key)
+        if mm is not None:
+            self._maps.move_to_end(key)
+            return mm
+        try:
+            with open(self._source_path(key), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        self._maps[key] = mm
+        if len(self._maps) > _MAX_OPEN_SOURCES:
+            _, old = self._maps.popitem(last=False)
+            old.close()
+        return mm
+
+    def _tokens_path(self, chunk_id: str) -> str:
+        return os.path.join(self.tokens_dir, f"{chunk_id.replace('/', '_')}.npz")
+
+    def put_tokens(self, chunk_id: str, codes: np.ndarray, scale: np.ndarray) -> None:
+        path = self._tokens_path(chunk_id)
+        # np.savez сам дописывает .npz к имени без расширения
+        tmp = f"{path[:-4]}.tmp.npz"
+        np.savez(tmp, codes=codes, scale=scale)
+        os.replace(tmp, path)
+
+    def get_tokens(self, chunk_id: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(коды, масштабы строк) или None, если для чанка токены не сохранены."""
+        try:
+            with np.load(self._tokens_path(chunk_id)) as data:
+                return data["codes"], data["scale"]
+        except FileNotFoundError:
+            return None
+
+    def delete_tokens(self, chunk_id: str) -> bool:
+        try:
+            os.remove(self._tokens_path(chunk_id))
+        except FileNotFoundError:
+            return False
+        return True
 
     def bulk_put(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> None:
         for cid, rec in items:
             self.put(cid, rec)
 
+    def delete(self, chunk_id: str) -> bool:
+        self.delete_tokens(chunk_id)
+        try:
+            os.remove(self._chunk_path(chunk_id))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def bulk_delete(self, chunk_ids: Iterable[str]) -> int:
+        return sum(1 for cid in chunk_ids if self.delete(cid))
+
     def list_by_document(self, document_id: int) -> List[str]:
         prefix = f"{document_id}:"
         return [
@@ -37,3 +169,54 @@ class LocalDocStore:
             for fn in os.listdir(self.base_dir)
             if fn.endswith(".json") and fn.startswith(prefix)
         ]
+
+    def _iter_chunk_files(self) -> Iterator[os.DirEntry[str]]:
+        with os.scandir(self.base_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".json") and entry.is_file():
+                    yield entry
+
+    def count(self) -> int:
+        return sum(1 for _ in self._iter_chunk_files())
+
+    def iter_records(
+        self, batch_size: int = 512
+    ) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """Потоково отдаёт все чанки пачками по batch_size, не загружая docstore целиком."""
+        batch: List[Tuple[str, Dict[str, Any]]] = []
+        for entry in self._iter_chunk_files():
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    rec: Dict[str, Any] = json.load(f)
+            except FileNotFoundError:
+                continue  # чанк удалили, пока мы шли по каталогу
+            batch.append((entry.name[:-5], self._hydrate(rec)))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def get_manifest(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """Манифест последней проиндексированной версии документа (хеш, список чанков)."""
+        path = self._manifest_path(document_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            data: Dict[str, Any] = json.load(f)
+            return data
+
+    def put_manifest(self, document_id: int, manifest: Dict[str, Any]) -> None:
+        # Пишем через временный файл: манифест — точка истины для re-ingest
+        path = self._manifest_path(document_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def delete_manifest(self, document_id: int) -> bool:
+        try:
+            os.remove(self._manifest_path(document_id))
+        except FileNotFoundError:
+            return False
+        return True
@@ -1,27 +1,83 @@
 from __future__ import annotations
-from typing import Awaitable, Callable
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List
 
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from prometheus_client import (
-    CONTENT_TYPE_LATEST,
-    REGISTRY,
-    Counter,
-    Histogram,
-    generate_latest,
-)
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
 import time
 
 from .core.config import settings
-from .api.routers import health, ingest, chat, admin
+from .telemetry.metrics import api_latency_hist, api_requests_total
+from .telemetry.profiling import (
+    RequestProfile,
+    profiling_enabled,
+    start_request_profile,
+)
+from .telemetry.timing import (
+    begin_request,
+    end_request,
+    server_timing_header,
+    stage_timings,
+)
+from .telemetry.tracing import configure_tracing, span
+from .api.routers import health, ingest, chat, admin, documents
+from .services.admission import Overloaded
+from .services.chunking import count_tokens
+from .services.embeddings import get_embeddings
+from .services.prompting import get_system_instruction
+from .services.retriever import HybridRetriever
+from .services.vectorstore import get_vectorstore
+from .services.warmup import WarmupStep, get_warmup, start_warmup
+
+
+def _warm_embeddings() -> None:
+    # короткий и длинный текст: первые инференсы выделяют буферы под обе формы батча
+    get_embeddings().embed_array(["прогрев", "прогрев модели эмбеддингов " * 40])
+
+
+def _warm_vectorstore() -> None:
+    # соединение с Qdrant, проекция и путь поиска целиком
+    HybridRetriever(get_embeddings(), get_vectorstore()).search("прогрев", top_k=1)
+
+
+def _warm_reranker() -> bool:
+    rr = chat._get_reranker()
+    if rr is None:
+        return False
+    rr.score("прогрев", ["прогрев реранкера"])
+    return True
+
+
+def _warm_prompts() -> None:
+    get_system_instruction()
+    count_tokens("прогрев")
+
 
-app = FastAPI(title="RAG API", version="0.1.0")
+def _warmup_steps() -> List[WarmupStep]:
+    return [
+        WarmupStep("embeddings", _warm_embeddings),
+        WarmupStep("vectorstore", _warm_vectorstore),
+        WarmupStep("reranker", _warm_reranker, critical=False),
+        WarmupStep("prompts", _warm_prompts, critical=False),
+    ]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # в фоне: /healthz отвечает сразу, /readyz — после прогрева
+    if settings.WARMUP_ENABLED:
+        start_warmup(_warmup_steps())
+    yield
+
+
+app = FastAPI(title="RAG API", version="0.1.0", lifespan=lifespan)
 
 
 @app.get("/")
 def root() -> dict[str, list[str] | str]:
-    return {"status": "ok", "see": ["/docs", "/healthz", "/metrics"]}
+    return {"status": "ok", "see": ["/docs", "/healthz", "/readyz", "/metrics"]}
 
 
 # CORS
@@ -34,13 +90,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Prometheus metrics
-api_requests_total = Counter(
-    "api_requests_total", "Total API requests", ["method", "route", "status"]
-)
-api_latency_hist = Histogram(
-    "api_request_latency_seconds", "API request latency in seconds", ["route"]
-)
+if settings.OTEL_ENABLED:
+    configure_tracing(service_name=settings.OTEL_SERVICE_NAME)
+
+
+def _route_template(request: Request) -> str:
+    # шаблон маршрута вместо сырого пути: иначе /documents/<id> плодит серии метрик
+    route = request.scope.get("route")
+    return str(getattr(route, "path", None) or "unmatched")
 
 
 @app.middleware("http")
@@ -48,23 +105,70 @@ async def metrics_middleware(
     request: Request, call_next: Callable[[Request], Awaitable[Response]]
 ) -> Response:
     start = time.perf_counter()
-    response: Response
+    token = begin_request()
+    response: Response | None = None
+    # X-Profile / PROFILE_SAMPLE_RATE; при выключенном профилировании — одна проверка
+    profile: RequestProfile | None = (
+        start_request_profile(request.headers) if profiling_enabled() else None
+    )
+    profile_id: str | None = None
     try:
-        response = await call_next(request)
+        with span(f"{request.method} {request.url.path}") as root:
+            try:
+                response = await call_next(request)
+            finally:
+                if profile is not None:
+                    profile_id = profile.finish(
+                        method=request.method,
+                        path=request.url.path,
+                        route=_route_template(request),
+                        status=response.status_code if response else 500,
+                    )
+            if profile_id is not None:
+                response.headers["X-Profile-Id"] = profile_id
+            if root is not None:
+                root.update_name(f"{request.method} {_route_template(request)}")
+                root.set_attribute("http.status_code", response.status_code)
+        # длительности стадий конвейера (см. telemetry.timing) — для нагрузочных тестов
+        response.headers["Server-Timing"] = server_timing_header(
+            stage_timings(), time.perf_counter() - start
+        )
         return response
     finally:
-        route = request.url.path
+        end_request(token)
+        route = _route_template(request)
         status = str(response.status_code) if response else "500"
         api_requests_total.labels(request.method, route, status).inc()
         api_latency_hist.labels(route).observe(time.perf_counter() - start)
 
 
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        {"detail": exc.reason},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.get("/healthz", tags=["health"])
 async def healthz() -> dict[str, str]:
     return {"status": "ok"}
 
 
-@app.get(settings.API_METRICS_PATH, tags=["metrics"])
+@app.get("/readyz", tags=["health"], response_model=None)
+async def readyz() -> JSONResponse:
+    """503, пока идёт прогрев (или критичный компонент не поднялся); 200 — готов к трафику."""
+    warmup = get_warmup()
+    if warmup is None:
+        if settings.WARMUP_ENABLED:
+            return JSONResponse({"status": "starting"}, status_code=503)
+        return JSONResponse({"status": "ready", "components": {}})
+    status = warmup.status()
+    return JSONResponse(status, status_code=200 if warmup.ready else 503)
+
+
+@app.get(settings.API_METRICS_PATH, tags=["metrics"], response_model=None)
 async def metrics() -> PlainTextResponse | JSONResponse:
     if not settings.PROMETHEUS_ENABLED:
         return JSONResponse({"detail": "metrics disabled"}, status_code=404)
@@ -76,4 +180,5 @@ async def metrics() -> PlainTextResponse | JSONResponse:
 app.include_router(health.router, prefix="")
 app.include_router(ingest.router, prefix="/ingest")
 app.include_router(chat.router, prefix="")
+app.include_router(documents.router, prefix="/documents")
 app.include_router(admin.router, prefix="/admin")
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from pydantic import BaseModel
 
 
@@ -12,9 +12,13 @@ class Reference(BaseModel):
 
 class ChatRequest(BaseModel):
     question: str
+    # сколько фрагментов попадёт в контекст; сервер ограничивает сверху CHAT_MAX_TOP_K
     top_k: int = 6
+    # id сессии многоходового диалога (любая строка от клиента); None — вопрос без истории
+    session_id: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
     answer: str
     references: List[Reference]
+    session_id: Optional[str] = None
@@ -0,0 +1,195 @@
+"""
+Контроль допуска к LLM.
+
+Одновременно генерируют не больше LLM_MAX_CONCURRENCY запросов, остальные ждут
+в очереди из не более LLM_MAX_QUEUE мест: по приоритету (X-Priority: high |
+normal | low), внутри класса — по порядку прихода. Лишнее отбрасывается сразу,
+пока запрос ещё не потратил время на ретрив и не занял Ollama:
+
+* очередь полна — 429, если новый запрос не старше по приоритету никого из
+  ожидающих; иначе место освобождает самый младший ожидающий (ему — 503);
+* запрос прождал дольше LLM_QUEUE_TIMEOUT_SEC — 503.
+
+В обоих случаях Retry-After — оценка времени, за которое очередь рассосётся
+(скользящее среднее длительности генерации × очередь / слоты). Так под пиком
+Ollama работает на своей пропускной способности, а не делит её между десятками
+генераций, которые потом одновременно упираются в таймаут.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List
+
+from ..core.config import settings
+from ..telemetry.metrics import (
+    llm_inflight,
+    llm_queue_length,
+    llm_queue_wait,
+    llm_shed_total,
+)
+from ..telemetry.timing import stage
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class Overloaded(Exception):
+    """Запрос отброшен контролем допуска; status_code — 429 или 503."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    seq: int
+    priority: str = field(compare=False)
+    future: "asyncio.Future[None]" = field(compare=False)
+    enqueued: float = field(compare=False, default_factory=time.perf_counter)
+
+
+def normalize_priority(value: str | None) -> str:
+    value = (value or "").strip().lower()
+    return value if value in PRIORITIES else "normal"
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        # max_concurrency <= 0 — без ограничений
+        self.max_concurrency = max_concurrency
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        # скользящее среднее длительности генерации, с; стартовое значение — грубая оценка
+        self._service_time = 5.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        slots = max(1, self.max_concurrency)
+        return max(
+            1, min(60, math.ceil(self._service_time * (self.queued + 1) / slots))
+        )
+
+    def _shed(self, priority: str, reason: str, status_code: int) -> Overloaded:
+        llm_shed_total.labels(priority, reason).inc()
+        return Overloaded(
+            status_code, f"LLM is overloaded ({reason})", self.retry_after()
+        )
+
+    def _update_gauges(self) -> None:
+        llm_inflight.set(self.active)
+        llm_queue_length.set(self.queued)
+
+    def _has_free_slot(self) -> bool:
+        return self.active < self.max_concurrency and not self._waiters
+
+    def _can_queue(self, rank: int) -> bool:
+        return self.queued < self.max_queue or (
+            bool(self._waiters) and max(self._waiters).rank > rank
+        )
+
+    def check(self, priority: str) -> None:
+        """Дешёвая проверка до ретрива: бросает Overloaded, если запрос заведомо не встанет."""
+        if self.max_concurrency <= 0 or self._has_free_slot():
+            return
+        if not self._can_queue(PRIORITIES[priority]):
+            raise self._shed(priority, "queue_full", 429)
+
+    async def acquire(self, priority: str) -> None:
+        if self._has_free_slot():
+            self.active += 1
+            llm_queue_wait.labels(priority).observe(0.0)
+            self._update_gauges()
+            return
+        rank = PRIORITIES[priority]
+        if not self._can_queue(rank):
+            raise self._shed(priority, "queue_full", 429)
+        if self.queued >= self.max_queue:
+            # вытесняем самого младшего (и самого позднего из них) ожидающего
+            victim = max(self._waiters)
+            self._waiters.remove(victim)
+            heapq.heapify(self._waiters)
+            victim.future.set_exception(self._shed(victim.priority, "preempted", 503))
+
+        waiter = _Waiter(
+            rank, next(self._seq), priority, asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._waiters, waiter)
+        self._update_gauges()
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except BaseException as e:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                self._update_gauges()
+            future = waiter.future
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()  # слот уже передали нам, а мы уходим — отдаём следующему
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._shed(priority, "timeout", 503) from None
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = heapq.heappop(self._waiters)
+            if not waiter.future.done():
+                # слот переходит ожидающему, active не меняется
+                waiter.future.set_result(None)
+                llm_queue_wait.labels(waiter.priority).observe(
+                    time.perf_counter() - waiter.enqueued
+                )
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "normal") -> AsyncIterator[None]:
+        if self.max_concurrency <= 0:
+            yield
+            return
+        with stage("llm_queue"):
+            await self.acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (
+                time.perf_counter() - start
+            )
+            self.release()
+
+
+_admission: AdmissionController | None = None
+
+
+def get_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController(
+            settings.LLM_MAX_CONCURRENCY,
+            settings.LLM_MAX_QUEUE,
+            settings.LLM_QUEUE_TIMEOUT_SEC,
+        )
+    return _admission
+
+
+def reset_admission() -> None:
+    global _admission
+    _admission = None
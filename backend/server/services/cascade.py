@@ -0,0 +1,135 @@
+"""
+Каскад ранжирования кандидатов перед упаковкой контекста.
+
+1. Дешёвый первый этап: dense-score из векторного поиска и лексическое
+   покрытие (доля слов вопроса, встречающихся в тексте), каждый нормирован
+   в [0, 1] внутри пула и смешан с весом ``lexical_weight``. По нему
+   оставляем ``keep`` лучших. BM25 по самому пулу здесь не годится: в
+   маленьком пуле слова вопроса есть почти в каждом кандидате, и их IDF
+   обнуляется.
+2. Ранний выход: если между depth-м и (depth+1)-м кандидатом по дешёвому
+   скору разрыв не меньше ``margin``, состав top-depth уже очевиден —
+   реранкер не вызывается.
+3. Иначе реранкер (CrossEncoder или late interaction, RERANK_MODE) получает
+   только полосу неуверенности вокруг границы top-depth (не больше
+   ``max_pairs``): кандидатов, которые обгоняют (depth+1)-го меньше чем на
+   ``margin`` или отстают от depth-го меньше чем на ``margin``. Те, кто выше
+   полосы, в top-depth уже точно попали, те, кто ниже, — точно нет; и те и
+   другие сохраняют порядок первого этапа.
+
+Скоры реранкера (логиты CrossEncoder, MaxSim) в другой шкале, поэтому
+переранжированная полоса получает дешёвые скоры своего же диапазона в новом
+порядке: score у всех кандидатов остаётся в [0, 1] и убывает по списку, и
+MMR при упаковке не зависит от масштаба логитов.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence, Set
+
+import numpy as np
+
+from .packing import Candidate
+from ..telemetry.metrics import batch_size, rerank_cascade_total
+from ..telemetry.timing import stage
+
+# (вопрос, кандидаты) -> скоры второго этапа
+RerankFn = Callable[[str, Sequence[Candidate]], List[float]]
+
+_token = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class CascadeResult:
+    candidates: List[Candidate]
+    reranked: int
+    outcome: str  # "reranked" | "early_exit" | "no_reranker" | "failed"
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    spread = float(values.max() - values.min()) if values.size else 0.0
+    if spread <= 0:
+        return np.ones_like(values)
+    return (values - values.min()) / spread
+
+
+def _terms(text: str) -> Set[str]:
+    return {t.lower() for t in _token.findall(text)}
+
+
+def first_stage_scores(
+    question: str, candidates: List[Candidate], lexical_weight: float = 0.3
+) -> np.ndarray:
+    """Смесь нормированных dense-скоров и покрытия слов вопроса."""
+    if not candidates:
+        return np.zeros(0)
+    dense = _minmax(np.array([c.score for c in candidates], dtype=np.float64))
+    q_terms = _terms(question)
+    if lexical_weight <= 0 or not q_terms:
+        return dense
+    lexical = np.array(
+        [len(q_terms & _terms(c.text)) / len(q_terms) for c in candidates]
+    )
+    return (1 - lexical_weight) * dense + lexical_weight * _minmax(lexical)
+
+
+def rerank_cascade(
+    question: str,
+    candidates: List[Candidate],
+    depth: int,
+    rerank: Optional[RerankFn],
+    *,
+    keep: int,
+    margin: float = 0.1,
+    max_pairs: int = 12,
+    lexical_weight: float = 0.3,
+) -> CascadeResult:
+    """
+    Кандидаты в итоговом порядке со скорами первого этапа; у переранжированной
+    полосы они переставлены по скору реранкера.
+    """
+    if not candidates:
+        return CascadeResult([], 0, "early_exit")
+    cheap = first_stage_scores(question, candidates, lexical_weight)
+    order = np.argsort(-cheap, kind="stable")[: max(keep, depth)]
+    ranked = [candidates[i] for i in order]
+    scores = cheap[order]
+    for c, s in zip(ranked, scores):
+        c.score = float(s)
+
+    def done(outcome: str, reranked: int = 0) -> CascadeResult:
+        rerank_cascade_total.labels(outcome).inc()
+        return CascadeResult(ranked, reranked, outcome)
+
+    if rerank is None:
+        return done("no_reranker")
+    # кандидатов не больше depth — все они и так в top-depth
+    if len(ranked) <= depth or scores[depth - 1] - scores[depth] >= margin:
+        return done("early_exit")
+
+    # полоса неуверенности [lo, hi) вокруг границы между depth-1 и depth
+    lo = int(np.count_nonzero(scores - scores[depth] >= margin))
+    hi = int(np.count_nonzero(scores > scores[depth - 1] - margin))
+    if hi - lo > max(2, max_pairs):
+        # широкая полоса — берём max_pairs ближайших к границе
+        width = max(2, max_pairs)
+        lo = min(max(lo, depth - width // 2), hi - width)
+        hi = lo + width
+    band = ranked[lo:hi]
+    batch_size.labels("rerank").observe(len(band))
+    try:
+        with stage("rerank", batch=len(band)):
+            second = np.array([float(s) for s in rerank(question, band)])
+    except Exception:  # noqa: BLE001 - без реранкера остаётся порядок первого этапа
+        return done("failed")
+    new_order = np.argsort(-second, kind="stable")
+    # в шкалу первого этапа: диапазон дешёвых скоров полосы, порядок — реранкера
+    top, bottom = float(scores[lo]), float(scores[hi - 1])
+    spread = _minmax(second[new_order])
+    band = [band[i] for i in new_order]
+    for c, s in zip(band, spread):
+        c.score = bottom + float(s) * (top - bottom)
+    ranked = ranked[:lo] + band + ranked[hi:]
+    return done("reranked", len(band))
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import bisect
 import html
 import re
 from typing import Any, Dict, List, Optional, Tuple
@@ -9,11 +10,16 @@ try:
     _ENC = tiktoken.get_encoding("cl100k_base")
 
     def _encode(txt: str) -> List[int]:
-        return _ENC.encode(txt)
+        return _ENC.encode(txt, disallowed_special=())
 
     def _decode(tokens: List[int]) -> str:
         return _ENC.decode(tokens)
 
+    def _token_starts(txt: str) -> List[int]:
+        """Offset mapping: индекс символа в txt, с которого начинается каждый токен."""
+        _, starts = _ENC.decode_with_offsets(_encode(txt))
+        return starts
+
 except Exception:
     _WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
 
@@ -23,6 +29,21 @@ except Exception:
     def _decode(tokens: List[int]) -> str:
         raise RuntimeError("Fallback tokenizer cannot decode tokens back to text")
 
+    def _token_starts(txt: str) -> List[int]:
+        return [m.start() for m in _WORD_RE.finditer(txt)]
+
+
+def count_tokens(text: str) -> int:
+    return len(_encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Префикс text не длиннее max_tokens токенов (режем по границе токена)."""
+    starts = _token_starts(text)
+    if len(starts) <= max_tokens:
+        return text
+    return text[: starts[max(0, max_tokens)]].rstrip()
+
 
 _CODE_BLOCK_RE = re.compile(r"```.*?```", flags=re.DOTALL)
 _TAG_RE = re.compile(r"<[^>]+>")
@@ -43,8 +64,14 @@ def _normalize_ws(text: str) -> str:
     return text.strip()
 
 
+def prepare_text(text: str, strip_html: bool = True) -> str:
+    """Нормализованный текст документа; span-ы чанков — смещения именно в нём."""
+    if strip_html:
+        text = _strip_html(text)
+    return _normalize_ws(text)
+
+
 _MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*$", re.MULTILINE)
-_MD_LIST_RE = re.compile(r"^(\s*[-*+]\s+|\s*\d+\.\s+)", re.MULTILINE)
 
 
 def _split_markdown_sections(
@@ -71,6 +98,10 @@ def _split_markdown_sections(
         sections.append((start, end, heading, level))
 
     result: List[Tuple[str, Tuple[int, int], Dict[str, str]]] = []
+    # текст до первого заголовка — отдельная секция без заголовка
+    first = heads[0].start()
+    if first > 0 and text[:first].strip():
+        result.append((text[:first], (0, first), {"heading": "", "level": "0"}))
     for start, end, heading, level in sections:
         seg = text[start:end]
         result.append((seg, (start, end), {"heading": heading, "level": level}))
@@ -80,17 +111,6 @@ def _split_markdown_sections(
 _SENT_END_RE = re.compile(r"(?<!\b[A-ZА-ЯЁ]\.)(?<=[\.\!\?])\s+(?=[A-ZА-ЯЁ])")
 
 
-def _split_paragraphs(text: str) -> List[Tuple[str, Tuple[int, int]]]:
-    parts: List[Tuple[str, Tuple[int, int]]] = []
-    start = 0
-    for block in text.split("\n\n"):
-        s = start
-        e = s + len(block)
-        parts.append((block, (s, e)))
-        start = e + 2
-    return [p for p in parts if p[0].strip()]
-
-
 def _split_sentences(block: str) -> List[str]:
     block = block.strip()
     if not block:
@@ -115,37 +135,42 @@ def _split_sentences(block: str) -> List[str]:
     return merged
 
 
-def _pack_by_tokens(frags: List[str], chunk_size: int, overlap: int) -> List[str]:
-    chunks: List[str] = []
-    cur_tokens: List[int] = []
-    cur_texts: List[str] = []
+# Места, где чанк может закончиться: перевод строки или конец предложения
+_BREAK_RE = re.compile(r"\n+|(?<=[\.\!\?\;])\s+")
 
-    def flush() -> None:
-        if not cur_texts:
-            return
-        text = " ".join(cur_texts).strip()
-        if text:
-            chunks.append(text)
 
-    for frag in frags:
-        toks = _encode(frag)
-        if len(cur_tokens) + len(toks) <= chunk_size:
-            cur_tokens.extend(toks)
-            cur_texts.append(frag)
-        else:
-            flush()
-            if overlap > 0 and cur_texts:
-                last = cur_texts[-1]
-                cur_tokens = _encode(last)
-                cur_texts = [last]
-            else:
-                cur_tokens = []
-                cur_texts = []
-            cur_tokens.extend(toks)
-            cur_texts.append(frag)
+def _break_points(text: str, starts: List[int]) -> List[int]:
+    """Индексы токенов, перед которыми можно резать (границы строк и предложений)."""
+    n = len(starts)
+    points = {bisect.bisect_left(starts, m.start()) for m in _BREAK_RE.finditer(text)}
+    points.add(n)
+    return sorted(p for p in points if 0 < p <= n)
 
-    flush()
-    return chunks
+
+def _pack_by_tokens(
+    n_tokens: int, breaks: List[int], chunk_size: int, overlap: int
+) -> List[Tuple[int, int]]:
+    """
+    Упаковка по уже посчитанным токенам, без повторного encode.
+    Чанк заканчивается на самой дальней границе предложения, которая влезает
+    в chunk_size (или режется по chunk_size, если границ нет), а следующий
+    начинается ровно на overlap токенов раньше. Возвращает полуинтервалы токенов.
+    """
+    chunk_size = max(1, chunk_size)
+    overlap = max(0, min(overlap, chunk_size - 1))
+    ranges: List[Tuple[int, int]] = []
+    start = 0
+    while start < n_tokens:
+        limit = start + chunk_size
+        if limit >= n_tokens:
+            ranges.append((start, n_tokens))
+            break
+        # граница должна оставлять прогресс после overlap, иначе режем жёстко
+        i = bisect.bisect_right(breaks, limit) - 1
+        end = breaks[i] if i >= 0 and breaks[i] > start + overlap else limit
+        ranges.append((start, end))
+        start = end - overlap
+    return ranges
 
 
 def split_with_metadata(
@@ -160,9 +185,7 @@ def split_with_metadata(
     if not text or not isinstance(text, str):
         return []
 
-    if strip_html:
-        text = _strip_html(text)
-    text = _normalize_ws(text)
+    text = prepare_text(text, strip_html)
 
     sections: List[Tuple[str, Tuple[int, int], Dict[str, str]]]
     sections = (
@@ -173,30 +196,26 @@ def split_with_metadata(
 
     all_chunks: List[Dict[str, Any]] = []
     for section_text, (s_start, s_end), meta in sections:
-        paras = _split_paragraphs(section_text)
-        sentences: List[str] = []
-        for para, _ in paras:
-            p = para.strip()
-            if not p:
-                continue
-            if _MD_LIST_RE.search(p):
-                for line in p.splitlines():
-                    line = line.strip()
-                    if line:
-                        sentences.append(line)
-            else:
-                sentences.extend(_split_sentences(p))
-
-        packed = _pack_by_tokens(sentences, chunk_size=chunk_size, overlap=overlap)
-        for ch in packed:
+        # одна токенизация на секцию; тексты чанков режем по offset mapping
+        starts = _token_starts(section_text)
+        if not starts:
+            continue
+        breaks = _break_points(section_text, starts)
+        for t_start, t_end in _pack_by_tokens(len(starts), breaks, chunk_size, overlap):
+            c_start = starts[t_start]
+            c_end = starts[t_end] if t_end < len(starts) else len(section_text)
             all_chunks.append(
                 {
-                    "text": ch,
+                    "text": section_text[c_start:c_end],
                     "heading": meta.get("heading", ""),
                     "level": meta.get("level", "0"),
-                    "span": [s_start, s_end],
+                    # span — точный диапазон чанка в нормализованном документе
+                    "span": [s_start + c_start, s_start + c_end],
+                    "section_span": [s_start, s_end],
                     "filename": filename or "",
-                    "document_id": (int(document_id) if document_id is not None else None),
+                    "document_id": (
+                        int(document_id) if document_id is not None else None
+                    ),
                 }
             )
 
@@ -207,6 +226,8 @@ def split_with_metadata(
             continue
         if len(t) < 50:
             continue
+        lead = len(c["text"]) - len(c["text"].lstrip())
+        c["span"] = [c["span"][0] + lead, c["span"][0] + lead + len(t)]
         c["text"] = t
         cleaned.append(c)
 
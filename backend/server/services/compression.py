@@ -0,0 +1,109 @@
+"""
+Сжатие контекста под вопрос перед генерацией.
+
+Фрагменты режутся на предложения (chunking._split_sentences), предложения и
+вопрос эмбеддятся одним батчем, и в промпт попадают только самые близкие к
+вопросу предложения вместе с соседями — пока не набран целевой объём
+(доля от исходного или явное число токенов). Порядок предложений внутри
+фрагмента сохраняется, пропуски помечаются многоточием.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+
+from .chunking import _split_sentences, count_tokens
+from .interfaces import Embeddings
+from ..telemetry.metrics import compression_ratio
+
+GAP = " … "
+
+
+@dataclass
+class CompressionStats:
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def ratio(self) -> float:
+        return self.tokens_after / self.tokens_before if self.tokens_before else 1.0
+
+
+def compress_contexts(
+    question: str,
+    contexts: List[str],
+    embed: Embeddings,
+    *,
+    ratio: float = 0.4,
+    target_tokens: Optional[int] = None,
+    neighbours: int = 1,
+) -> Tuple[List[str], CompressionStats]:
+    """
+    Вернуть сжатые контексты (список той же длины; "" — из фрагмента не
+    осталось ни одного предложения) и статистику по токенам.
+    """
+    sentences: List[Tuple[int, int, str]] = []  # (фрагмент, номер предложения, текст)
+    for ci, ctx in enumerate(contexts):
+        for si, sent in enumerate(s for s in _split_sentences(ctx) if s.strip()):
+            sentences.append((ci, si, sent))
+    if not sentences:
+        return list(contexts), CompressionStats(0, 0)
+
+    tokens = [count_tokens(s) for _, _, s in sentences]
+    before = sum(tokens)
+    target = target_tokens if target_tokens else math.ceil(before * ratio)
+    if target >= before:
+        compression_ratio.observe(1.0)
+        return list(contexts), CompressionStats(before, before)
+
+    # один батч: вопрос + все предложения
+    mat = embed.embed_array([question] + [s for _, _, s in sentences])
+    norms = np.linalg.norm(mat, axis=1)
+    norms[norms == 0] = 1.0
+    mat = mat / norms[:, None]
+    scores = mat[1:] @ mat[0]
+
+    index = {(ci, si): i for i, (ci, si, _) in enumerate(sentences)}
+    kept: Set[int] = set()
+    used = 0
+    for i in np.argsort(-scores, kind="stable"):
+        if used >= target:
+            break
+        # самое релевантное предложение берём всегда, остальные — если влезают
+        if i in kept or (kept and used + tokens[i] > target):
+            continue
+        ci, si, _ = sentences[i]
+        # предложение и соседи того же фрагмента: связный кусок вместо обрывков
+        for sj in sorted(
+            range(si - neighbours, si + neighbours + 1), key=lambda x: abs(x - si)
+        ):
+            j = index.get((ci, sj))
+            if (
+                j is not None
+                and j not in kept
+                and (j == i or used + tokens[j] <= target)
+            ):
+                kept.add(j)
+                used += tokens[j]
+
+    out: List[str] = []
+    for ci in range(len(contexts)):
+        parts: List[str] = []
+        prev = -1
+        for i in sorted(j for j in kept if sentences[j][0] == ci):
+            si = sentences[i][1]
+            if parts and si != prev + 1:
+                parts.append(GAP)
+            elif parts:
+                parts.append(" ")
+            parts.append(sentences[i][2])
+            prev = si
+        out.append("".join(parts))
+
+    stats = CompressionStats(before, used)
+    compression_ratio.observe(stats.ratio)
+    return out, stats
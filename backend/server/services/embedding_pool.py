@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import math
+import multiprocessing
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from multiprocessing.connection import Connection, wait
+from typing import Any, Dict, List, Optional, Set, Tuple, cast
+
+import numpy as np
+
+from ..telemetry.metrics import embedding_queue_depth
+from .interfaces import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# (job_id, тексты, имя сегмента shared memory под результат; None — эмбеддинги токенов)
+Task = Tuple[int, List[str], Optional[str]]
+
+# сколько текстов максимум уходит одному воркеру за раз
+_MAX_TASK = 64
+
+
+def _worker_main(conn: Connection) -> None:
+    # Импорт внутри: модуль грузится в чистом spawn-процессе
+    from .embeddings import build_local_embeddings
+
+    try:
+        embedder = build_local_embeddings()
+        dim = embedder.embed_array(["warmup"]).shape[1]
+    except Exception as exc:  # noqa: BLE001 - ошибка уходит в родителя
+        conn.send(("failed", -1, repr(exc)))
+        return
+    conn.send(("ready", -1, dim))
+
+    while True:
+        try:
+            task: Optional[Task] = conn.recv()
+        except EOFError:  # родитель закрыл pipe
+            return
+        if task is None:
+            return
+        job_id, texts, shm_name = task
+        if shm_name is None:
+            # матрицы токенов разной длины — обратно по pipe (late interaction)
+            try:
+                conn.send(("tokens", job_id, embedder.embed_tokens(texts)))
+            except Exception as exc:  # noqa: BLE001
+                conn.send(("error", job_id, repr(exc)))
+            continue
+        try:
+            # float32-матрица без промежуточных списков сразу копируется в сегмент
+            vecs = embedder.embed_array(texts)
+            shm = shared_memory.SharedMemory(name=shm_name)
+            try:
+                out = np.ndarray(vecs.shape, dtype=np.float32, buffer=shm.buf)
+                out[:] = vecs
+                del out
+            finally:
+                shm.close()
+            conn.send(("done", job_id, None))
+        except Exception as exc:  # noqa: BLE001
+            conn.send(("error", job_id, repr(exc)))
+
+
+class EmbeddingPool(Embeddings):
+    """
+    Эмбеддинги в отдельных процессах: каждый воркер держит свою копию модели,
+    получает пачки текстов по своему pipe и пишет float32-матрицу прямо в
+    сегмент shared memory, который выделил родитель. Через pipe идут только
+    короткие служебные сообщения, а не списки float-ов. Эмбеддинги токенов
+    (late interaction) разной длины возвращаются по pipe массивами.
+
+    У каждого воркера свой pipe, а не общая очередь: убитый посреди чтения
+    процесс (OOM, terminate) не оставляет за собой захваченную блокировку
+    очереди, а родитель точно знает, какие задачи были у него. Упавший воркер
+    перезапускается, и отказ получают только его задачи. Если воркер слота
+    ``max_start_failures`` раз подряд не смог загрузить модель, слот больше не
+    поднимается; когда так выбыли все слоты, пул помечается ``broken`` —
+    get_embeddings тогда переходит на модель в текущем процессе.
+    """
+
+    def __init__(
+        self, size: int, start_timeout: float = 300.0, max_start_failures: int = 3
+    ):
+        if size <= 0:
+            raise ValueError("size must be positive")
+        self._ctx = multiprocessing.get_context("spawn")
+        self._pending: Dict[int, Future[Any]] = {}
+        # job_id -> слот воркера, которому ушла задача
+        self._owner: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._closed = False
+        self._ready = threading.Event()
+        self._start_error: str | None = None
+        self.max_start_failures = max(1, max_start_failures)
+        self.broken: str | None = None
+        self.dim = 0
+
+        # по слотам: загрузил ли воркер модель, неудачные старты подряд, задач в работе
+        self._started = [False] * size
+        self._failures = [0] * size
+        self._load = [0] * size
+        self._retired: Set[int] = set()
+        self._send_locks = [threading.Lock() for _ in range(size)]
+        self._procs: List[Any] = [None] * size
+        self._conns: List[Connection] = []
+        for slot in range(size):
+            self._procs[slot], conn = self._spawn(slot)
+            self._conns.append(conn)
+
+        self._collector = threading.Thread(
+            target=self._collect, name="embedding-pool", daemon=True
+        )
+        self._collector.start()
+        # ждём все воркеры, а не первый готовый
+        if not self._ready.wait(start_timeout) or self._start_error:
+            self.close()
+            raise RuntimeError(
+                f"embedding workers failed to start: {self._start_error}"
+            )
+
+    def _spawn(self, slot: int) -> Tuple[Any, Connection]:
+        self._started[slot] = False
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        proc.start()
+        # копия дочернего конца у родителя закрыта: смерть воркера даёт EOF
+        child_conn.close()
+        return proc, parent_conn
+
+    def _collect(self) -> None:
+        while not self._closed and not self.broken:
+            conns = {
+                self._conns[slot]: slot
+                for slot in range(len(self._conns))
+                if slot not in self._retired
+            }
+            try:
+                ready = wait(list(conns), timeout=1.0)
+            except OSError:  # pipe закрыли в close()
+                continue
+            for ready_conn in ready:
+                conn = cast(Connection, ready_conn)
+                slot = conns[conn]
+                try:
+                    kind, job_id, payload = conn.recv()
+                except (EOFError, OSError):
+                    self._worker_died(slot)
+                    continue
+                if kind == "ready":
+                    self._on_ready(slot, int(payload))
+                elif kind == "failed":
+                    logger.warning(
+                        "Embedding worker %d failed to start: %s", slot, payload
+                    )
+                    self._start_error = str(payload)
+                    if not self._ready.is_set():
+                        # при создании пула это фатально: конструктор бросит исключение
+                        self._ready.set()
+                elif kind == "error":
+                    self._finish(job_id, RuntimeError(payload))
+                else:
+                    self._finish(job_id, None, payload)
+
+    def _on_ready(self, slot: int, dim: int) -> None:
+        self.dim = dim
+        self._started[slot] = True
+        self._failures[slot] = 0
+        if all(self._started):
+            self._ready.set()
+
+    def _worker_died(self, slot: int) -> None:
+        if self._closed:
+            return
+        self._procs[slot].join(timeout=1.0)
+        self._conns[slot].close()
+        if not self._started[slot]:
+            self._failures[slot] += 1
+        retire = self._failures[slot] >= self.max_start_failures
+        with self._lock:
+            # задачи умершего воркера не вернуть — отказываем только им
+            lost = [job_id for job_id, owner in self._owner.items() if owner == slot]
+            if retire:
+                self._retired.add(slot)
+            else:
+                # новые задачи этого слота пойдут уже в новый pipe
+                self._procs[slot], self._conns[slot] = self._spawn(slot)
+        for job_id in lost:
+            self._finish(job_id, RuntimeError("embedding worker died"))
+        if not retire:
+            logger.warning("Embedding worker %d died, restarting", slot)
+            return
+        logger.error(
+            "Embedding worker %d failed to start %d times, not restarting: %s",
+            slot,
+            self._failures[slot],
+            self._start_error,
+        )
+        if len(self._retired) == len(self._conns):
+            self._mark_broken(f"all workers failed to start: {self._start_error}")
+
+    def _mark_broken(self, reason: str) -> None:
+        with self._lock:
+            self.broken = reason
+            job_ids = list(self._pending)
+        for job_id in job_ids:
+            self._finish(job_id, RuntimeError(f"embedding pool is broken: {reason}"))
+
+    def _finish(self, job_id: int, error: Exception | None, result: Any = None) -> None:
+        with self._lock:
+            slot = self._owner.pop(job_id, None)
+            if slot is not None:
+                self._load[slot] -= 1
+            fut = self._pending.pop(job_id, None)
+            embedding_queue_depth.set(len(self._pending))
+        if fut is None:
+            return
+        if error is None:
+            fut.set_result(result)
+        else:
+            fut.set_exception(error)
+
+    def _pick_slot(self, exclude: Set[int]) -> Optional[int]:
+        # наименее загруженный из готовых; пока все перезапускаются — любой живой слот
+        alive = [s for s in range(len(self._conns)) if s not in self._retired | exclude]
+        started = [s for s in alive if self._started[s]] or alive
+        return min(started, key=lambda s: self._load[s]) if started else None
+
+    def _submit(self, texts: List[str], shm_name: Optional[str]) -> Future[Any]:
+        fut: Future[Any] = Future()
+        job_id = next(self._ids)
+        with self._lock:
+            self._pending[job_id] = fut
+            embedding_queue_depth.set(len(self._pending))
+        # воркер мог умереть, а collector ещё не увидел EOF: тогда пробуем другой слот
+        dead: Set[int] = set()
+        while True:
+            with self._lock:
+                if job_id not in self._pending:
+                    return fut  # уже завершена с ошибкой (слот умер)
+                slot = None if self.broken else self._pick_slot(dead)
+                if slot is not None:
+                    self._owner[job_id] = slot
+                    self._load[slot] += 1
+                    conn = self._conns[slot]
+            if slot is None:
+                reason = (
+                    f"embedding pool is broken: {self.broken}" if self.broken else None
+                )
+                self._finish(
+                    job_id, RuntimeError(reason or "no live embedding workers")
+                )
+                return fut
+            try:
+                with self._send_locks[slot]:
+                    conn.send((job_id, texts, shm_name))
+                return fut
+            except OSError:
+                dead.add(slot)
+                with self._lock:
+                    if self._owner.get(job_id) == slot:
+                        del self._owner[job_id]
+                        self._load[slot] -= 1
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("embedding pool is closed")
+        if self.broken:
+            raise RuntimeError(f"embedding pool is broken: {self.broken}")
+
+    def _step(self, n: int) -> int:
+        # делим на части, чтобы пачку считали все воркеры сразу
+        workers = max(1, len(self._conns) - len(self._retired))
+        return min(_MAX_TASK, math.ceil(n / workers))
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        self._check_open()
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        step = self._step(len(texts))
+        parts: List[Tuple[Future[Any], shared_memory.SharedMemory]] = []
+        for i in range(0, len(texts), step):
+            chunk = texts[i : i + step]
+            shm = shared_memory.SharedMemory(
+                create=True, size=max(1, len(chunk) * self.dim * 4)
+            )
+            parts.append((self._submit(chunk, shm.name), shm))
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        error: BaseException | None = None
+        offset = 0
+        for fut, shm in parts:
+            n = min(step, len(texts) - offset)
+            try:
+                fut.result()
+                out[offset : offset + n] = np.ndarray(
+                    (n, self.dim), dtype=np.float32, buffer=shm.buf
+                )
+            except BaseException as exc:  # noqa: BLE001 - дочищаем остальные сегменты
+                error = error or exc
+            finally:
+                shm.close()
+                shm.unlink()
+            offset += n
+        if error is not None:
+            raise error
+        return out
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_tokens(self, texts: List[str]) -> List[np.ndarray]:
+        self._check_open()
+        if not texts:
+            return []
+        step = self._step(len(texts))
+        futures = [
+            self._submit(texts[i : i + step], None) for i in range(0, len(texts), step)
+        ]
+        out: List[np.ndarray] = []
+        for fut in futures:
+            out.extend(fut.result())
+        return out
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for slot, conn in enumerate(self._conns):
+            try:
+                with self._send_locks[slot]:
+                    conn.send(None)
+            except OSError:
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+            self._owner.clear()
+            embedding_queue_depth.set(0)
+        for _, fut in pending:
+            fut.set_exception(RuntimeError("embedding pool is closed"))
@@ -1,25 +1,38 @@
 from __future__ import annotations
 
-from typing import List, Any
+from typing import Any, Dict, List, Tuple
 import hashlib
-import math
+import atexit
 import logging
+import multiprocessing
 import os
+import threading
+
+import numpy as np
 
 from .interfaces import Embeddings
 from ..core.config import settings
 
-try:  # pragma: no cover - module availability depends on environment
-    from sentence_transformers import SentenceTransformer
-    _HAS_SENTENCE_TRANSFORMERS = True
-except Exception:  # noqa: BLE001 - we intentionally swallow import issues here
-    SentenceTransformer = Any  # только для аннотаций/IDE, не используется при отсутствии пакета
-    _HAS_SENTENCE_TRANSFORMERS = False
-
 logger = logging.getLogger(__name__)
 
 _sbert_cache: Any | None = None
 _embeddings_singleton: Embeddings | None = None
+_embeddings_lock = threading.Lock()
+
+# верхняя граница кэша token -> bucket у HashEmbeddings
+_HASH_BUCKET_CACHE = 1 << 18
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.clip(norms, 1e-12, None)
+
+
+def _length_buckets(texts: List[str], batch_size: int) -> List[np.ndarray]:
+    """Индексы текстов, отсортированные по длине и нарезанные на батчи."""
+    order = np.argsort([len(t or "") for t in texts], kind="stable")
+    return [order[i : i + batch_size] for i in range(0, len(order), batch_size)]
 
 
 class HashEmbeddings(Embeddings):
@@ -30,43 +43,198 @@ class HashEmbeddings(Embeddings):
             raise ValueError("dim must be positive")
         self.dim = dim
 
+        self._buckets: Dict[str, int] = {}
+
     def _bucket(self, token: str) -> int:
-        digest = hashlib.sha256(token.encode("utf-8")).digest()
-        return int.from_bytes(digest[:8], "big") % self.dim
+        idx = self._buckets.get(token)
+        if idx is None:
+            digest = hashlib.sha256(token.encode("utf-8")).digest()
+            idx = int.from_bytes(digest[:8], "big") % self.dim
+            if len(self._buckets) < _HASH_BUCKET_CACHE:
+                self._buckets[token] = idx
+        return idx
 
-    def _vectorize(self, text: str) -> List[float]:
-        buckets = [0.0] * self.dim
-        for token in text.lower().split():
-            idx = self._bucket(token)
-            buckets[idx] += 1.0
-        norm = math.sqrt(sum(v * v for v in buckets)) or 1.0
-        return [v / norm for v in buckets]
+    def _matrix(self, texts: List[str]) -> np.ndarray:
+        # float64 + целые счётчики: результат побитно совпадает с поэлементным расчётом
+        rows: List[int] = []
+        cols: List[int] = []
+        for i, text in enumerate(texts):
+            tokens = (text or "").lower().split()
+            rows.extend([i] * len(tokens))
+            cols.extend(self._bucket(t) for t in tokens)
+        mat = np.zeros((len(texts), self.dim), dtype=np.float64)
+        np.add.at(mat, (rows, cols), 1.0)
+        norms = np.sqrt((mat * mat).sum(axis=1, keepdims=True))
+        return mat / np.where(norms > 0, norms, 1.0)
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        return [self._vectorize(t or "") for t in texts]
+        return self._matrix(texts).tolist()
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        return self._matrix(texts).astype(np.float32)
+
+    def embed_tokens(self, texts: List[str]) -> List[np.ndarray]:
+        # токен — one-hot своего бакета; MaxSim по ним = доля слов вопроса в тексте
+        out = []
+        for text in texts:
+            buckets = sorted({self._bucket(t) for t in (text or "").lower().split()})
+            mat = np.zeros((len(buckets), self.dim), dtype=np.float32)
+            mat[np.arange(len(buckets)), buckets] = 1.0
+            out.append(mat)
+        return out
 
 
 class SbertEmbeddings(Embeddings):
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, batch_size: int = 64):
         global _sbert_cache
-        if not _HAS_SENTENCE_TRANSFORMERS:
-            raise RuntimeError("sentence-transformers is unavailable")
-        if _sbert_cache is not None and getattr(_sbert_cache, "_model_card", None) == model_name:
+        # импорт здесь, а не в модуле: sentence-transformers тянет torch (секунды),
+        # а при EMBED_PROVIDER=hash/onnx, в воркере и в тестах он не нужен
+        try:
+            from sentence_transformers import SentenceTransformer
+        except Exception as e:  # noqa: BLE001 - нет пакета или сломан torch
+            raise RuntimeError("sentence-transformers is unavailable") from e
+        if (
+            _sbert_cache is not None
+            and getattr(_sbert_cache, "_model_card", None) == model_name
+        ):
             self.model = _sbert_cache
         else:
             model = SentenceTransformer(model_name)
             setattr(model, "_model_card", model_name)
             _sbert_cache = model
             self.model = model
+        self.batch_size = max(1, batch_size)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        out = np.empty(
+            (len(texts), self.model.get_sentence_embedding_dimension()), np.float32
+        )
+        # Короткие и длинные тексты в одном батче — это паддинг до самого длинного,
+        # поэтому считаем пачками одинаковой длины и возвращаем в исходном порядке.
+        for idx in _length_buckets(texts, self.batch_size):
+            out[idx] = self.model.encode(
+                [texts[i] for i in idx],
+                batch_size=len(idx),
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+            )
+        return out
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        raw_vecs = self.model.encode(texts, normalize_embeddings=True)
-        if hasattr(raw_vecs, "tolist"):
-            return raw_vecs.tolist()
-        return [list(vec) for vec in raw_vecs]
+        return self.embed_array(texts).tolist()
 
+    def embed_tokens(self, texts: List[str]) -> List[np.ndarray]:
+        # encode обрезает token_embeddings по attention mask, паддинга в них нет
+        mats = self.model.encode(
+            texts, batch_size=self.batch_size, output_value="token_embeddings"
+        )
+        return [
+            _normalize_rows(np.asarray(m.cpu() if hasattr(m, "cpu") else m))
+            for m in mats
+        ]
 
-def _build_embeddings() -> Embeddings:
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Экспортированная в ONNX модель sentence-transformers (например,
+    ``optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 <dir>``).
+
+    В каталоге ожидаются ``tokenizer.json`` и ``model.onnx`` (или
+    ``model_quantized.onnx`` после int8-квантизации). Mean pooling и нормализация
+    считаются в NumPy так же, как в SentenceTransformer, поэтому векторы
+    совместимы с провайдером sbert для той же модели.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        threads: int = 0,
+        max_length: int = 256,
+        batch_size: int = 32,
+    ):
+        self.batch_size = max(1, batch_size)
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as exc:  # pragma: no cover - depends on environment
+            raise RuntimeError(
+                "onnxruntime and tokenizers are required for EMBED_PROVIDER=onnx"
+            ) from exc
+
+        model_file = model_path
+        if os.path.isdir(model_path):
+            for name in ("model_quantized.onnx", "model.onnx", "onnx/model.onnx"):
+                candidate = os.path.join(model_path, name)
+                if os.path.exists(candidate):
+                    model_file = candidate
+                    break
+            else:
+                raise FileNotFoundError(f"no ONNX model found in {model_path}")
+        tokenizer_file = os.path.join(os.path.dirname(model_file), "tokenizer.json")
+        if not os.path.exists(tokenizer_file):
+            tokenizer_file = os.path.join(model_path, "tokenizer.json")
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            model_file, sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_file)
+        self.tokenizer.enable_truncation(max_length=max_length)
+        if self.tokenizer.padding is None:
+            self.tokenizer.enable_padding()
+
+    def _hidden(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        encoded = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(ids)
+        return self.session.run(None, feeds)[0], mask
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        hidden, mask = self._hidden(texts)
+        if hidden.ndim == 2:  # модель уже отдаёт sentence embedding
+            pooled = hidden
+        else:
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(
+                weights.sum(axis=1), 1e-9, None
+            )
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        out: np.ndarray | None = None
+        for idx in _length_buckets(texts, self.batch_size):
+            vecs = self._encode_batch([texts[i] or "" for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        return out if out is not None else np.zeros((0, 0), dtype=np.float32)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_tokens(self, texts: List[str]) -> List[np.ndarray]:
+        out: List[np.ndarray] = [np.zeros((0, 0), dtype=np.float32)] * len(texts)
+        for idx in _length_buckets(texts, self.batch_size):
+            hidden, mask = self._hidden([texts[i] or "" for i in idx])
+            if hidden.ndim != 3:
+                raise NotImplementedError("ONNX model does not output token embeddings")
+            for row, i in enumerate(idx):
+                out[i] = _normalize_rows(hidden[row][mask[row].astype(bool)])
+        return out
+
+
+def build_local_embeddings() -> Embeddings:
+    """Модель в текущем процессе (так же строят её воркеры EmbeddingPool)."""
     provider = (settings.EMBED_PROVIDER or "sbert").lower()
     if provider == "hash":
         return HashEmbeddings(settings.EMBED_DIM)
@@ -75,15 +243,68 @@ def _build_embeddings() -> Embeddings:
             logger.info("Using HashEmbeddings because tests are running")
             return HashEmbeddings(settings.EMBED_DIM)
         try:
-            return SbertEmbeddings(settings.EMBED_MODEL)
+            return SbertEmbeddings(
+                settings.EMBED_MODEL, batch_size=settings.EMBED_BATCH_SIZE
+            )
         except Exception as exc:  # noqa: BLE001 - we want a graceful fallback
             logger.warning("Falling back to HashEmbeddings due to error: %s", exc)
             return HashEmbeddings(settings.EMBED_DIM)
+    if provider == "onnx":
+        try:
+            return OnnxEmbeddings(
+                settings.EMBED_ONNX_PATH,
+                threads=settings.EMBED_ONNX_THREADS,
+                max_length=settings.EMBED_MAX_LENGTH,
+                batch_size=settings.EMBED_BATCH_SIZE,
+            )
+        except Exception as exc:  # noqa: BLE001 - same graceful fallback as sbert
+            logger.warning("Falling back to HashEmbeddings due to error: %s", exc)
+            return HashEmbeddings(settings.EMBED_DIM)
     raise NotImplementedError(f"Unsupported EMBED_PROVIDER={provider}")
 
 
+def _build_embeddings() -> Embeddings:
+    size = settings.EMBED_POOL_SIZE
+    # daemon-процессы (например, prefork-воркеры Celery) не могут порождать дочерние
+    if size > 0 and not multiprocessing.current_process().daemon:
+        from .embedding_pool import EmbeddingPool
+
+        try:
+            pool = EmbeddingPool(size)
+        except Exception as exc:  # noqa: BLE001 - считаем в процессе, как раньше
+            logger.warning("Embedding pool unavailable, embedding in-process: %s", exc)
+        else:
+            atexit.register(pool.close)
+            return pool
+    return build_local_embeddings()
+
+
 def get_embeddings() -> Embeddings:
     global _embeddings_singleton
-    if _embeddings_singleton is None:
-        _embeddings_singleton = _build_embeddings()
-    return _embeddings_singleton
+    with _embeddings_lock:
+        if _embeddings_singleton is None:
+            _embeddings_singleton = _build_embeddings()
+        broken = getattr(_embeddings_singleton, "broken", None)
+        if broken:
+            # воркеры пула так и не смогли загрузить модель — считаем в процессе
+            logger.warning(
+                "Embedding pool is broken (%s), embedding in-process", broken
+            )
+            pool, _embeddings_singleton = (
+                _embeddings_singleton,
+                build_local_embeddings(),
+            )
+            close = getattr(pool, "close", None)
+            if close is not None:
+                close()
+        return _embeddings_singleton
+
+
+def reset_embeddings() -> None:
+    """Сбросить синглтон (и остановить пул воркеров, если он был)."""
+    global _embeddings_singleton
+    with _embeddings_lock:
+        current, _embeddings_singleton = _embeddings_singleton, None
+    close = getattr(current, "close", None)
+    if close is not None:
+        close()
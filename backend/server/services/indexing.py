@@ -1,8 +1,18 @@
 from __future__ import annotations
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Tuple
 import uuid
 
-from .interfaces import Embeddings, VectorStore
+from ..core.config import settings
+from .interfaces import Embeddings, SparseVector, VectorStore
+from .projection import Projection, get_projection, get_shadow_projection, project
+from .sparse import encode_documents
+from .vectorstore import (
+    forget_shadow_deletes,
+    get_shadow_vectorstore,
+    record_shadow_deletes,
+)
+from ..telemetry.metrics import batch_size
+from ..telemetry.timing import stage
 
 # Фиксированный namespace для детерминированных UUID
 _UUID_NS = uuid.UUID("11111111-2222-3333-4444-555555555555")
@@ -18,16 +28,27 @@ class Indexer:
         self.embed = embed
         self.vectorstore = vectorstore
 
-    def upsert_chunks(self, chunks: List[str], metas: List[Dict[str, Any]]) -> int:
-        if len(chunks) != len(metas):
-            raise ValueError("chunks and metas must have equal length")
-        if not chunks:
-            return 0
+    def _targets(self) -> List[VectorStore]:
+        # Во время переиндексации пишем и в теневой индекс, чтобы свежие изменения
+        # не потерялись при переключении.
+        shadow = get_shadow_vectorstore()
+        if shadow is None or shadow is self.vectorstore:
+            return [self.vectorstore]
+        return [self.vectorstore, shadow]
 
-        vectors = self.embed.embed(chunks)
-        if len(vectors) != len(chunks):
-            raise RuntimeError("embeddings size mismatch")
+    @staticmethod
+    def _projection(vs: VectorStore) -> Projection | None:
+        # у теневого индекса может быть своя (новая) проекция
+        return (
+            get_shadow_projection()
+            if vs is get_shadow_vectorstore()
+            else get_projection()
+        )
 
+    @staticmethod
+    def _payloads(
+        metas: List[Dict[str, Any]],
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
         ids: List[str] = []
         payloads: List[Dict[str, Any]] = []
         for i, m in enumerate(metas):
@@ -38,6 +59,74 @@ class Indexer:
             m["point_id"] = point_id
             ids.append(point_id)
             payloads.append(m)
+        return ids, payloads
 
-        self.vectorstore.upsert(ids=ids, vectors=vectors, payloads=payloads)
+    def upsert_chunks(self, chunks: List[str], metas: List[Dict[str, Any]]) -> int:
+        if len(chunks) != len(metas):
+            raise ValueError("chunks and metas must have equal length")
+        if not chunks:
+            return 0
+
+        batch_size.labels("embed").observe(len(chunks))
+        with stage("embed", batch=len(chunks)):
+            vectors = self.embed.embed_array(chunks)
+        if len(vectors) != len(chunks):
+            raise RuntimeError("embeddings size mismatch")
+
+        ids, payloads = self._payloads(metas)
+        targets = self._targets()
+        sparse: List[SparseVector] = []
+        if any(vs.supports_sparse for vs in targets):
+            # BM25-веса считаем только для store-ов, которые их хранят (Qdrant hybrid)
+            with stage("sparse", batch=len(chunks)):
+                sparse = encode_documents(chunks, settings.QDRANT_SPARSE_AVGDL)
+
+        if self.vectorstore is not get_shadow_vectorstore():
+            # свежая запись после удаления отменяет повтор удаления в тени;
+            # запись самой переиндексации (из снимка docstore) — нет
+            forget_shadow_deletes(ids)
+        with stage("index"):
+            for vs in targets:
+                dense = project(vectors, self._projection(vs))
+                if vs.supports_sparse:
+                    vs.upsert_hybrid(ids, dense, sparse, payloads)
+                else:
+                    vs.upsert(ids=ids, vectors=dense, payloads=payloads)
         return len(chunks)
+
+    def missing_chunks(self, chunk_ids: List[str]) -> List[str]:
+        """chunk_id, точек которых нет в основном индексе (в порядке chunk_ids)."""
+        if not chunk_ids:
+            return []
+        point_ids = [_to_point_id(cid) for cid in chunk_ids]
+        present = self.vectorstore.existing(point_ids)
+        return [cid for cid, pid in zip(chunk_ids, point_ids) if pid not in present]
+
+    def update_chunk_meta(self, metas: List[Dict[str, Any]]) -> int:
+        """
+        Переписать payload уже проиндексированных чанков без повторного эмбеддинга:
+        у неизменённого чанка в новой версии документа сдвигаются chunk_index,
+        chunk_total и sha документа.
+        """
+        if not metas:
+            return 0
+        ids, payloads = self._payloads(metas)
+        with stage("index"):
+            for vs in self._targets():
+                vs.set_payload(ids, payloads)
+        return len(metas)
+
+    def delete_chunks(self, chunk_ids: List[str]) -> int:
+        if not chunk_ids:
+            return 0
+        point_ids = [_to_point_id(cid) for cid in chunk_ids]
+        record_shadow_deletes(point_ids)
+        for vs in self._targets():
+            vs.delete(point_ids)
+        return len(chunk_ids)
+
+    def delete_document(self, document_id: int, chunk_ids: Iterable[str] = ()) -> None:
+        # chunk_ids — для повтора удаления в теневом индексе перед переключением
+        record_shadow_deletes([_to_point_id(cid) for cid in chunk_ids])
+        for vs in self._targets():
+            vs.delete_by_filter({"document_id": document_id})
@@ -0,0 +1,443 @@
+from __future__ import annotations
+import hashlib
+import io
+import mimetypes
+import multiprocessing
+import os
+import tarfile
+import threading
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from ..db.docstore import LocalDocStore
+from .chunking import prepare_text, split_with_metadata
+from .indexing import Indexer
+from .late_interaction import store_chunk_tokens
+from ..telemetry.timing import stage
+
+ChunkRecord = Tuple[str, Dict[str, Any]]
+# (filename, содержимое, content_type)
+Upload = Tuple[str, bytes, str]
+
+_chunk_pool: ProcessPoolExecutor | None = None
+_chunk_pool_lock = threading.Lock()
+
+
+def stable_document_id(filename: str, document_hash: str) -> int:
+    """Build a deterministic integer identifier for a document.
+
+    Именованный документ идентифицируется только по имени файла: новая версия
+    заменяет предыдущую, а не копится рядом. Для файлов без имени в id
+    подмешивается хеш содержимого.
+    """
+
+    hasher = hashlib.blake2b(digest_size=8)
+    hasher.update(filename.encode("utf-8", errors="ignore"))
+    if not filename:
+        hasher.update(b"\0")
+        hasher.update(document_hash.encode("ascii"))
+    return int.from_bytes(hasher.digest(), "big", signed=False)
+
+
+def chunk_content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def build_chunk_records(
+    rich_chunks: List[Dict[str, Any]],
+    *,
+    document_id: int,
+    filename: str,
+    document_hash: str,
+    document_size: int,
+    content_type: str,
+) -> List[ChunkRecord]:
+    """
+    Превращает вывод split_with_metadata в записи docstore.
+    chunk_id адресуется содержимым ("<document_id>:<sha256[:16]>"), поэтому
+    неизменённый чанк в новой версии документа получает тот же id.
+    """
+    records: List[ChunkRecord] = []
+    seen: Dict[str, int] = {}
+    chunk_total = len(rich_chunks)
+
+    for idx, rc in enumerate(rich_chunks):
+        text = rc["text"]
+        chunk_hash = chunk_content_hash(text)
+        cid = f"{document_id}:{chunk_hash[:16]}"
+        # одинаковые фрагменты внутри документа различаем порядковым суффиксом
+        dup = seen.get(cid, 0)
+        seen[cid] = dup + 1
+        if dup:
+            cid = f"{cid}-{dup}"
+        meta = {
+            "chunk_id": cid,
+            "chunk_index": idx,
+            "chunk_sha256": chunk_hash,
+            "filename": filename,
+            "document_id": document_id,
+            "document_sha256": document_hash,
+            "document_size": document_size,
+            "chunk_total": chunk_total,
+            "content_type": content_type,
+            "heading": rc.get("heading", ""),
+            "level": rc.get("level", "0"),
+            "span": rc.get("span", [0, 0]),
+            "section_span": rc.get("section_span", [0, 0]),
+        }
+        records.append((cid, {"meta": meta, "text": text}))
+    return records
+
+
+def source_key(document_id: int, document_hash: str) -> str:
+    # ключ адресуется содержимым: новая версия документа не перетирает файл,
+    # который ещё читают чанки предыдущей
+    return f"{document_id}-{document_hash[:16]}"
+
+
+def _byte_offsets(text: str, positions: List[int]) -> Dict[int, int]:
+    """Символьные позиции -> байтовые смещения в UTF-8 за один проход по тексту."""
+    out: Dict[int, int] = {}
+    pos = nbytes = 0
+    for p in sorted(set(positions)):
+        nbytes += len(text[pos:p].encode("utf-8"))
+        pos = p
+        out[p] = nbytes
+    return out
+
+
+def as_offset_views(
+    records: List[ChunkRecord], key: str, text: str
+) -> List[ChunkRecord]:
+    """
+    Записи для docstore без копии текста: только ссылка на исходник и байтовый
+    диапазон [start, end) чанка в нём (span из метаданных — в символах).
+    """
+    spans = [rec["meta"]["span"] for _, rec in records]
+    offsets = _byte_offsets(text, [p for span in spans for p in span])
+    return [
+        (cid, {"meta": rec["meta"], "source": key, "offsets": [offsets[a], offsets[b]]})
+        for (cid, rec), (a, b) in zip(records, spans)
+    ]
+
+
+def plan_update(
+    manifest: Optional[Dict[str, Any]], records: List[ChunkRecord]
+) -> Tuple[List[ChunkRecord], List[str]]:
+    """
+    Дифф новой версии против манифеста предыдущей.
+    Возвращает (чанки, которые нужно эмбеддить, id чанков, которые нужно убрать).
+    """
+    previous: Set[str] = set((manifest or {}).get("chunk_ids") or [])
+    current = {cid for cid, _ in records}
+    fresh = [(cid, rec) for cid, rec in records if cid not in previous]
+    retired = sorted(previous - current)
+    return fresh, retired
+
+
+def build_manifest(
+    records: List[ChunkRecord],
+    *,
+    document_id: int,
+    filename: str,
+    document_hash: str,
+    document_size: int,
+    content_type: str,
+) -> Dict[str, Any]:
+    return {
+        "document_id": document_id,
+        "filename": filename,
+        "document_sha256": document_hash,
+        "document_size": document_size,
+        "content_type": content_type,
+        "source": source_key(document_id, document_hash),
+        "chunk_ids": [cid for cid, _ in records],
+    }
+
+
+def get_chunk_pool() -> ProcessPoolExecutor:
+    """Пул процессов для чанкинга при пакетном ingest (INGEST_WORKERS, 0 — по числу ядер)."""
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            workers = settings.INGEST_WORKERS or os.cpu_count() or 1
+            # spawn: воркеру нужен только модуль chunking, а форк многопоточного
+            # процесса API небезопасен
+            _chunk_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _chunk_pool
+
+
+def expand_upload(filename: str, data: bytes, content_type: str) -> List[Upload]:
+    """Раскрывает zip/tar-архив в список файлов; обычный файл возвращается как есть."""
+    name = filename.lower()
+    members: List[Upload] = []
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or _skip_member(info.filename):
+                    continue
+                members.append(
+                    (info.filename, zf.read(info), _guess_type(info.filename))
+                )
+        return members
+    if name.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tf:
+            for member in tf.getmembers():
+                if not member.isfile() or _skip_member(member.name):
+                    continue
+                fobj = tf.extractfile(member)
+                if fobj is not None:
+                    members.append((member.name, fobj.read(), _guess_type(member.name)))
+        return members
+    return [(filename, data, content_type)]
+
+
+def _skip_member(path: str) -> bool:
+    parts = path.replace("\\", "/").split("/")
+    return any(p.startswith(".") or p == "__MACOSX" for p in parts if p)
+
+
+def _guess_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def ingest_many(
+    uploads: List[Upload],
+    *,
+    docstore: LocalDocStore,
+    indexer: Indexer,
+    pool: Executor | None = None,
+    chunk_size: int = 800,
+    overlap: int = 120,
+    wave_size: int | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Инкрементальный ingest пачки документов.
+
+    - тот же sha256, что и в манифесте -> ничего не делаем ("unchanged");
+    - иначе эмбеддим только чанки, которых не было в прошлой версии,
+      а исчезнувшие удаляем из векторного индекса и docstore.
+
+    Чанкинг идёт в pool (если передан), эмбеддинги считаются одним батчем на волну
+    из wave_size документов, записи в docstore и векторку тоже объединяются.
+    Результат — по одному dict на файл в исходном порядке; ошибка в одном файле
+    ("status": "error") не мешает остальным.
+    """
+    wave_size = wave_size or len(uploads) or 1
+    results: List[Dict[str, Any]] = []
+    for start in range(0, len(uploads), wave_size):
+        wave = uploads[start : start + wave_size]
+        results.extend(
+            _ingest_wave(
+                wave, docstore, indexer, pool, chunk_size=chunk_size, overlap=overlap
+            )
+        )
+    return results
+
+
+def _ingest_wave(
+    uploads: List[Upload],
+    docstore: LocalDocStore,
+    indexer: Indexer,
+    pool: Executor | None,
+    *,
+    chunk_size: int,
+    overlap: int,
+) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = [{} for _ in uploads]
+    # (индекс в uploads, поля документа, манифест прошлой версии, текст)
+    pending: Dict[int, Tuple[int, Dict[str, Any], Optional[Dict[str, Any]], str]] = {}
+    # чанки неизменённых документов, которых нет в индексе: берутся из docstore
+    restore: List[str] = []
+
+    for i, (filename, content_bytes, content_type) in enumerate(uploads):
+        if not content_bytes:
+            results[i] = {
+                "filename": filename,
+                "status": "error",
+                "error": "Empty file",
+            }
+            continue
+        document_hash = hashlib.sha256(content_bytes).hexdigest()
+        document_id = stable_document_id(filename, document_hash)
+        if document_id in pending:
+            prev = pending[document_id][0]
+            results[prev] = {
+                "filename": filename,
+                "status": "error",
+                "error": "Duplicate file",
+            }
+
+        manifest = docstore.get_manifest(document_id)
+        if manifest and manifest.get("document_sha256") == document_hash:
+            pending.pop(document_id, None)
+            chunk_ids = list(manifest.get("chunk_ids") or [])
+            # манифест переживает индекс: память после рестарта, откат с Qdrant,
+            # пересозданная коллекция — тогда точки документа восстанавливаем
+            missing = indexer.missing_chunks(chunk_ids)
+            restore.extend(missing)
+            results[i] = {
+                "document_id": document_id,
+                "document_hash": document_hash,
+                "filename": filename,
+                "chunks": len(chunk_ids),
+                "embedded": len(missing),
+                "retired": 0,
+                "status": "reindexed" if missing else "unchanged",
+            }
+            continue
+
+        doc_fields: Dict[str, Any] = {
+            "document_id": document_id,
+            "filename": filename,
+            "document_hash": document_hash,
+            "document_size": len(content_bytes),
+            "content_type": content_type,
+        }
+        # нормализуем здесь: этот же текст ляжет в docstore, и span-ы чанков
+        # должны указывать именно в него
+        text = prepare_text(content_bytes.decode("utf-8", errors="ignore"))
+        pending[document_id] = (i, doc_fields, manifest, text)
+
+    jobs = list(pending.values())
+    args = [
+        (
+            text,
+            fields["filename"],
+            fields["document_id"],
+            chunk_size,
+            overlap,
+            False,
+            True,
+        )
+        for _, fields, _, text in jobs
+    ]
+    chunked: List[Any]
+    with stage("chunk"):
+        if pool is not None and len(args) > 1:
+            futures = [pool.submit(split_with_metadata, *a) for a in args]
+            chunked = [f.exception() or f.result() for f in futures]
+        else:
+            chunked = [split_with_metadata(*a) for a in args]
+
+    all_records: List[ChunkRecord] = []
+    fresh_all: List[ChunkRecord] = []
+    kept_all: List[ChunkRecord] = []
+    retired_all: List[str] = []
+    manifests: List[Tuple[int, Dict[str, Any]]] = []
+    stale_sources: List[str] = []
+    for (i, fields, manifest, text), rich_chunks in zip(jobs, chunked):
+        if isinstance(rich_chunks, BaseException):
+            results[i] = {
+                "filename": fields["filename"],
+                "status": "error",
+                "error": str(rich_chunks),
+            }
+            continue
+        if not rich_chunks:
+            results[i] = {
+                "filename": fields["filename"],
+                "status": "error",
+                "error": "No chunks produced",
+            }
+            continue
+        records = build_chunk_records(rich_chunks, **fields)
+        fresh, retired = plan_update(manifest, records)
+        new_manifest = build_manifest(records, **fields)
+        docstore.put_source(new_manifest["source"], text)
+        all_records.extend(as_offset_views(records, new_manifest["source"], text))
+        if manifest:
+            fresh_ids = {cid for cid, _ in fresh}
+            kept = [(cid, rec) for cid, rec in records if cid not in fresh_ids]
+            # неизменённый чанк, потерянный индексом, эмбеддим заново
+            lost = set(indexer.missing_chunks([cid for cid, _ in kept]))
+            fresh = fresh + [(cid, rec) for cid, rec in kept if cid in lost]
+            kept_all.extend((cid, rec) for cid, rec in kept if cid not in lost)
+        fresh_all.extend(fresh)
+        retired_all.extend(retired)
+        manifests.append((fields["document_id"], new_manifest))
+        if manifest and manifest.get("source") not in (None, new_manifest["source"]):
+            stale_sources.append(manifest["source"])
+        results[i] = {
+            "document_id": fields["document_id"],
+            "document_hash": fields["document_hash"],
+            "filename": fields["filename"],
+            "chunks": len(records),
+            "embedded": len(fresh),
+            "retired": len(retired),
+            "status": "updated" if manifest else "created",
+        }
+
+    # Метаданные (chunk_index, chunk_total, sha документа) меняются у всех чанков,
+    # поэтому docstore переписываем целиком — это дёшево по сравнению с эмбеддингом.
+    # В индексе у неизменённых чанков обновляется только payload, без эмбеддинга.
+    with stage("docstore"):
+        docstore.bulk_put(all_records)
+    for cid in restore:
+        stored = docstore.get(cid)
+        if stored is not None:
+            fresh_all.append((cid, {"text": stored["text"], "meta": stored["meta"]}))
+    fresh_texts = [rec["text"] for _, rec in fresh_all]
+    indexer.upsert_chunks(fresh_texts, [rec["meta"] for _, rec in fresh_all])
+    indexer.update_chunk_meta([rec["meta"] for _, rec in kept_all])
+    store_chunk_tokens(docstore, [cid for cid, _ in fresh_all], fresh_texts)
+    indexer.delete_chunks(retired_all)
+    docstore.bulk_delete(retired_all)
+    # манифест пишем последним: если что-то выше упало, повтор пересчитает дифф
+    for document_id, manifest in manifests:
+        docstore.put_manifest(document_id, manifest)
+    for key in stale_sources:
+        docstore.delete_source(key)
+    return results
+
+
+def ingest_document(
+    content_bytes: bytes,
+    filename: str,
+    content_type: str,
+    *,
+    docstore: LocalDocStore,
+    indexer: Indexer,
+    chunk_size: int = 800,
+    overlap: int = 120,
+) -> Dict[str, Any]:
+    """
+    Инкрементальный ingest одного документа (см. ingest_many).
+    Бросает ValueError, если документ пуст или не дал ни одного чанка.
+    """
+    result = ingest_many(
+        [(filename, content_bytes, content_type)],
+        docstore=docstore,
+        indexer=indexer,
+        chunk_size=chunk_size,
+        overlap=overlap,
+    )[0]
+    if result["status"] == "error":
+        raise ValueError(result["error"])
+    return result
+
+
+def delete_document(
+    document_id: int, *, docstore: LocalDocStore, indexer: Indexer
+) -> int:
+    """
+    Удаляет документ целиком: точки в векторном индексе, чанки, исходный текст и манифест.
+    Возвращает число удалённых чанков (0 — документа не было).
+    """
+    manifest = docstore.get_manifest(document_id)
+    chunk_ids = set(docstore.list_by_document(document_id))
+    chunk_ids.update((manifest or {}).get("chunk_ids") or [])
+    if not chunk_ids and manifest is None:
+        return 0
+
+    # По фильтру, а не по id: так уходят и точки, чьи записи в docstore уже потеряны
+    indexer.delete_document(document_id, chunk_ids)
+    docstore.bulk_delete(chunk_ids)
+    if manifest and manifest.get("source"):
+        docstore.delete_source(manifest["source"])
+    docstore.delete_manifest(document_id)
+    return len(chunk_ids)
@@ -1,26 +1,99 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+# Матрица float32 (n, dim) или списки float-ов — store-ы принимают оба вида
+Vectors = Union[np.ndarray, Sequence[Sequence[float]]]
+Vector = Union[np.ndarray, Sequence[float]]
+# Разреженный вектор: (индексы, веса) одинаковой длины
+SparseVector = Tuple[List[int], List[float]]
 
 
 class Embeddings(ABC):
     @abstractmethod
     def embed(self, texts: List[str]) -> List[List[float]]: ...
 
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """Эмбеддинги одной float32-матрицей (n, dim). Провайдеры переопределяют без списков."""
+        vecs = self.embed(texts)
+        return np.asarray(vecs, dtype=np.float32).reshape(len(texts), -1)
+
+    def embed_tokens(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Нормированные эмбеддинги токенов для late interaction: на текст — float32
+        матрица (n_tokens, dim). Провайдеры без доступа к токенам не поддерживают.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not expose token embeddings"
+        )
+
 
 class LLM(ABC):
     @abstractmethod
     async def generate(self, prompt: str) -> str: ...
 
+    async def generate_with_context(
+        self, prompt: str, context: Optional[List[int]] = None
+    ) -> Tuple[str, Optional[List[int]]]:
+        """
+        Ход диалога: context — состояние, которое вернул провайдер на прошлом
+        ходе (у Ollama — токены диалога). Без поддержки — обычный generate.
+        """
+        return await self.generate(prompt), None
+
 
 class VectorStore(ABC):
+    # хранит ли store разреженные векторы (upsert_hybrid/hybrid_search_with_vectors)
+    supports_sparse: bool = False
+
     @abstractmethod
     def upsert(
         self,
         ids: List[str],
-        vectors: List[List[float]],
+        vectors: Vectors,
         payloads: List[Dict[str, Any]],
     ) -> None: ...
 
     @abstractmethod
-    def search(self, query: List[float], top_k: int) -> List[Tuple[Dict[str, Any], float]]: ...
+    def search(
+        self, query: Vector, top_k: int
+    ) -> List[Tuple[Dict[str, Any], float]]: ...
+
+    def search_with_vectors(
+        self, query: Vector, top_k: int
+    ) -> Tuple[List[Tuple[Dict[str, Any], float]], Optional[np.ndarray]]:
+        """Как search, плюс матрица найденных векторов (n, dim); None — store их не отдаёт."""
+        return self.search(query, top_k), None
+
+    def upsert_hybrid(
+        self,
+        ids: List[str],
+        vectors: Vectors,
+        sparse: List[SparseVector],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        """upsert вместе с разреженными векторами; store без их поддержки их отбрасывает."""
+        self.upsert(ids, vectors, payloads)
+
+    def hybrid_search_with_vectors(
+        self, query: Vector, sparse: SparseVector, top_k: int
+    ) -> Tuple[List[Tuple[Dict[str, Any], float]], Optional[np.ndarray]]:
+        """Dense + sparse поиск со слиянием результатов; без поддержки — только dense."""
+        return self.search_with_vectors(query, top_k)
+
+    @abstractmethod
+    def existing(self, ids: List[str]) -> Set[str]:
+        """Какие из ids есть в индексе (удалённые точки не считаются)."""
+
+    @abstractmethod
+    def set_payload(self, ids: List[str], payloads: List[Dict[str, Any]]) -> None:
+        """Дописать поля в payload существующих точек, не трогая векторы; чужие id пропускаются."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]) -> None: ...
+
+    @abstractmethod
+    def delete_by_filter(self, filters: Dict[str, Any]) -> None:
+        """Удалить все точки, у которых payload[key] == value для каждой пары из filters."""
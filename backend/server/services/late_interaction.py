@@ -0,0 +1,177 @@
+"""
+Late interaction (MaxSim) — дешёвая альтернатива CrossEncoder в каскаде rerank.
+
+При ingest для каждого чанка сохраняются нормированные эмбеддинги его токенов
+(не больше LATE_INTERACTION_MAX_TOKENS строк), по умолчанию в int8 с масштабом
+на строку. На запросе модель прогоняется только по вопросу, а скор кандидата —
+среднее по токенам вопроса максимального косинуса с токенами чанка (MaxSim, как
+в ColBERT). Все кандидаты считаются одним матричным умножением по склеенным
+матрицам токенов и ``np.maximum.reduceat`` по границам чанков — без прохода
+модели по каждой паре (вопрос, чанк), как у CrossEncoder.
+
+Токены даёт тот же энкодер, что и dense-эмбеддинги (его token states), поэтому
+точность ниже, чем у модели, обученной под late interaction; зато отдельная
+модель не нужна. Кандидаты без сохранённых токенов (ingest до включения режима,
+смена модели) кодируются на лету; POST /reindex досчитывает их для всего корпуса.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..db import get_docstore
+from ..db.docstore import LocalDocStore
+from ..telemetry.metrics import late_interaction_missing_total
+from ..telemetry.timing import stage
+from .embeddings import get_embeddings
+from .interfaces import Embeddings
+from .packing import Candidate
+
+logger = logging.getLogger(__name__)
+
+DTYPES = ("int8", "float16", "float32")
+
+# (коды (n_tokens, dim), масштаб каждой строки (n_tokens,))
+TokenMatrix = Tuple[np.ndarray, np.ndarray]
+
+_reranker: "LateInteractionReranker | None" = None
+
+
+def quantize(mat: np.ndarray, dtype: str = "int8") -> TokenMatrix:
+    """int8 — симметрично, с масштабом max|x|/127 на строку; float16/float32 — как есть."""
+    mat = np.asarray(mat, dtype=np.float32)
+    if dtype == "int8":
+        scale = np.abs(mat).max(axis=1, initial=0.0) / 127.0
+        scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        return np.round(mat / scale[:, None]).astype(np.int8), scale
+    if dtype in ("float16", "float32"):
+        return mat.astype(dtype), np.ones(len(mat), dtype=np.float32)
+    raise ValueError(
+        f"Unsupported late interaction dtype {dtype!r}, expected one of {DTYPES}"
+    )
+
+
+def dequantize(tokens: TokenMatrix) -> np.ndarray:
+    codes, scale = tokens
+    return codes.astype(np.float32) * scale[:, None]
+
+
+def maxsim(query: np.ndarray, docs: Sequence[TokenMatrix]) -> np.ndarray:
+    """MaxSim-скор каждого документа: среднее по токенам вопроса лучшего косинуса."""
+    scores = np.zeros(len(docs), dtype=np.float32)
+    present = [i for i, (codes, _) in enumerate(docs) if len(codes)]
+    if not present or not len(query):
+        return scores
+    # масштаб строки выносится за скобку: умножаем им столбцы (m, N), а не коды (N, dim)
+    codes = np.concatenate([docs[i][0] for i in present]).astype(np.float32, copy=False)
+    scale = np.concatenate([docs[i][1] for i in present])
+    sim = (np.asarray(query, dtype=np.float32) @ codes.T) * scale
+    starts = np.cumsum([0] + [len(docs[i][0]) for i in present[:-1]])
+    scores[present] = np.maximum.reduceat(sim, starts, axis=1).mean(axis=0)
+    return scores
+
+
+class LateInteractionReranker:
+    def __init__(
+        self,
+        encoder: Embeddings,
+        docstore: LocalDocStore,
+        *,
+        dtype: str = "int8",
+        max_tokens: int = 128,
+    ):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported late interaction dtype {dtype!r}")
+        self.encoder = encoder
+        self.docstore = docstore
+        self.dtype = dtype
+        self.max_tokens = max(1, max_tokens)
+
+    def encode(self, texts: List[str]) -> List[TokenMatrix]:
+        mats = self.encoder.embed_tokens(texts)
+        return [quantize(m[: self.max_tokens], self.dtype) for m in mats]
+
+    def store(self, chunk_ids: Sequence[str], texts: List[str]) -> int:
+        """Посчитать и сохранить токены чанков; возвращает число записанных."""
+        if not texts:
+            return 0
+        with stage("late_tokens", batch=len(texts)):
+            encoded = self.encode(texts)
+        for cid, (codes, scale) in zip(chunk_ids, encoded):
+            self.docstore.put_tokens(cid, codes, scale)
+        return len(encoded)
+
+    def score(self, question: str, candidates: Sequence[Candidate]) -> List[float]:
+        query = self.encoder.embed_tokens([question])[0]
+        docs: List[Optional[TokenMatrix]] = [
+            self.docstore.get_tokens(c.chunk_id) for c in candidates
+        ]
+        # токенов нет или они от модели другой размерности — считаем на лету
+        missing = [
+            i
+            for i, d in enumerate(docs)
+            if d is None or (d[0].ndim != 2 or d[0].shape[1] != query.shape[1])
+        ]
+        if missing:
+            late_interaction_missing_total.inc(len(missing))
+            for i, enc in zip(
+                missing, self.encode([candidates[i].text for i in missing])
+            ):
+                docs[i] = enc
+        return maxsim(query, [d for d in docs if d is not None]).tolist()
+
+
+def get_token_encoder() -> Embeddings:
+    """
+    Энкодер токенов — тот же провайдер, что и для sentence embeddings:
+    при EMBED_POOL_SIZE > 0 токены считает EmbeddingPool, вторая копия
+    модели в процессе API не грузится.
+    """
+    return get_embeddings()
+
+
+def get_late_reranker() -> LateInteractionReranker:
+    global _reranker
+    encoder = get_token_encoder()
+    # get_embeddings() мог заменить сломанный пул локальной моделью
+    if _reranker is None or _reranker.encoder is not encoder:
+        _reranker = LateInteractionReranker(
+            encoder,
+            get_docstore(),
+            dtype=settings.LATE_INTERACTION_DTYPE,
+            max_tokens=settings.LATE_INTERACTION_MAX_TOKENS,
+        )
+    return _reranker
+
+
+def reset_late_reranker() -> None:
+    global _reranker
+    _reranker = None
+
+
+def store_chunk_tokens(
+    docstore: LocalDocStore, chunk_ids: Sequence[str], texts: List[str]
+) -> int:
+    """
+    Сохранить токены чанков при ingest/reindex, если включён RERANK_MODE=late.
+    Ошибка не роняет ingest: такие чанки реранкер закодирует на запросе.
+    """
+    if (settings.RERANK_MODE or "").lower() != "late" or not texts:
+        return 0
+    try:
+        reranker = LateInteractionReranker(
+            get_token_encoder(),
+            docstore,
+            dtype=settings.LATE_INTERACTION_DTYPE,
+            max_tokens=settings.LATE_INTERACTION_MAX_TOKENS,
+        )
+        return reranker.store(chunk_ids, texts)
+    except (
+        Exception
+    ) as exc:  # noqa: BLE001 - токены досчитаются на запросе или при reindex
+        logger.warning("Failed to store late interaction tokens: %s", exc)
+        return 0
@@ -1,21 +1,57 @@
 from __future__ import annotations
 import httpx
+from typing import Any, Dict, List, Optional, Tuple
+
+from .chunking import count_tokens
 from .interfaces import LLM
 from ..core.config import settings
+from ..telemetry.metrics import llm_tokens, llm_tokens_total
+
+
+def _observe_tokens(
+    provider: str, prompt: str, data: Dict[str, Any], answer: str
+) -> None:
+    # Ollama сам отдаёт счётчики токенов; если их нет — считаем своим токенайзером
+    counts = {
+        "prompt": data.get("prompt_eval_count") or count_tokens(prompt),
+        "answer": data.get("eval_count") or count_tokens(answer),
+    }
+    for kind, n in counts.items():
+        llm_tokens.labels(kind).observe(int(n))
+        llm_tokens_total.labels(provider, kind).inc(int(n))
 
 
 class OllamaLLM(LLM):
-    def __init__(self, host: str, model: str):
+    def __init__(self, host: str, model: str, keep_alive: str | None = None):
         self.host = host.rstrip("/")
         self.model = model
+        # сколько Ollama держит модель (и её KV-кэш) в памяти после запроса
+        self.keep_alive = keep_alive
 
     async def _pull_if_needed(self) -> None:
         async with httpx.AsyncClient(timeout=None) as client:
-            r = await client.post(f"{self.host}/api/pull", json={"name": self.model}, timeout=None)
+            r = await client.post(
+                f"{self.host}/api/pull", json={"name": self.model}, timeout=None
+            )
             r.raise_for_status()
 
     async def generate(self, prompt: str) -> str:
-        payload = {"model": self.model, "prompt": prompt, "stream": False}
+        answer, _ = await self.generate_with_context(prompt)
+        return answer
+
+    async def generate_with_context(
+        self, prompt: str, context: Optional[List[int]] = None
+    ) -> Tuple[str, Optional[List[int]]]:
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        if context:
+            # продолжение диалога: префикс уже посчитан, prefill только для prompt
+            payload["context"] = context
         async with httpx.AsyncClient(timeout=120) as client:
             r = await client.post(f"{self.host}/api/generate", json=payload)
             if r.status_code == 404:
@@ -23,11 +59,15 @@ class OllamaLLM(LLM):
                 r = await client.post(f"{self.host}/api/generate", json=payload)
             r.raise_for_status()
             data = r.json()
-            response = data.get("response", "")
-            return str(response)
+            response = str(data.get("response", ""))
+            _observe_tokens("ollama", prompt, data, response)
+            new_context = data.get("context")
+            return response, (list(new_context) if new_context else None)
 
 
 def get_llm() -> LLM:
     if settings.LLM_PROVIDER == "ollama":
-        return OllamaLLM(settings.OLLAMA_HOST, settings.LLM_MODEL)
+        return OllamaLLM(
+            settings.OLLAMA_HOST, settings.LLM_MODEL, settings.OLLAMA_KEEP_ALIVE
+        )
     raise NotImplementedError(f"Unsupported LLM_PROVIDER={settings.LLM_PROVIDER}")
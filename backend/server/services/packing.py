@@ -0,0 +1,185 @@
+"""
+Упаковка контекста для промпта в бюджет токенов.
+
+Кандидаты (чанки после ретрива/rerank) проходят три шага:
+
+1. соседние и перекрывающиеся чанки одного документа склеиваются в один
+   фрагмент, который читается из исходника docstore одним диапазоном —
+   перекрытие чанкера не попадает в промпт дважды;
+2. фрагменты выбираются жадно по MMR: релевантность минус сходство с уже
+   выбранными (по векторам из ретрива); почти-дубликаты отбрасываются;
+3. выбор идёт, пока фрагменты помещаются в бюджет токенов чанкера.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .chunking import count_tokens, truncate_to_tokens
+from ..telemetry.metrics import context_dropped_total
+
+# (ключ исходника, байтовый start, байтовый end) -> текст
+SourceReader = Callable[[str, int, int], str]
+
+
+@dataclass
+class Candidate:
+    chunk_id: str
+    text: str
+    meta: Dict[str, Any]
+    score: float
+    source: Optional[str] = None
+    offsets: Optional[Tuple[int, int]] = None
+    vector: Optional[np.ndarray] = None
+
+
+@dataclass
+class Passage:
+    text: str
+    score: float
+    members: List[Candidate] = field(default_factory=list)
+    vector: Optional[np.ndarray] = None
+    tokens: int = 0
+
+    @property
+    def best(self) -> Candidate:
+        return max(self.members, key=lambda c: c.score)
+
+
+def _passage(members: List[Candidate], text: str) -> Passage:
+    vectors = [c.vector for c in members if c.vector is not None]
+    vector: Optional[np.ndarray] = None
+    if vectors:
+        v = np.stack(vectors).sum(axis=0, dtype=np.float32)
+        vector = v / (float(np.linalg.norm(v)) or 1.0)
+    return Passage(
+        text=text,
+        score=max(c.score for c in members),
+        members=members,
+        vector=vector,
+        tokens=count_tokens(text),
+    )
+
+
+def merge_adjacent(
+    candidates: List[Candidate], read_source: Optional[SourceReader], max_gap: int = 8
+) -> List[Passage]:
+    """
+    Склеить чанки одного исходника, чьи байтовые диапазоны перекрываются или
+    разделены не больше чем max_gap байтами (пробелы между абзацами).
+    Результат отсортирован по релевантности (максимум по склеенным чанкам).
+    """
+    by_source: Dict[str, List[Candidate]] = {}
+    passages: List[Passage] = []
+    for c in candidates:
+        if read_source is not None and c.source and c.offsets:
+            by_source.setdefault(c.source, []).append(c)
+        else:
+            passages.append(_passage([c], c.text))
+
+    for key, group in by_source.items():
+        group.sort(key=lambda c: c.offsets or (0, 0))
+        run = [group[0]]
+        start, end = group[0].offsets or (0, 0)
+        for c in group[1:]:
+            c_start, c_end = c.offsets or (0, 0)
+            if c_start <= end + max_gap:
+                run.append(c)
+                end = max(end, c_end)
+                continue
+            passages.append(_run_passage(run, key, start, end, read_source))
+            run, (start, end) = [c], (c_start, c_end)
+        passages.append(_run_passage(run, key, start, end, read_source))
+
+    passages.sort(key=lambda p: p.score, reverse=True)
+    return passages
+
+
+def _run_passage(
+    run: List[Candidate],
+    key: str,
+    start: int,
+    end: int,
+    read_source: Optional[SourceReader],
+) -> Passage:
+    if len(run) == 1 or read_source is None:
+        return _passage(run, run[0].text)
+    text = read_source(key, start, end).strip()
+    return _passage(run, text or "\n".join(c.text for c in run))
+
+
+def select_mmr(
+    passages: List[Passage],
+    budget: int,
+    *,
+    lam: float = 0.7,
+    dedup_threshold: float = 0.95,
+    max_passages: int = 6,
+) -> List[Passage]:
+    """
+    Жадный MMR в пределах бюджета токенов. Релевантность нормируется в [0, 1]
+    по кандидатам; сходство — косинус векторов (у фрагментов без вектора 0).
+    Если даже лучший фрагмент не влезает в бюджет, он обрезается.
+    """
+    n = len(passages)
+    if n == 0 or budget <= 0 or max_passages <= 0:
+        return []
+    scores = np.array([p.score for p in passages], dtype=np.float64)
+    spread = float(scores.max() - scores.min())
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones(n)
+
+    dim = next((len(p.vector) for p in passages if p.vector is not None), 0)
+    vecs = np.zeros((n, dim), dtype=np.float32)
+    for i, p in enumerate(passages):
+        if p.vector is not None:
+            vecs[i] = p.vector
+    redundancy = np.zeros(n, dtype=np.float64)
+
+    alive = np.ones(n, dtype=bool)
+    seen_texts = set()
+    selected: List[Passage] = []
+    used = 0
+    while alive.any() and len(selected) < max_passages:
+        gain = lam * relevance - (1 - lam) * redundancy
+        gain[~alive] = -np.inf
+        i = int(np.argmax(gain))
+        alive[i] = False
+        p = passages[i]
+        if redundancy[i] >= dedup_threshold or p.text in seen_texts:
+            context_dropped_total.labels("duplicate").inc()
+            continue
+        if used + p.tokens > budget:
+            if selected:
+                context_dropped_total.labels("budget").inc()
+                continue
+            p.text = truncate_to_tokens(p.text, budget)
+            p.tokens = count_tokens(p.text)
+        selected.append(p)
+        seen_texts.add(p.text)
+        used += p.tokens
+        if dim:
+            redundancy = np.maximum(redundancy, vecs @ vecs[i])
+    return selected
+
+
+def pack_contexts(
+    candidates: List[Candidate],
+    budget: int,
+    *,
+    read_source: Optional[SourceReader] = None,
+    lam: float = 0.7,
+    dedup_threshold: float = 0.95,
+    max_passages: int = 6,
+) -> List[Passage]:
+    """Склейка соседних чанков + MMR-выбор в бюджет токенов (см. docstring модуля)."""
+    passages = merge_adjacent(candidates, read_source)
+    return select_mmr(
+        passages,
+        budget,
+        lam=lam,
+        dedup_threshold=dedup_threshold,
+        max_passages=max_passages,
+    )
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_live: "Projection | None" = None
+_live_loaded = False
+_shadow: "Projection | None" = None
+_has_shadow = False
+_lock = threading.Lock()
+
+
+class Projection:
+    """
+    Линейное понижение размерности эмбеддингов: ``x @ components``.
+
+    - ``pca`` — главные компоненты, обученные на выборке векторов корпуса;
+    - ``truncate`` — первые k координат (для Matryoshka-моделей, где префикс
+      вектора сам по себе является эмбеддингом).
+
+    Выход перенормируется, чтобы косинус оставался скалярным произведением.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        components: np.ndarray,
+        retained_variance: float = 1.0,
+    ):
+        self.kind = kind
+        self.components = np.asarray(components, dtype=np.float32)
+        self.retained_variance = float(retained_variance)
+
+    @property
+    def source_dim(self) -> int:
+        return int(self.components.shape[0])
+
+    @property
+    def target_dim(self) -> int:
+        return int(self.components.shape[1])
+
+    def apply(self, vectors: Any) -> np.ndarray:
+        mat = np.asarray(vectors, dtype=np.float32)
+        single = mat.ndim == 1
+        mat = mat.reshape(-1, self.source_dim)
+        if self.kind == "truncate":
+            out = mat[:, : self.target_dim].copy()
+        else:
+            out = mat @ self.components
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        out /= np.where(norms > 0, norms, 1.0)
+        return out[0] if single else out
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                kind=np.array(self.kind),
+                components=self.components,
+                retained_variance=np.array(self.retained_variance),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        with np.load(path) as data:
+            return cls(
+                str(data["kind"]),
+                data["components"],
+                float(data["retained_variance"]),
+            )
+
+
+def fit_projection(
+    sample: np.ndarray, target_dim: int, kind: str = "pca"
+) -> Projection:
+    """
+    Обучить проекцию на выборке эмбеддингов (n, dim).
+
+    PCA считается без центрирования (SVD нормированных векторов): поиск идёт по
+    косинусу, и сохранять нужно скалярные произведения, а не разброс вокруг
+    среднего. retained_variance — доля сохранённой «энергии» векторов.
+    """
+    mat = np.asarray(sample, dtype=np.float64)
+    n, dim = mat.shape
+    if not 0 < target_dim < dim:
+        raise ValueError(f"target_dim must be in (0, {dim})")
+    mat = mat / np.clip(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12, None)
+    total = float((mat**2).sum()) or 1.0
+    if kind == "truncate":
+        retained = float((mat[:, :target_dim] ** 2).sum()) / total
+        return Projection(kind, np.eye(dim, target_dim), retained)
+    if kind != "pca":
+        raise ValueError(f"unknown projection kind: {kind}")
+    if n < target_dim:
+        raise ValueError(f"need at least {target_dim} sample vectors, got {n}")
+    _, s, vt = np.linalg.svd(mat, full_matrices=False)
+    retained = float((s[:target_dim] ** 2).sum()) / total
+    return Projection(kind, vt[:target_dim].T, retained)
+
+
+def recall_at_k(
+    full: np.ndarray, projection: Projection, k: int = 10, queries: int = 200
+) -> float:
+    """
+    Доля точных top-k соседей (по полным векторам), которые находятся и после
+    проекции. Запросы — первые ``queries`` векторов выборки, сам запрос из
+    кандидатов исключается.
+    """
+    base = np.asarray(full, dtype=np.float32)
+    base = base / np.clip(np.linalg.norm(base, axis=1, keepdims=True), 1e-12, None)
+    n = len(base)
+    k = min(k, n - 1)
+    if k <= 0:
+        return 1.0
+    reduced = projection.apply(base)
+    q = min(queries, n)
+    hits = 0
+    for start in range(0, q, 64):
+        idx = np.arange(start, min(q, start + 64))
+        exact = base[idx] @ base.T
+        approx = reduced[idx] @ reduced.T
+        exact[np.arange(len(idx)), idx] = -np.inf
+        approx[np.arange(len(idx)), idx] = -np.inf
+        want = np.argpartition(-exact, k - 1, axis=1)[:, :k]
+        got = np.argpartition(-approx, k - 1, axis=1)[:, :k]
+        hits += sum(len(np.intersect1d(w, g)) for w, g in zip(want, got))
+    return hits / (q * k)
+
+
+def report(projection: Projection, sample: np.ndarray, k: int = 10) -> Dict[str, Any]:
+    return {
+        "kind": projection.kind,
+        "source_dim": projection.source_dim,
+        "target_dim": projection.target_dim,
+        "retained_variance": projection.retained_variance,
+        "k": k,
+        "recall_at_k": recall_at_k(sample, projection, k=k),
+    }
+
+
+def get_projection() -> Projection | None:
+    """Проекция текущего индекса (файл EMBED_PROJECTION_PATH), если он обучался с ней."""
+    global _live, _live_loaded
+    with _lock:
+        if not _live_loaded:
+            path = settings.EMBED_PROJECTION_PATH
+            if os.path.exists(path):
+                _live = Projection.load(path)
+                logger.info(
+                    "Loaded %s projection %d -> %d",
+                    _live.kind,
+                    _live.source_dim,
+                    _live.target_dim,
+                )
+            _live_loaded = True
+        return _live
+
+
+def get_shadow_projection() -> Projection | None:
+    # теневой индекс без явно выбранной проекции строится в полной размерности
+    return _shadow
+
+
+def begin_shadow_projection(projection: Projection | None) -> None:
+    """Проекция для теневого индекса; на диск попадает только при promote."""
+    global _shadow, _has_shadow
+    with _lock:
+        _shadow, _has_shadow = projection, True
+        if projection is not None:
+            projection.save(f"{settings.EMBED_PROJECTION_PATH}.next")
+
+
+def promote_shadow_projection() -> None:
+    global _live, _live_loaded, _shadow, _has_shadow
+    path = settings.EMBED_PROJECTION_PATH
+    with _lock:
+        if not _has_shadow:
+            return
+        if _shadow is not None:
+            os.replace(f"{path}.next", path)
+        elif os.path.exists(path):
+            os.remove(path)
+        _live, _live_loaded = _shadow, True
+        _shadow, _has_shadow = None, False
+
+
+def discard_shadow_projection() -> None:
+    global _shadow, _has_shadow
+    with _lock:
+        _shadow, _has_shadow = None, False
+        try:
+            os.remove(f"{settings.EMBED_PROJECTION_PATH}.next")
+        except FileNotFoundError:
+            pass
+
+
+def reset_projection() -> None:
+    """Сбросить кэш проекций (для тестов)."""
+    global _live, _live_loaded, _shadow, _has_shadow
+    with _lock:
+        _live, _live_loaded = None, False
+        _shadow, _has_shadow = None, False
+
+
+def project(vectors: Any, projection: Optional[Projection]) -> Any:
+    return vectors if projection is None else projection.apply(vectors)
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..db import get_docstore
+from ..telemetry.metrics import (
+    reindex_docs_per_second,
+    reindex_processed_chunks,
+    reindex_running,
+    reindex_total_chunks,
+)
+from .embeddings import get_embeddings
+from .indexing import Indexer
+from .interfaces import Embeddings
+from .late_interaction import store_chunk_tokens
+from .projection import Projection, begin_shadow_projection, fit_projection, report
+from .vectorstore import (
+    begin_shadow_vectorstore,
+    discard_shadow_vectorstore,
+    promote_shadow_vectorstore,
+)
+
+logger = logging.getLogger(__name__)
+
+Batch = List[Tuple[str, Dict[str, Any]]]
+
+_job: "ReindexJob | None" = None
+_job_lock = threading.Lock()
+
+
+class ReindexJob:
+    """
+    Полная переиндексация без простоя:
+    docstore читается пачками -> эмбеддинги текущей моделью -> теневой индекс ->
+    атомарное переключение чтений. Пока job идёт, запросы обслуживает старый индекс,
+    а новые ingest-ы пишутся в оба (см. Indexer).
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = max(1, batch_size)
+        self.state = "pending"
+        self.total = 0
+        self.processed = 0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.error: str | None = None
+        self.projection: Dict[str, Any] | None = None
+
+    def status(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            "state": self.state,
+            "processed": self.processed,
+            "total": self.total,
+            "progress": (self.processed / self.total) if self.total else 0.0,
+            "docs_per_sec": (self.processed / elapsed) if elapsed > 0 else 0.0,
+            "elapsed_sec": elapsed,
+            "error": self.error,
+            "projection": self.projection,
+        }
+
+    def _read_ahead(
+        self, out: "queue.Queue[Optional[Batch]]", stop: threading.Event
+    ) -> None:
+        # Чтение JSON с диска идёт параллельно с эмбеддингом предыдущей пачки
+        try:
+            for batch in get_docstore().iter_records(self.batch_size):
+                if stop.is_set():
+                    break
+                out.put(batch)
+        finally:
+            out.put(None)
+
+    def _reembed(self, indexer: Indexer) -> None:
+        batches: "queue.Queue[Optional[Batch]]" = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        reader = threading.Thread(
+            target=self._read_ahead, args=(batches, stop), daemon=True
+        )
+        reader.start()
+        try:
+            while (batch := batches.get()) is not None:
+                texts = [rec.get("text") or "" for _, rec in batch]
+                metas = [
+                    dict(rec.get("meta") or {}, chunk_id=cid) for cid, rec in batch
+                ]
+                self.processed += indexer.upsert_chunks(texts, metas)
+                store_chunk_tokens(get_docstore(), [cid for cid, _ in batch], texts)
+                reindex_processed_chunks.set(self.processed)
+                reindex_docs_per_second.set(self.status()["docs_per_sec"])
+        finally:
+            # при ошибке отпускаем читателя: он увидит stop и допишет терминальный None
+            stop.set()
+            while batch is not None:
+                batch = batches.get()
+            reader.join()
+
+    def _fit_projection(self, embed: Embeddings) -> Projection | None:
+        kind = (settings.EMBED_PROJECTION or "none").lower()
+        if kind == "none":
+            return None
+        # первые EMBED_PROJECTION_SAMPLE чанков в порядке каталога — порядок
+        # файлов не связан с документами, так что выборка не перекошена
+        texts: List[str] = []
+        for batch in get_docstore().iter_records(self.batch_size):
+            texts.extend(rec.get("text") or "" for _, rec in batch)
+            if len(texts) >= settings.EMBED_PROJECTION_SAMPLE:
+                break
+        sample = np.concatenate(
+            [
+                embed.embed_array(texts[i : i + self.batch_size])
+                for i in range(0, len(texts), self.batch_size)
+            ]
+            or [np.zeros((0, settings.EMBED_DIM), dtype=np.float32)]
+        )[: settings.EMBED_PROJECTION_SAMPLE]
+        projection = fit_projection(sample, settings.EMBED_PROJECTION_DIM, kind)
+        self.projection = report(projection, sample)
+        logger.info("Fitted embedding projection: %s", self.projection)
+        return projection
+
+    def run(self) -> None:
+        self.state = "running"
+        self.started_at = time.time()
+        reindex_running.set(1)
+        try:
+            self.total = get_docstore().count()
+            reindex_total_chunks.set(self.total)
+            embed = get_embeddings()
+            projection = self._fit_projection(embed)
+            dim = projection.target_dim if projection is not None else None
+            # проекция выбирается раньше индекса: параллельные ingest-ы сразу
+            # пишут в теневой индекс в его размерности
+            begin_shadow_projection(projection)
+            shadow = begin_shadow_vectorstore(dim)
+            self._reembed(Indexer(embed, shadow))
+            # индекс и его проекция переключаются вместе
+            promote_shadow_vectorstore()
+            self.state = "done"
+        except Exception as exc:  # noqa: BLE001 - job state is reported via status()
+            logger.exception("Reindex failed")
+            discard_shadow_vectorstore()
+            self.state = "failed"
+            self.error = str(exc)
+        finally:
+            self.finished_at = time.time()
+            reindex_running.set(0)
+
+
+def get_reindex_job() -> ReindexJob | None:
+    return _job
+
+
+def start_reindex(batch_size: int | None = None) -> ReindexJob:
+    """Запустить переиндексацию в фоне. RuntimeError, если она уже идёт."""
+    global _job
+    with _job_lock:
+        if _job is not None and _job.state in {"pending", "running"}:
+            raise RuntimeError("reindex is already running")
+        job = ReindexJob(batch_size or settings.REINDEX_BATCH_SIZE)
+        _job = job
+    threading.Thread(target=job.run, name="reindex", daemon=True).start()
+    return job
@@ -1,7 +1,6 @@
 # server/services/reranker.py
 from __future__ import annotations
 from typing import List, Optional, Sequence, Tuple
-from sentence_transformers import CrossEncoder
 
 
 class CrossEncoderReranker:
@@ -14,6 +13,9 @@ class CrossEncoderReranker:
         model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
         device: Optional[str] = None,
     ):
+        # импорт при создании: sentence-transformers (и torch) грузятся только с реранкером
+        from sentence_transformers import CrossEncoder
+
         # device=None -> auto
         self.model = CrossEncoder(model_name, device=device or "cpu")
 
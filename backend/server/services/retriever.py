@@ -1,11 +1,18 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
 from .interfaces import Embeddings, VectorStore
+from .projection import get_projection, project
+from .sparse import encode_query
+from ..telemetry.timing import stage
 
 
 class HybridRetriever:
     """
-    Пока используем dense-кандидаты из VectorStore, rerank делаем в chat.py,
+    Кандидаты из VectorStore: dense, а у store с разреженными векторами
+    (Qdrant, QDRANT_HYBRID) — гибридные dense + BM25. Rerank делаем в chat.py,
     где есть доступ к текстам DocStore (так надёжнее).
     Возврат: (chunk_id, payload(meta), score)
     """
@@ -15,17 +22,36 @@ class HybridRetriever:
         self.vs = vs
         self.top_pool = top_pool
 
-    def search(self, question: str, top_k: int = 6) -> List[Tuple[str, Dict[str, Any], float]]:
-        top_k = max(1, min(20, top_k))
-        qv = self.embed.embed([question])[0]
-        vs_hits: List[Tuple[Dict[str, Any], float]] = self.vs.search(
-            qv, self.top_pool
-        )  # (payload, score)
-        vs_hits_sorted = sorted(vs_hits, key=lambda x: float(x[1]), reverse=True)[:top_k]
+    def search(
+        self, question: str, top_k: int = 6
+    ) -> List[Tuple[str, Dict[str, Any], float]]:
+        return self.search_with_vectors(question, top_k)[0]
+
+    def search_with_vectors(
+        self, question: str, top_k: int = 6
+    ) -> Tuple[List[Tuple[str, Dict[str, Any], float]], Optional[np.ndarray]]:
+        """Как search, плюс векторы найденных чанков (строки выровнены с результатом)."""
+        top_k = max(1, min(self.top_pool, top_k))
+        with stage("query_embed"):
+            qv = project(self.embed.embed_array([question])[0], get_projection())
+        with stage("vector_search"):
+            if self.vs.supports_sparse:
+                # dense + BM25 одним запросом, слияние RRF на стороне Qdrant
+                vs_hits, vectors = self.vs.hybrid_search_with_vectors(
+                    qv, encode_query(question), self.top_pool
+                )
+            else:
+                vs_hits, vectors = self.vs.search_with_vectors(qv, self.top_pool)
+        order = sorted(
+            range(len(vs_hits)), key=lambda i: float(vs_hits[i][1]), reverse=True
+        )
         results: List[Tuple[str, Dict[str, Any], float]] = []
-        for payload, score in vs_hits_sorted:
+        rows: List[int] = []
+        for i in order[:top_k]:
+            payload, score = vs_hits[i]
             cid = payload.get("chunk_id")
             if not cid:
                 continue
             results.append((cid, payload, float(score)))
-        return results
+            rows.append(i)
+        return results, (vectors[rows] if vectors is not None else None)
@@ -0,0 +1,186 @@
+"""
+Сессии многоходового чата.
+
+Промпт сессии растёт только с конца: системная инструкция → уже отправленные
+контексты → ходы диалога. Пока Ollama возвращает ``context`` (токены всего
+диалога), каждый следующий ход отправляет лишь новые фрагменты и вопрос,
+а модель (при ``keep_alive``) переиспользует KV-кэш префикса вместо повторного
+prefill. Когда история превышает бюджет, старые ходы сворачиваются в краткое
+содержание, прежние контексты отбрасываются, и следующий ход один раз строит
+полный промпт заново.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from .chunking import _split_sentences, count_tokens, truncate_to_tokens
+from ..core.config import settings
+from ..telemetry.metrics import chat_sessions_active
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+    contexts: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Session:
+    id: str
+    turns: List[Turn] = field(default_factory=list)
+    # контексты, которые уже есть в промпте сессии: (ключ, текст) в порядке отправки
+    contexts: List[Tuple[str, str]] = field(default_factory=list)
+    summary: str = ""
+    # токены диалога, которые вернул Ollama; None — следующий ход строит полный промпт
+    llm_context: Optional[List[int]] = None
+    updated: float = field(default_factory=time.time)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def new_contexts(self, contexts: List[str]) -> List[str]:
+        """Контексты, которых ещё нет в промпте сессии (в исходном порядке)."""
+        sent = {key for key, _ in self.contexts}
+        return [c for c in contexts if _key(c) not in sent]
+
+    def size_tokens(self) -> int:
+        if self.llm_context is not None:
+            return len(self.llm_context)
+        return (
+            count_tokens(self.summary)
+            + sum(count_tokens(text) for _, text in self.contexts)
+            + sum(count_tokens(t.question) + count_tokens(t.answer) for t in self.turns)
+        )
+
+    def record(
+        self,
+        question: str,
+        answer: str,
+        contexts: List[str],
+        llm_context: Optional[List[int]],
+    ) -> None:
+        self.turns.append(Turn(question, answer, contexts))
+        self.contexts.extend((_key(c), c) for c in self.new_contexts(contexts))
+        self.llm_context = llm_context
+        self.updated = time.time()
+
+    def compact(self, keep_turns: int, summary_tokens: int) -> None:
+        """Свернуть всё, кроме последних keep_turns ходов, в краткое содержание."""
+        if keep_turns > 0:
+            old, self.turns = self.turns[:-keep_turns], self.turns[-keep_turns:]
+        else:
+            old, self.turns = self.turns, []
+        if old:
+            lines = self.summary.splitlines()
+            lines += [
+                f"— {t.question.strip()} → {_first_sentence(t.answer)}" for t in old
+            ]
+            # при переполнении теряются самые старые строки
+            while len(lines) > 1 and count_tokens("\n".join(lines)) > summary_tokens:
+                lines.pop(0)
+            self.summary = truncate_to_tokens("\n".join(lines), summary_tokens)
+        # в промпте остаются только контексты ходов, которые сохранены дословно
+        keep = [c for t in self.turns for c in t.contexts]
+        self.contexts = [(_key(c), c) for c in dict.fromkeys(keep)]
+        self.llm_context = None
+
+
+def _key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _first_sentence(text: str) -> str:
+    sentences = _split_sentences(text.strip())
+    return sentences[0] if sentences else ""
+
+
+class SessionStore:
+    """Сессии в памяти процесса: LRU по числу и TTL по времени простоя."""
+
+    def __init__(self, max_sessions: int = 1000, ttl_sec: float = 3600.0):
+        self.max_sessions = max_sessions
+        self.ttl_sec = ttl_sec
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, session_id: str) -> Session:
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.updated > self.ttl_sec:
+                session = None
+            if session is None:
+                session = Session(session_id)
+                self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            session.updated = now
+            self._evict(now)
+            chat_sessions_active.set(len(self._sessions))
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._sessions.pop(session_id, None) is not None
+            chat_sessions_active.set(len(self._sessions))
+            return removed
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _evict(self, now: float) -> None:
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        expired = [
+            sid for sid, s in self._sessions.items() if now - s.updated > self.ttl_sec
+        ]
+        for sid in expired:
+            del self._sessions[sid]
+
+
+_store: SessionStore | None = None
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        _store = SessionStore(settings.SESSION_MAX_SESSIONS, settings.SESSION_TTL_SEC)
+    return _store
+
+
+def reset_session_store() -> None:
+    global _store
+    _store = None
+
+
+def build_session_prompt(
+    session: Session, question: str, contexts: List[str], system_instruction: str
+) -> Tuple[str, Optional[List[int]]]:
+    """
+    Промпт очередного хода и context для Ollama.
+
+    С сохранённым context — только новые фрагменты и вопрос (префикс уже в
+    KV-кэше модели). Без него — полный промпт в стабильном порядке: инструкция,
+    краткое содержание, все контексты сессии, дословные ходы, новый вопрос.
+    """
+    fresh = session.new_contexts(contexts)
+    parts: List[str] = []
+    if session.llm_context is None:
+        parts.append(system_instruction)
+        if session.summary:
+            parts.append(f"Краткое содержание предыдущего диалога:\n{session.summary}")
+        old = [text for _, text in session.contexts]
+        if old or fresh:
+            parts.append("Контекстные фрагменты:\n" + "\n---\n".join(old + fresh))
+        for t in session.turns:
+            parts.append(f"Вопрос: {t.question}\n\nОтвет: {t.answer}")
+    elif fresh:
+        parts.append("Новые контекстные фрагменты:\n" + "\n---\n".join(fresh))
+    parts.append(f"Вопрос: {question}\n\nОтвет:")
+    return "\n\n".join(parts), session.llm_context
@@ -0,0 +1,55 @@
+"""
+BM25-подобные разреженные векторы для гибридного поиска в Qdrant.
+
+Словаря нет — hashing trick: индекс термина — crc32 его нижнего регистра, так
+что кодировать можно в любом процессе (API, воркер, reindex) без общего
+состояния. Вес термина в чанке — насыщенная частота BM25
+``tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avgdl))``, а IDF по корпусу
+считает сам Qdrant (``Modifier.IDF`` у разреженного вектора), поэтому он
+остаётся верным по мере ingest. У запроса вес каждого термина — 1.
+"""
+
+from __future__ import annotations
+
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List
+
+from .interfaces import SparseVector
+
+_token = re.compile(r"\w+", re.UNICODE)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _terms(text: str) -> List[str]:
+    return [t.lower() for t in _token.findall(text or "")]
+
+
+def _index(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def encode_document(text: str, avgdl: float = 120.0) -> SparseVector:
+    terms = _terms(text)
+    if not terms:
+        return [], []
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(terms) / max(avgdl, 1.0))
+    weights: Dict[int, float] = {}
+    for term, tf in Counter(terms).items():
+        # при коллизии хешей веса терминов складываются
+        idx = _index(term)
+        weights[idx] = weights.get(idx, 0.0) + tf * (BM25_K1 + 1) / (tf + norm)
+    indices = sorted(weights)
+    return indices, [float(weights[i]) for i in indices]
+
+
+def encode_documents(texts: List[str], avgdl: float = 120.0) -> List[SparseVector]:
+    return [encode_document(t, avgdl) for t in texts]
+
+
+def encode_query(text: str) -> SparseVector:
+    indices = sorted({_index(t) for t in _terms(text)})
+    return indices, [1.0] * len(indices)
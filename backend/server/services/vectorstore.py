@@ -1,120 +1,692 @@
 from __future__ import annotations
 
-from typing import List, Tuple, Dict, Any
+from typing import TYPE_CHECKING, List, NamedTuple, Optional, Set, Tuple, Dict, Any
+import heapq
+import itertools
 import logging
-import math
 import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 
-from .interfaces import VectorStore
+import numpy as np
+
+from .interfaces import SparseVector, Vector, Vectors, VectorStore
+from .projection import (
+    discard_shadow_projection,
+    get_projection,
+    promote_shadow_projection,
+    reset_projection,
+)
 from ..core.config import settings
 
-try:  # pragma: no cover - optional dependency
+if TYPE_CHECKING:  # pragma: no cover
     from qdrant_client import QdrantClient
-    from qdrant_client.http.models import Distance, PointStruct, VectorParams
-    _HAS_QDRANT = True
-except Exception:  # noqa: BLE001 - if qdrant is unavailable we fall back to memory store
-    QdrantClient = Any  # только для аннотаций/IDE, не используется, если пакета нет
-    PointStruct = Any
-    Distance = Any
-    VectorParams = Any
-    _HAS_QDRANT = False
 
 logger = logging.getLogger(__name__)
 
 _vectorstore_singleton: VectorStore | None = None
 _vectorstore_lock = threading.Lock()
+# Теневой индекс, который строит переиндексация; пока он есть, Indexer пишет и в него
+_shadow_vectorstore: VectorStore | None = None
+# point id, удалённые, пока строится теневой индекс: переиндексация могла прочитать
+# их из docstore до удаления и записать в тень уже после него, поэтому перед
+# переключением они удаляются из тени ещё раз
+_shadow_tombstones: Set[str] = set()
+
+
+def _qdrant_models() -> Any:
+    # qdrant_client импортируется ~1 с: грузим его только для VECTOR_BACKEND=qdrant
+    from qdrant_client.http import models
+
+    return models
+
+
+class _View(NamedTuple):
+    """Снимок локального индекса, который видит поиск."""
+
+    vecs: np.ndarray
+    alive: np.ndarray
+    payloads: List[Dict[str, Any]]
+    size: int
+    dead: int
 
 
 class InMemoryVectorStore(VectorStore):
-    """Simple cosine-similarity vector store for tests and graceful fallbacks."""
+    """
+    Cosine-similarity vector store for tests and graceful fallbacks.
+
+    Векторы лежат нормированными строками одной float32-матрицы. Удаление —
+    это tombstone в битовой маске ``_alive`` (поиск мёртвые строки пропускает),
+    а место физически освобождает компакция, которая запускается в фоне,
+    когда доля мёртвых строк превышает ``compact_threshold``.
+
+    Поиск не берёт блокировку: он читает опубликованный снимок ``_View``.
+    Записи сериализуются ``_lock`` и публикуют новый снимок: новые строки
+    дописываются за его ``size`` (поиску их не видно). Видимые строки не
+    перезаписываются: новая версия точки дописывается новой строкой, а старая
+    становится tombstone, так что upsert копирует только маску ``_alive``,
+    а не матрицу. Удаление тоже копирует только маску, компакция — всё, —
+    поэтому ingest не останавливает запросы.
+    """
 
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, compact_threshold: float = 0.25):
         if dim <= 0:
             raise ValueError("dim must be positive")
         self.dim = dim
-        self._store: Dict[str, Tuple[List[float], Dict[str, Any]]] = {}
+        self.compact_threshold = compact_threshold
+        self._vecs = np.zeros((0, dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []
+        self._payloads: List[Dict[str, Any]] = []
+        self._pos: Dict[str, int] = {}
+        self._size = 0
+        self._dead = 0
+        self._compacting = False
         self._lock = threading.Lock()
+        self._publish()
+
+    def _publish(self) -> None:
+        # присваивание атрибута атомарно: поиск видит либо старый снимок, либо новый
+        self._view = _View(
+            self._vecs, self._alive, self._payloads, self._size, self._dead
+        )
+
+    def _reserve(self, extra: int) -> None:
+        need = self._size + extra
+        if need <= len(self._vecs):
+            return
+        cap = max(need, 2 * len(self._vecs), 64)
+        vecs = np.zeros((cap, self.dim), dtype=np.float32)
+        vecs[: self._size] = self._vecs[: self._size]
+        alive = np.zeros(cap, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        self._vecs, self._alive = vecs, alive
 
     def upsert(
         self,
         ids: List[str],
-        vectors: List[List[float]],
+        vectors: Vectors,
         payloads: List[Dict[str, Any]],
     ) -> None:
         if not (len(ids) == len(vectors) == len(payloads)):
             raise ValueError("ids, vectors and payloads lengths must match")
+        if not ids:
+            return
+        # float32-матрица от embed_array приходит без копирования
+        mat = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if mat.shape[1] != self.dim:
+            raise ValueError("vector dimensionality mismatch")
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
         with self._lock:
+            self._reserve(len(ids))
+            visible = self._size
+            retired: List[int] = []
+            rows = np.empty(len(ids), dtype=np.intp)
             for idx, vid in enumerate(ids):
-                vec = vectors[idx]
-                if len(vec) != self.dim:
-                    raise ValueError("vector dimensionality mismatch")
-                payload = payloads[idx] or {}
-                self._store[vid] = (list(vec), dict(payload))
+                row = self._pos.get(vid)
+                if row is None or row < visible:
+                    # видимую строку идущий поиск может читать прямо сейчас:
+                    # новая версия ложится новой строкой, старая уходит в tombstone
+                    if row is not None:
+                        retired.append(row)
+                    row = self._size
+                    self._size += 1
+                    self._ids.append(vid)
+                    self._payloads.append({})
+                    self._pos[vid] = row
+                rows[idx] = row
+                self._payloads[row] = dict(payloads[idx] or {})
+            # одна векторная запись вместо построчного копирования
+            self._vecs[rows] = mat / np.where(norms > 0, norms, 1.0)
+            # маску копируем, только если гасим видимые строки: старая и новая
+            # версия точки меняются в одном снимке
+            alive = self._alive.copy() if retired else self._alive
+            alive[rows] = True
+            alive[retired] = False
+            self._alive = alive
+            self._dead += len(retired)
+            self._publish()
+        if retired:
+            self._maybe_compact()
 
-    def search(self, query: List[float], top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+    def search(self, query: Vector, top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+        return self.search_with_vectors(query, top_k)[0]
+
+    def search_with_vectors(
+        self, query: Vector, top_k: int
+    ) -> Tuple[List[Tuple[Dict[str, Any], float]], Optional[np.ndarray]]:
         if len(query) != self.dim:
             raise ValueError("query vector dimensionality mismatch")
-        q_norm = math.sqrt(sum(v * v for v in query)) or 1.0
+        q = np.asarray(query, dtype=np.float32)
+        q = q / (float(np.linalg.norm(q)) or 1.0)
+        view = self._view
+        n = view.size
+        if n - view.dead <= 0:
+            return [], np.zeros((0, self.dim), dtype=np.float32)
+        scores = view.vecs[:n] @ q
+        scores[~view.alive[:n]] = -np.inf
+        k = min(max(1, top_k), n - view.dead)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        hits = [(dict(view.payloads[i]), float(scores[i])) for i in top]
+        return hits, view.vecs[top]  # fancy-индекс — уже копия
+
+    def existing(self, ids: List[str]) -> Set[str]:
         with self._lock:
-            scored: List[Tuple[Dict[str, Any], float]] = []
-            for _, (vec, payload) in self._store.items():
-                score = sum(q * v for q, v in zip(query, vec)) / (
-                    q_norm * (math.sqrt(sum(v * v for v in vec)) or 1.0)
-                )
-                scored.append((dict(payload), float(score)))
-        scored.sort(key=lambda x: x[1], reverse=True)
-        limit = max(1, top_k)
-        return scored[:limit]
+            return {vid for vid in ids if vid in self._pos}
+
+    def set_payload(self, ids: List[str], payloads: List[Dict[str, Any]]) -> None:
+        if len(ids) != len(payloads):
+            raise ValueError("ids and payloads lengths must match")
+        with self._lock:
+            for vid, payload in zip(ids, payloads):
+                row = self._pos.get(vid)
+                if row is not None:
+                    # замена элемента списка атомарна: поиск видит старый или новый dict
+                    self._payloads[row] = {**self._payloads[row], **(payload or {})}
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            rows = [
+                row
+                for row in (self._pos.pop(vid, None) for vid in ids)
+                if row is not None
+            ]
+            if rows:
+                # payload остаётся до компакции: снимок поиска может на него ссылаться
+                self._alive = self._alive.copy()
+                self._alive[rows] = False
+                self._dead += len(rows)
+                self._publish()
+        self._maybe_compact()
+
+    def delete_by_filter(self, filters: Dict[str, Any]) -> None:
+        if not filters:
+            raise ValueError("refusing to delete by an empty filter")
+        with self._lock:
+            ids = [
+                self._ids[row]
+                for row in np.flatnonzero(self._alive[: self._size])
+                if all(self._payloads[row].get(k) == v for k, v in filters.items())
+            ]
+        self.delete(ids)
+
+    def stats(self) -> Dict[str, int]:
+        view = self._view
+        return {"rows": view.size, "alive": view.size - view.dead, "dead": view.dead}
+
+    def _maybe_compact(self) -> None:
+        with self._lock:
+            if self._compacting or not self._size:
+                return
+            if self._dead / self._size <= self.compact_threshold:
+                return
+            self._compacting = True
+        threading.Thread(
+            target=self.compact, name="vectorstore-compact", daemon=True
+        ).start()
+
+    def compact(self) -> int:
+        """Физически удалить tombstone-строки. Возвращает число освобождённых строк."""
+        try:
+            with self._lock:
+                keep = np.flatnonzero(self._alive[: self._size])
+                reclaimed = self._size - len(keep)
+                if not reclaimed:
+                    return 0
+                self._vecs = self._vecs[keep].copy()
+                self._alive = np.ones(len(keep), dtype=bool)
+                self._ids = [self._ids[i] for i in keep]
+                self._payloads = [self._payloads[i] for i in keep]
+                self._pos = {vid: row for row, vid in enumerate(self._ids)}
+                self._size = len(keep)
+                self._dead = 0
+                self._publish()
+                return reclaimed
+        finally:
+            self._compacting = False
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    Локальный индекс из N шардов (InMemoryVectorStore) для многоядерного поиска.
+
+    Точка попадает в шард по crc32 своего id. Запрос параллельно сканирует все
+    шарды в пуле потоков — матричное умножение и argpartition в NumPy отпускают
+    GIL, — после чего top-k шардов сливаются k-way merge. У каждого шарда свой
+    снимок и своя блокировка записи, так что запись в один шард не задерживает
+    остальные, а поиск не ждёт записи вовсе.
+    """
+
+    def __init__(self, dim: int, shards: int = 4, compact_threshold: float = 0.25):
+        if dim <= 0:
+            raise ValueError("dim must be positive")
+        self.dim = dim
+        self.shards = [
+            InMemoryVectorStore(dim, compact_threshold) for _ in range(max(1, shards))
+        ]
+        self._pool = ThreadPoolExecutor(
+            max_workers=len(self.shards), thread_name_prefix="vector-shard"
+        )
+
+    def _shard_rows(self, ids: List[str]) -> Dict[int, List[int]]:
+        groups: Dict[int, List[int]] = {}
+        for i, vid in enumerate(ids):
+            groups.setdefault(
+                zlib.crc32(vid.encode("utf-8")) % len(self.shards), []
+            ).append(i)
+        return groups
+
+    def upsert(
+        self,
+        ids: List[str],
+        vectors: Vectors,
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        if not (len(ids) == len(vectors) == len(payloads)):
+            raise ValueError("ids, vectors and payloads lengths must match")
+        if not ids:
+            return
+        mat = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        for shard, rows in self._shard_rows(ids).items():
+            self.shards[shard].upsert(
+                [ids[i] for i in rows], mat[rows], [payloads[i] for i in rows]
+            )
+
+    def search(self, query: Vector, top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+        return self.search_with_vectors(query, top_k)[0]
+
+    def search_with_vectors(
+        self, query: Vector, top_k: int
+    ) -> Tuple[List[Tuple[Dict[str, Any], float]], Optional[np.ndarray]]:
+        if len(query) != self.dim:
+            raise ValueError("query vector dimensionality mismatch")
+        q = np.asarray(query, dtype=np.float32)
+        parts = list(
+            self._pool.map(
+                lambda shard: shard.search_with_vectors(q, top_k), self.shards
+            )
+        )
+        # каждый шард отдаёт свой top-k уже по убыванию: сливаем, не пересортировывая всё
+        merged = heapq.merge(
+            *[
+                [(-score, si, j) for j, (_, score) in enumerate(hits)]
+                for si, (hits, _) in enumerate(parts)
+            ]
+        )
+        top = list(itertools.islice(merged, max(1, top_k)))
+        hits = [parts[si][0][j] for _, si, j in top]
+        vecs = [parts[si][1][j] for _, si, j in top]
+        return hits, (
+            np.stack(vecs) if vecs else np.zeros((0, self.dim), dtype=np.float32)
+        )
+
+    def existing(self, ids: List[str]) -> Set[str]:
+        out: Set[str] = set()
+        for shard, rows in self._shard_rows(ids).items():
+            out |= self.shards[shard].existing([ids[i] for i in rows])
+        return out
+
+    def set_payload(self, ids: List[str], payloads: List[Dict[str, Any]]) -> None:
+        if len(ids) != len(payloads):
+            raise ValueError("ids and payloads lengths must match")
+        for shard, rows in self._shard_rows(ids).items():
+            self.shards[shard].set_payload(
+                [ids[i] for i in rows], [payloads[i] for i in rows]
+            )
+
+    def delete(self, ids: List[str]) -> None:
+        for shard, rows in self._shard_rows(ids).items():
+            self.shards[shard].delete([ids[i] for i in rows])
+
+    def delete_by_filter(self, filters: Dict[str, Any]) -> None:
+        if not filters:
+            raise ValueError("refusing to delete by an empty filter")
+        list(self._pool.map(lambda shard: shard.delete_by_filter(filters), self.shards))
+
+    def stats(self) -> Dict[str, int]:
+        out = {"rows": 0, "alive": 0, "dead": 0}
+        for shard in self.shards:
+            for key, value in shard.stats().items():
+                out[key] += value
+        return out
+
+    def compact(self) -> int:
+        return sum(shard.compact() for shard in self.shards)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def _local_vectorstore(dim: int) -> VectorStore:
+    if settings.VECTOR_SHARDS > 1:
+        return ShardedVectorStore(
+            dim, settings.VECTOR_SHARDS, settings.VECTOR_COMPACT_THRESHOLD
+        )
+    return InMemoryVectorStore(dim, settings.VECTOR_COMPACT_THRESHOLD)
+
+
+def _dense(vector: Any) -> Any:
+    # у коллекции с разреженным вектором точка отдаёт {"": dense, SPARSE_VECTOR: ...}
+    return vector.get("") if isinstance(vector, dict) else vector
 
 
 class QdrantVS(VectorStore):
-    def __init__(self, url: str, collection: str, dim: int):
-        if not _HAS_QDRANT:
-            raise RuntimeError("qdrant-client is unavailable")
-        self.client = QdrantClient(url=url)
+    """
+    Коллекция Qdrant, к которой обращаемся через alias (QDRANT_COLLECTION).
+    Физические коллекции называются "<alias>__<версия>", поэтому переиндексация
+    может собрать новую рядом и атомарно переключить alias.
+
+    С ``hybrid=True`` новые коллекции получают рядом с dense-вектором
+    разреженный ``SPARSE_VECTOR`` (BM25 из services.sparse, IDF считает Qdrant),
+    и гибридный поиск — один запрос: dense- и sparse-prefetch, слитые RRF на
+    сервере. Коллекция, созданная раньше без него, работает как dense-only,
+    пока POST /admin/reindex не соберёт новую.
+    """
+
+    SPARSE_VECTOR = "bm25"
+
+    def __init__(
+        self,
+        url: str,
+        collection: str,
+        dim: int,
+        client: QdrantClient | None = None,
+        hybrid: bool = False,
+    ):
+        if client is None:
+            try:
+                from qdrant_client import QdrantClient
+            except (
+                Exception
+            ) as e:  # noqa: BLE001 - нет пакета: вызывающий откатится на память
+                raise RuntimeError("qdrant-client is unavailable") from e
+            client = QdrantClient(url=url)
+        self.client = client
         self.collection = collection
         self.dim = dim
+        self.hybrid = hybrid
         self._ensure_collection()
+        self.supports_sparse = hybrid and self._has_sparse(collection)
+        if hybrid and not self.supports_sparse:
+            logger.warning(
+                "Collection %s has no sparse vectors, hybrid search is off until reindex",
+                collection,
+            )
+
+    def _aliases(self) -> Dict[str, str]:
+        return {
+            a.alias_name: a.collection_name for a in self.client.get_aliases().aliases
+        }
+
+    def _collection_names(self) -> set[str]:
+        return {c.name for c in self.client.get_collections().collections}
+
+    def _create_physical(self, name: str) -> None:
+        qm = _qdrant_models()
+        sparse = (
+            {self.SPARSE_VECTOR: qm.SparseVectorParams(modifier=qm.Modifier.IDF)}
+            if self.hybrid
+            else None
+        )
+        self.client.create_collection(
+            collection_name=name,
+            vectors_config=qm.VectorParams(size=self.dim, distance=qm.Distance.COSINE),
+            sparse_vectors_config=sparse,
+        )
+
+    def _has_sparse(self, name: str) -> bool:
+        params = self.client.get_collection(name).config.params
+        return self.SPARSE_VECTOR in (params.sparse_vectors or {})
 
     def _ensure_collection(self) -> None:
-        names = {c.name for c in self.client.get_collections().collections}
-        if self.collection not in names:
-            self.client.create_collection(
-                collection_name=self.collection,
-                vectors_config=VectorParams(size=self.dim, distance=Distance.COSINE),
+        if (
+            self.collection in self._collection_names()
+            or self.collection in self._aliases()
+        ):
+            return
+        physical = f"{self.collection}__v1"
+        self._create_physical(physical)
+        self._point_alias(physical)
+
+    def _point_alias(self, target: str, alias: str | None = None) -> str | None:
+        """Переключить alias на target одним запросом; вернуть прежнюю коллекцию."""
+        qm = _qdrant_models()
+        alias = alias or self.collection
+        previous = self._aliases().get(alias)
+        ops: List[Any] = []
+        if previous is not None:
+            ops.append(
+                qm.DeleteAliasOperation(delete_alias=qm.DeleteAlias(alias_name=alias))
             )
+        ops.append(
+            qm.CreateAliasOperation(
+                create_alias=qm.CreateAlias(collection_name=target, alias_name=alias)
+            )
+        )
+        legacy = previous is None and alias in self._collection_names()
+        try:
+            self.client.update_collection_aliases(change_aliases_operations=ops)
+        except Exception:  # noqa: BLE001 - сервер не дал alias с именем коллекции
+            if not legacy:
+                raise
+            # запасной путь: имя освобождается раньше, чем появится alias, и другие
+            # процессы на время двух запросов его не находят
+            logger.warning(
+                "Could not alias over legacy collection %s, recreating", alias
+            )
+            self.client.delete_collection(alias)
+            self.client.update_collection_aliases(change_aliases_operations=ops)
+            return previous
+        if legacy:
+            # Старая схема без alias: имя занято самой коллекцией. Alias с тем же
+            # именем уже указывает на target, где есть все точки, поэтому
+            # legacy-коллекцию удаляем только теперь — чтения по имени не прерываются.
+            logger.warning("Replaced legacy collection %s with an alias", alias)
+            self.client.delete_collection(alias)
+        return previous
+
+    def create_shadow(self, dim: int) -> "QdrantVS":
+        name = (
+            f"{self.collection}__{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        )
+        shadow = QdrantVS.__new__(QdrantVS)
+        shadow.client = self.client
+        shadow.collection = name
+        shadow.dim = dim
+        shadow.hybrid = self.hybrid
+        shadow._create_physical(name)
+        shadow.supports_sparse = self.hybrid
+        return shadow
+
+    def promote(self, shadow: "QdrantVS") -> None:
+        alias = self.collection
+        if alias not in self._aliases() and alias in self._collection_names():
+            # миграция со старой схемы: пока имя переходит на alias (и на запасном
+            # пути в _point_alias, где оно недолго свободно), этот процесс читает и
+            # пишет прямо в новую коллекцию, где уже все точки
+            self.dim = shadow.dim
+            self.supports_sparse = shadow.supports_sparse
+            self.collection = shadow.collection
+        try:
+            previous = self._point_alias(shadow.collection, alias)
+        finally:
+            self.collection = alias
+        self.dim = shadow.dim
+        self.supports_sparse = shadow.supports_sparse
+        if previous and previous != shadow.collection:
+            self.client.delete_collection(previous)
+
+    def drop(self) -> None:
+        self.client.delete_collection(self.collection)
 
     def upsert(
         self,
         ids: List[str],
-        vectors: List[List[float]],
+        vectors: Vectors,
         payloads: List[Dict[str, Any]],
     ) -> None:
-        points = [
-            PointStruct(id=ids[i], vector=vectors[i], payload=payloads[i]) for i in range(len(ids))
-        ]
-        self.client.upsert(collection_name=self.collection, points=points, wait=True)
+        if not ids:
+            return
+        # Batch вместо PointStruct на каждую точку: одна сериализация матрицы
+        batch = _qdrant_models().Batch(
+            ids=list(ids),
+            vectors=np.asarray(vectors, dtype=np.float32).tolist(),
+            payloads=list(payloads),
+        )
+        self.client.upsert(collection_name=self.collection, points=batch, wait=True)
 
-    def search(self, query: List[float], top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+    def upsert_hybrid(
+        self,
+        ids: List[str],
+        vectors: Vectors,
+        sparse: List[SparseVector],
+        payloads: List[Dict[str, Any]],
+    ) -> None:
+        if not self.supports_sparse:
+            self.upsert(ids, vectors, payloads)
+            return
+        if not ids:
+            return
+        qm = _qdrant_models()
+        batch = qm.Batch(
+            ids=list(ids),
+            vectors={
+                "": np.asarray(vectors, dtype=np.float32).tolist(),
+                self.SPARSE_VECTOR: [
+                    qm.SparseVector(indices=i, values=v) for i, v in sparse
+                ],
+            },
+            payloads=list(payloads),
+        )
+        self.client.upsert(collection_name=self.collection, points=batch, wait=True)
+
+    def search(self, query: Vector, top_k: int) -> List[Tuple[Dict[str, Any], float]]:
         res = self.client.search(
             collection_name=self.collection,
-            query_vector=query,
+            query_vector=np.asarray(query, dtype=np.float32).tolist(),
             limit=max(1, top_k),
             with_payload=True,
         )
         return [(p.payload or {}, float(p.score)) for p in res]
 
+    def search_with_vectors(
+        self, query: Vector, top_k: int
+    ) -> Tuple[List[Tuple[Dict[str, Any], float]], Optional[np.ndarray]]:
+        res = self.client.search(
+            collection_name=self.collection,
+            query_vector=np.asarray(query, dtype=np.float32).tolist(),
+            limit=max(1, top_k),
+            with_payload=True,
+            with_vectors=True,
+        )
+        hits = [(p.payload or {}, float(p.score)) for p in res]
+        vectors = np.asarray([_dense(p.vector) for p in res], dtype=np.float32)
+        return hits, vectors.reshape(len(res), self.dim)
+
+    def hybrid_search_with_vectors(
+        self, query: Vector, sparse: SparseVector, top_k: int
+    ) -> Tuple[List[Tuple[Dict[str, Any], float]], Optional[np.ndarray]]:
+        if not self.supports_sparse or not sparse[0]:
+            return self.search_with_vectors(query, top_k)
+        qm = _qdrant_models()
+        limit = max(1, top_k)
+        # оба кандидатных списка и их слияние — один запрос к Qdrant
+        res = self.client.query_points(
+            collection_name=self.collection,
+            prefetch=[
+                qm.Prefetch(
+                    query=np.asarray(query, dtype=np.float32).tolist(), limit=limit
+                ),
+                qm.Prefetch(
+                    query=qm.SparseVector(indices=sparse[0], values=sparse[1]),
+                    using=self.SPARSE_VECTOR,
+                    limit=limit,
+                ),
+            ],
+            query=qm.FusionQuery(fusion=qm.Fusion.RRF),
+            limit=limit,
+            with_payload=True,
+            with_vectors=True,
+        ).points
+        hits = [(p.payload or {}, float(p.score)) for p in res]
+        vectors = np.asarray([_dense(p.vector) for p in res], dtype=np.float32)
+        return hits, vectors.reshape(len(res), self.dim)
+
+    def existing(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        points = self.client.retrieve(
+            collection_name=self.collection,
+            ids=list(ids),
+            with_payload=False,
+            with_vectors=False,
+        )
+        return {str(p.id) for p in points}
+
+    def set_payload(self, ids: List[str], payloads: List[Dict[str, Any]]) -> None:
+        if not ids:
+            return
+        qm = _qdrant_models()
+        # payload у каждой точки свой; фильтр по id вместо списка точек, чтобы точка,
+        # которой нет (например, в теневом индексе), не роняла весь пакет
+        ops = [
+            qm.SetPayloadOperation(
+                set_payload=qm.SetPayload(
+                    payload=dict(payload or {}),
+                    filter=qm.Filter(must=[qm.HasIdCondition(has_id=[pid])]),
+                )
+            )
+            for pid, payload in zip(ids, payloads)
+        ]
+        self.client.batch_update_points(
+            collection_name=self.collection, update_operations=ops, wait=True
+        )
+
+    def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        self.client.delete(
+            collection_name=self.collection,
+            points_selector=_qdrant_models().PointIdsList(points=list(ids)),
+            wait=True,
+        )
+
+    def delete_by_filter(self, filters: Dict[str, Any]) -> None:
+        if not filters:
+            raise ValueError("refusing to delete by an empty filter")
+        qm = _qdrant_models()
+        must: List[Any] = [
+            qm.FieldCondition(key=k, match=qm.MatchValue(value=v))
+            for k, v in filters.items()
+        ]
+        self.client.delete(
+            collection_name=self.collection,
+            points_selector=qm.FilterSelector(filter=qm.Filter(must=must)),
+            wait=True,
+        )
+
 
 def _build_vectorstore() -> VectorStore:
     backend = (settings.VECTOR_BACKEND or "qdrant").lower()
+    # индекс, построенный с проекцией, хранит векторы пониженной размерности
+    projection = get_projection()
+    dim = projection.target_dim if projection is not None else settings.EMBED_DIM
     if backend in {"memory", "inmemory", "local"}:
-        return InMemoryVectorStore(settings.EMBED_DIM)
+        return _local_vectorstore(dim)
     if backend == "qdrant":
         try:
-            return QdrantVS(settings.QDRANT_URL, settings.QDRANT_COLLECTION, settings.EMBED_DIM)
+            return QdrantVS(
+                settings.QDRANT_URL,
+                settings.QDRANT_COLLECTION,
+                dim,
+                hybrid=settings.QDRANT_HYBRID,
+            )
         except Exception as exc:  # noqa: BLE001 - gracefully degrade for tests
             logger.warning("Falling back to InMemoryVectorStore due to error: %s", exc)
-            return InMemoryVectorStore(settings.EMBED_DIM)
+            return _local_vectorstore(dim)
     raise NotImplementedError(f"Unsupported VECTOR_BACKEND={settings.VECTOR_BACKEND}")
 
 
@@ -125,3 +697,91 @@ def get_vectorstore() -> VectorStore:
             if _vectorstore_singleton is None:
                 _vectorstore_singleton = _build_vectorstore()
     return _vectorstore_singleton
+
+
+def reset_vectorstore() -> None:
+    """Drop the cached vector store instance (useful in tests)."""
+
+    global _vectorstore_singleton, _shadow_vectorstore
+    with _vectorstore_lock:
+        stores = (_vectorstore_singleton, _shadow_vectorstore)
+        _vectorstore_singleton = None
+        _shadow_vectorstore = None
+        _shadow_tombstones.clear()
+        reset_projection()
+    for store in stores:
+        close = getattr(store, "close", None)
+        if close is not None:
+            close()
+
+
+def get_shadow_vectorstore() -> VectorStore | None:
+    return _shadow_vectorstore
+
+
+def record_shadow_deletes(point_ids: List[str]) -> None:
+    """Запомнить удаление точек, если сейчас строится теневой индекс."""
+    with _vectorstore_lock:
+        if _shadow_vectorstore is not None:
+            _shadow_tombstones.update(point_ids)
+
+
+def forget_shadow_deletes(point_ids: List[str]) -> None:
+    """Точки записаны заново после удаления — повторять удаление для них не нужно."""
+    with _vectorstore_lock:
+        _shadow_tombstones.difference_update(point_ids)
+
+
+def begin_shadow_vectorstore(dim: int | None = None) -> VectorStore:
+    """
+    Создать пустой теневой индекс рядом с текущим. Чтения продолжают идти в текущий,
+    а записи Indexer с этого момента дублируются в теневой.
+    """
+    global _shadow_vectorstore
+    live = get_vectorstore()
+    dim = dim or settings.EMBED_DIM
+    with _vectorstore_lock:
+        if _shadow_vectorstore is not None:
+            raise RuntimeError("shadow index already exists")
+        if isinstance(live, QdrantVS):
+            _shadow_vectorstore = live.create_shadow(dim)
+        else:
+            _shadow_vectorstore = _local_vectorstore(dim)
+        _shadow_tombstones.clear()
+        return _shadow_vectorstore
+
+
+def promote_shadow_vectorstore() -> None:
+    """Атомарно переключить чтения на теневой индекс."""
+    global _vectorstore_singleton, _shadow_vectorstore
+    with _vectorstore_lock:
+        shadow = _shadow_vectorstore
+        if shadow is None:
+            raise RuntimeError("no shadow index to promote")
+        if _shadow_tombstones:
+            shadow.delete(sorted(_shadow_tombstones))
+            _shadow_tombstones.clear()
+        live = _vectorstore_singleton
+        if isinstance(live, QdrantVS) and isinstance(shadow, QdrantVS):
+            # объект live продолжает работать через alias, который теперь смотрит на shadow
+            live.promote(shadow)
+        else:
+            _vectorstore_singleton = shadow
+        # проекция переключается вместе с индексом, в размерности которого он построен
+        promote_shadow_projection()
+        _shadow_vectorstore = None
+
+
+def discard_shadow_vectorstore() -> None:
+    global _shadow_vectorstore
+    with _vectorstore_lock:
+        shadow, _shadow_vectorstore = _shadow_vectorstore, None
+        _shadow_tombstones.clear()
+        discard_shadow_projection()
+    if isinstance(shadow, QdrantVS):
+        try:
+            shadow.drop()
+        except Exception as exc:  # noqa: BLE001 - best effort cleanup
+            logger.warning(
+                "Failed to drop shadow collection %s: %s", shadow.collection, exc
+            )
@@ -0,0 +1,108 @@
+"""
+Прогрев при старте: модели и соединения поднимаются в фоне до первых
+пользователей, а /readyz отвечает 200 только после прогрева.
+
+Шаги выполняются по очереди в отдельном потоке; каждый шаг — загрузка
+компонента плюс пробный вызов (первые инференсы выделяют буферы onnxruntime/
+torch, первый поиск открывает соединение с Qdrant). Длительность шагов
+экспортируется в ``warmup_duration_seconds{component}``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from ..telemetry.metrics import app_ready, warmup_duration
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupStep:
+    name: str
+    fn: Callable[[], Any]
+    # без critical-компонента сервис не готов; остальные деградируют мягко
+    critical: bool = True
+
+
+class Warmup:
+    def __init__(self, steps: List[WarmupStep]):
+        self.steps = steps
+        self.components: Dict[str, Dict[str, Any]] = {
+            s.name: {"state": "pending"} for s in steps
+        }
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def ready(self) -> bool:
+        return self.done and all(
+            self.components[s.name]["state"] in {"ok", "skipped"}
+            for s in self.steps
+            if s.critical
+        )
+
+    def run(self) -> None:
+        try:
+            for step in self.steps:
+                info = self.components[step.name]
+                info["state"] = "running"
+                start = time.perf_counter()
+                try:
+                    result = step.fn()
+                    info["state"] = "skipped" if result is False else "ok"
+                except (
+                    Exception
+                ) as e:  # noqa: BLE001 - ошибка шага не должна ронять прогрев
+                    logger.warning("Warmup of %s failed: %s", step.name, e)
+                    info.update(state="failed", error=str(e))
+                elapsed = time.perf_counter() - start
+                info["seconds"] = round(elapsed, 3)
+                warmup_duration.labels(step.name).set(elapsed)
+        finally:
+            self._done.set()
+            app_ready.set(1 if self.ready else 0)
+            logger.info("Warmup finished: %s", self.components)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "status": (
+                "ready" if self.ready else ("failed" if self.done else "warming_up")
+            ),
+            "components": {k: dict(v) for k, v in self.components.items()},
+        }
+
+
+_warmup: Warmup | None = None
+
+
+def start_warmup(steps: List[WarmupStep]) -> Warmup:
+    global _warmup
+    _warmup = Warmup(steps)
+    app_ready.set(0)
+    _warmup.start()
+    return _warmup
+
+
+def get_warmup() -> Warmup | None:
+    return _warmup
+
+
+def reset_warmup() -> None:
+    global _warmup
+    _warmup = None
@@ -0,0 +1,224 @@
+"""
+Склейка задач ingest в общий батч.
+
+Воркер Celery с пулом потоков держит в работе до WORKER_CONCURRENCY задач;
+каждая кладёт свой документ в очередь батчера и ждёт результат. Поток батчера
+забирает из очереди до WORKER_BATCH_DOCS документов (ждёт добора не дольше
+WORKER_BATCH_WAIT_MS) и проводит их одним вызовом ingest_many — то есть один
+батч эмбеддинга и одна запись в векторку и docstore на всю пачку.
+
+Жёсткий task_time_limit Celery работает только в пуле prefork (он убивает
+дочерний процесс); в пуле потоков поток не остановить. Поэтому сам вызов
+ingest_many ограничен ``timeout`` (WORKER_TASK_TIMEOUT): пачка, которая не
+уложилась, отдаёт задачам TimeoutError, и батчер переходит к следующей.
+Зависший вызов при этом доживает в своём daemon-потоке, его результат
+отбрасывается. Пока такой поток жив, его документы считаются занятыми:
+новые задачи на те же документы сразу получают ошибку, а не пишут в векторку
+и docstore параллельно с ним (дубли и обратный порядок upsert).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from ..core.config import settings
+from ..db import get_docstore
+from ..services.embeddings import get_embeddings
+from ..services.indexing import Indexer
+from ..services.ingestion import Upload, ingest_many, stable_document_id
+from ..services.vectorstore import get_vectorstore
+from ..telemetry.metrics import (
+    worker_batch_documents,
+    worker_embed_batch_size,
+    worker_ingest_chunks_total,
+    worker_ingest_total,
+)
+
+logger = logging.getLogger(__name__)
+
+IngestFn = Callable[[List[Upload]], List[Dict[str, Any]]]
+_Item = Tuple[Upload, "Future[Dict[str, Any]]"]
+
+
+class DocumentBusyError(RuntimeError):
+    """Документ ещё пишет вызов ingest, отданный по таймауту."""
+
+
+def _document_key(upload: Upload) -> int:
+    filename, data, _ = upload
+    return stable_document_id(filename, hashlib.sha256(data).hexdigest())
+
+
+def worker_name() -> str:
+    return settings.WORKER_NAME or socket.gethostname()
+
+
+class IngestBatcher:
+    def __init__(
+        self,
+        ingest: IngestFn,
+        max_docs: int = 32,
+        max_wait: float = 0.05,
+        timeout: Optional[float] = None,
+    ):
+        self.ingest = ingest
+        self.max_docs = max(1, max_docs)
+        self.max_wait = max_wait
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self._queue: "queue.Queue[Optional[_Item]]" = queue.Queue()
+        # документы вызовов ingest, чей поток ещё не завершился
+        self._busy: Set[int] = set()
+        self._busy_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="ingest-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, upload: Upload) -> "Future[Dict[str, Any]]":
+        future: "Future[Dict[str, Any]]" = Future()
+        self._queue.put((upload, future))
+        return future
+
+    def ingest_one(
+        self, upload: Upload, timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        return self.submit(upload).result(timeout)
+
+    def close(self) -> None:
+        """Доделать уже поставленные документы и остановить поток."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self) -> Tuple[List[_Item], bool]:
+        """Следующий батч и признак остановки."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_docs:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._process(batch)
+
+    def _call(self, uploads: List[Upload]) -> List[Dict[str, Any]]:
+        if self.timeout is None:
+            return self.ingest(uploads)
+        # отдельный поток на пачку: зависший вызов не держит батчер
+        box: "Future[List[Dict[str, Any]]]" = Future()
+        keys = {_document_key(u) for u in uploads}
+        with self._busy_lock:
+            self._busy |= keys
+
+        def run() -> None:
+            try:
+                results = self.ingest(uploads)
+            except BaseException as e:  # noqa: BLE001 - уходит в ожидающий батчер
+                self._release(keys)
+                box.set_exception(e)
+            else:
+                self._release(keys)
+                box.set_result(results)
+
+        threading.Thread(target=run, name="ingest-batch-call", daemon=True).start()
+        try:
+            return box.result(self.timeout)
+        except TimeoutError:
+            raise TimeoutError(
+                f"ingest batch of {len(uploads)} documents exceeded {self.timeout:g}s"
+            ) from None
+
+    def _release(self, keys: Set[int]) -> None:
+        # документы свободны только когда поток вызова действительно закончил
+        with self._busy_lock:
+            self._busy -= keys
+
+    def _process(self, batch: List[_Item]) -> None:
+        with self._busy_lock:
+            busy = set(self._busy)
+        ready: List[_Item] = []
+        for upload, future in batch:
+            if _document_key(upload) not in busy:
+                ready.append((upload, future))
+                continue
+            future.set_exception(
+                DocumentBusyError(
+                    f"{upload[0] or 'document'} is still being ingested by a timed-out batch"
+                )
+            )
+        batch = ready
+        if not batch:
+            return
+        try:
+            results = self._call([upload for upload, _ in batch])
+        except Exception as e:  # noqa: BLE001 - ошибка батча отдаётся каждой задаче
+            logger.exception("Ingest batch of %d documents failed", len(batch))
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        _observe(results)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+def _observe(results: List[Dict[str, Any]]) -> None:
+    name = worker_name()
+    embedded = sum(int(r.get("embedded", 0)) for r in results)
+    worker_batch_documents.labels(name).observe(len(results))
+    if embedded:
+        worker_embed_batch_size.labels(name).observe(embedded)
+        worker_ingest_chunks_total.labels(name).inc(embedded)
+    for r in results:
+        worker_ingest_total.labels(name, r.get("status", "error")).inc()
+
+
+_batcher: IngestBatcher | None = None
+_batcher_lock = threading.Lock()
+
+
+def _ingest_batch(uploads: List[Upload]) -> List[Dict[str, Any]]:
+    return ingest_many(
+        uploads,
+        docstore=get_docstore(),
+        indexer=Indexer(get_embeddings(), get_vectorstore()),
+    )
+
+
+def get_batcher() -> IngestBatcher:
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = IngestBatcher(
+                _ingest_batch,
+                max_docs=settings.WORKER_BATCH_DOCS,
+                max_wait=settings.WORKER_BATCH_WAIT_MS / 1000,
+                timeout=settings.WORKER_TASK_TIMEOUT,
+            )
+        return _batcher
+
+
+def reset_batcher() -> None:
+    global _batcher
+    with _batcher_lock:
+        current, _batcher = _batcher, None
+    if current is not None:
+        current.close()
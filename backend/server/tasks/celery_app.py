@@ -6,10 +6,17 @@ celery_app = Celery(
     "rag",
     broker=settings.REDIS_URL,
     backend=settings.REDIS_URL,
+    include=["server.tasks.ingest"],
 )
 
 celery_app.conf.update(
     task_acks_late=True,
-    worker_prefetch_multiplier=1,
+    # пул потоков: модели одни на процесс, а задачи, взятые с запасом
+    # (prefetch), склеиваются в общий батч эмбеддинга (tasks.batching)
+    worker_pool=settings.WORKER_POOL,
+    worker_concurrency=settings.WORKER_CONCURRENCY,
+    worker_prefetch_multiplier=settings.WORKER_PREFETCH_MULTIPLIER,
+    # только для prefork: в пуле потоков Celery его не соблюдает, и зависшую
+    # задачу ограничивает WORKER_TASK_TIMEOUT в батчере (tasks.batching)
     task_time_limit=600,
 )
@@ -1,24 +1,76 @@
 from __future__ import annotations
 
+import logging
+import time
+from typing import Any, Dict
+
+from celery.signals import worker_process_init, worker_ready
+
+from .batching import get_batcher, worker_name
 from .celery_app import celery_app
+from ..db import get_docstore
 from ..services.embeddings import get_embeddings
 from ..services.vectorstore import get_vectorstore
-from ..services.indexing import Indexer
-from ..services.chunking import split_text
+from ..telemetry.metrics import worker_task_latency
+
+logger = logging.getLogger(__name__)
+
+
+def preload() -> None:
+    """Загрузить модель, векторку и docstore и прогнать пробный эмбеддинг."""
+    start = time.perf_counter()
+    get_embeddings().embed_array(["warmup"])
+    get_vectorstore()
+    get_docstore()
+    get_batcher()
+    logger.info(
+        "Worker %s preloaded in %.2fs", worker_name(), time.perf_counter() - start
+    )
+
+
+@worker_process_init.connect
+def _preload_child(**_: Any) -> None:
+    # prefork: каждый дочерний процесс грузит модели сам, после fork
+    preload()
+
+
+@worker_ready.connect
+def _preload_worker(sender: Any = None, **_: Any) -> None:
+    # threads/solo: задачи выполняются в главном процессе
+    if celery_app.conf.worker_pool != "prefork":
+        preload()
+
+
+def _ingest(
+    task: str, filename: str, content: str, content_type: str
+) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        return get_batcher().ingest_one(
+            (filename, content.encode("utf-8"), content_type)
+        )
+    finally:
+        worker_task_latency.labels(worker_name(), task).observe(
+            time.perf_counter() - start
+        )
+
+
+@celery_app.task(name="ingest.document")
+def ingest_document(
+    filename: str, content: str, content_type: str = "text/plain"
+) -> Dict[str, Any]:
+    """Инкрементальный ingest документа (как POST /ingest), батчами с соседними задачами."""
+    return _ingest("ingest.document", filename, content, content_type)
 
 
 @celery_app.task(name="ingest.text")
 def ingest_text(doc_id: int, filename: str, content: str) -> dict[str, int | bool]:
-    chunks = split_text(content)
-    metas = [
-        {
-            "chunk_id": f"{doc_id}:{i}",
-            "chunk_index": i,
-            "filename": filename,
-            "document_id": doc_id,
-        }
-        for i in range(len(chunks))
-    ]
-    indexer = Indexer(get_embeddings(), get_vectorstore())
-    indexer.upsert_chunks(chunks, metas)
-    return {"ok": True, "doc_id": doc_id, "chunks": len(chunks)}
+    # doc_id оставлен для совместимости вызовов: id документа, как и в /ingest,
+    # выводится из имени файла (stable_document_id)
+    result = _ingest("ingest.text", filename, content, "text/plain")
+    ok = result.get("status") != "error"
+    return {
+        "ok": ok,
+        "doc_id": result.get("document_id", doc_id),
+        "chunks": result.get("chunks", 0),
+    }
@@ -3,15 +3,13 @@ import threading
 import time
 import uvicorn
 from fastapi import FastAPI
-from prometheus_client import Counter, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from starlette.responses import PlainTextResponse
 from ..core.config import settings
+from ..telemetry.metrics import worker_heartbeat
+from .batching import worker_name
 from .celery_app import celery_app
 
-# Метрики воркера
-worker_ingest_total = Counter("worker_ingest_total", "Total ingested documents")
-worker_heartbeat = Gauge("worker_heartbeat", "Worker heartbeat", ["name"])
-
 app = FastAPI(title="Worker Metrics", version="0.1.0")
 
 
@@ -22,18 +20,34 @@ async def metrics_root() -> PlainTextResponse:
 
 
 def heartbeat_loop() -> None:
-    name = "celery-worker-1"
+    name = worker_name()
     while True:
         worker_heartbeat.labels(name).set(time.time())
         time.sleep(5)
 
 
 def start_metrics_server() -> None:
-    uvicorn.run(app, host="0.0.0.0", port=settings.WORKER_METRICS_PORT, log_level="warning")
+    uvicorn.run(
+        app, host="0.0.0.0", port=settings.WORKER_METRICS_PORT, log_level="warning"
+    )
 
 
 def start_celery() -> None:
-    celery_app.worker_main(["worker", "-l", "INFO", "-Q", "celery"])
+    # метрики отдаёт этот процесс, поэтому по умолчанию пул потоков: у prefork
+    # счётчики остались бы в дочерних процессах
+    celery_app.worker_main(
+        [
+            "worker",
+            "-l",
+            "INFO",
+            "-Q",
+            "celery",
+            "--pool",
+            settings.WORKER_POOL,
+            "--concurrency",
+            str(settings.WORKER_CONCURRENCY),
+        ]
+    )
 
 
 if __name__ == "__main__":
@@ -1,5 +1,148 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
-http_requests_total = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
-llm_tokens_total = Counter("llm_tokens_total", "Tokens used", ["provider"])
-request_latency = Histogram("request_latency_seconds", "Request latency", ["route"])
+# HTTP; route — шаблон пути ("/documents/{document_id}"), а не сырой URL
+api_requests_total = Counter(
+    "api_requests_total", "Total API requests", ["method", "route", "status"]
+)
+api_latency_hist = Histogram(
+    "api_request_latency_seconds", "API request latency in seconds", ["route"]
+)
+
+# Прогрев при старте (services.warmup)
+warmup_duration = Gauge(
+    "warmup_duration_seconds", "Startup warmup duration per component", ["component"]
+)
+app_ready = Gauge(
+    "app_ready", "1 when startup warmup has finished and the API is ready"
+)
+
+# Стадии конвейера (см. telemetry.timing.stage)
+stage_latency = Histogram(
+    "rag_stage_latency_seconds",
+    "Latency of a RAG pipeline stage",
+    ["stage"],
+    buckets=(
+        0.0005,
+        0.001,
+        0.0025,
+        0.005,
+        0.01,
+        0.025,
+        0.05,
+        0.1,
+        0.25,
+        0.5,
+        1,
+        2.5,
+        5,
+        10,
+        30,
+    ),
+)
+batch_size = Histogram(
+    "rag_batch_size",
+    "Items per batch sent to embedding/rerank",
+    ["op"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096),
+)
+
+# Каскад ранжирования (services.cascade): вызван ли CrossEncoder
+rerank_cascade_total = Counter(
+    "rag_rerank_cascade_total",
+    "Rerank cascade outcomes (reranked, early_exit, no_reranker, failed)",
+    ["outcome"],
+)
+# Late interaction: кандидаты без сохранённых токенов (их токены считаются на запросе)
+late_interaction_missing_total = Counter(
+    "rag_late_interaction_missing_total",
+    "Rerank candidates scored without stored token embeddings",
+)
+
+# Упаковка контекста (services.packing): отброшенные фрагменты по причинам
+context_dropped_total = Counter(
+    "rag_context_dropped_total", "Context passages dropped by the packer", ["reason"]
+)
+compression_ratio = Histogram(
+    "rag_context_compression_ratio",
+    "Tokens kept / tokens before query-focused context compression",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+
+# Сессии чата
+chat_sessions_active = Gauge("chat_sessions_active", "Chat sessions held in memory")
+chat_session_turns_total = Counter(
+    "chat_session_turns_total",
+    "Session turns by prompt mode (incremental reuses the Ollama context)",
+    ["mode"],
+)
+
+# LLM
+llm_tokens_total = Counter("llm_tokens_total", "Tokens used", ["provider", "kind"])
+llm_tokens = Histogram(
+    "llm_tokens_per_request",
+    "Prompt/answer tokens per LLM call",
+    ["kind"],
+    buckets=(16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384),
+)
+
+# Контроль допуска к LLM (services.admission)
+llm_inflight = Gauge("llm_inflight", "LLM generations in progress")
+llm_queue_length = Gauge("llm_queue_length", "Requests waiting for an LLM slot")
+llm_queue_wait = Histogram(
+    "llm_queue_wait_seconds",
+    "Time spent waiting for an LLM slot",
+    ["priority"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+llm_shed_total = Counter(
+    "llm_shed_total",
+    "Requests rejected by LLM admission control",
+    ["priority", "reason"],
+)
+
+# Переиндексация
+reindex_running = Gauge(
+    "reindex_running", "1 while a reindex job is building a shadow index"
+)
+reindex_processed_chunks = Gauge(
+    "reindex_processed_chunks", "Chunks re-embedded by current job"
+)
+reindex_total_chunks = Gauge(
+    "reindex_total_chunks", "Chunks to re-embed by current job"
+)
+reindex_docs_per_second = Gauge(
+    "reindex_docs_per_second", "Reindex throughput, chunks/sec"
+)
+
+# Пул процессов эмбеддинга
+embedding_queue_depth = Gauge(
+    "embedding_queue_depth",
+    "Embedding batches submitted to worker pool and not finished",
+)
+
+# Celery-воркер (tasks.worker); worker — WORKER_NAME или hostname
+worker_ingest_total = Counter(
+    "worker_ingest_total", "Documents ingested by the worker", ["worker", "status"]
+)
+worker_ingest_chunks_total = Counter(
+    "worker_ingest_chunks_total", "Chunks embedded by the worker", ["worker"]
+)
+worker_embed_batch_size = Histogram(
+    "worker_embed_batch_size",
+    "Chunks embedded per worker batch",
+    ["worker"],
+    buckets=(1, 4, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096),
+)
+worker_batch_documents = Histogram(
+    "worker_batch_documents",
+    "Documents coalesced into one worker batch",
+    ["worker"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+worker_task_latency = Histogram(
+    "worker_task_latency_seconds",
+    "Celery task latency including the wait for its batch",
+    ["worker", "task"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+worker_heartbeat = Gauge("worker_heartbeat", "Worker heartbeat (unix time)", ["worker"])
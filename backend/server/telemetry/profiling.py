@@ -0,0 +1,202 @@
+"""
+Профилирование по запросу.
+
+* Запрос с заголовком ``X-Profile: <PROFILE_TOKEN>`` (или случайная доля
+  ``PROFILE_SAMPLE_RATE`` запросов) выполняется под cProfile; результат
+  сохраняется в ``PROFILE_DIR`` и доступен через ``/admin/profiles/{id}``,
+  id возвращается в заголовке ``X-Profile-Id``.
+* ``sample_stacks`` — семплирующий профайлер всего процесса на заданное
+  время; ``collapsed`` превращает его в формат collapsed stacks
+  (flamegraph.pl, speedscope, inferno).
+
+Ограничение профиля запроса: cProfile включается в потоке event loop на всё
+время запроса. Корутины других запросов, которые выполняются в это время в
+том же loop, попадают в его профиль, а то, что роутеры отдают в
+run_in_threadpool, не видно вовсе — там будет только ожидание. В /chat это
+эмбеддинг вопроса, поиск, чтение docstore, rerank, упаковка и сжатие
+контекста (chat._prepare_contexts), в /ingest — весь ingest. Для них —
+``sample_stacks``, он видит все потоки.
+
+Профили и стеки раскрывают код и данные запросов, поэтому ``/admin/profile*``
+требуют ``Authorization: Bearer <PROFILE_TOKEN>``, а без PROFILE_TOKEN
+отключены.
+
+Пока PROFILE_TOKEN пуст и PROFILE_SAMPLE_RATE = 0, middleware проверяет только
+эти две настройки — ни профайлера, ни лишних аллокаций.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from types import CodeType
+from typing import Any, Dict, List, Mapping, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+# cProfile — один на поток, а запросы делят поток event loop: одновременно
+# профилируем только один запрос, остальные идут как обычно
+_request_lock = threading.Lock()
+_sampler_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.PROFILE_TOKEN) or settings.PROFILE_SAMPLE_RATE > 0
+
+
+class RequestProfile:
+    def __init__(self) -> None:
+        self.id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}"
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.profiler.enable()
+
+    def finish(self, **info: Any) -> Optional[str]:
+        """Остановить профайлер и сохранить .prof и метаданные; вернуть id (None — не вышло)."""
+        try:
+            self.profiler.disable()
+        finally:
+            _request_lock.release()
+        meta = {
+            "id": self.id,
+            "duration_sec": time.perf_counter() - self.started,
+            **info,
+        }
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            self.profiler.dump_stats(_path(self.id, "prof"))
+            with open(_path(self.id, "json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            _prune(settings.PROFILE_KEEP)
+        except OSError:
+            logger.warning("Failed to save request profile %s", self.id, exc_info=True)
+            return None
+        return self.id
+
+
+def token_matches(value: Optional[str]) -> bool:
+    """Совпадает ли value с PROFILE_TOKEN; при пустом PROFILE_TOKEN — никогда."""
+    token = settings.PROFILE_TOKEN
+    return bool(token and value and hmac.compare_digest(value.encode(), token.encode()))
+
+
+def admin_enabled() -> bool:
+    return bool(settings.PROFILE_TOKEN)
+
+
+def start_request_profile(headers: Mapping[str, str]) -> Optional[RequestProfile]:
+    """Профайлер для этого запроса, если он запрошен заголовком или попал в выборку."""
+    wanted = token_matches(headers.get(PROFILE_HEADER))
+    if not wanted and settings.PROFILE_SAMPLE_RATE > 0:
+        wanted = random.random() < settings.PROFILE_SAMPLE_RATE
+    if not wanted or not _request_lock.acquire(blocking=False):
+        return None
+    try:
+        return RequestProfile()
+    except (
+        Exception
+    ):  # noqa: BLE001 - например, активен другой профайлер (sys.setprofile)
+        _request_lock.release()
+        return None
+
+
+def _path(profile_id: str, ext: str) -> str:
+    return os.path.join(settings.PROFILE_DIR, f"{profile_id}.{ext}")
+
+
+def _valid_id(profile_id: str) -> bool:
+    return bool(profile_id) and all(c.isalnum() or c == "-" for c in profile_id)
+
+
+def _prune(keep: int) -> None:
+    for meta in list_profiles()[keep:]:
+        for ext in ("prof", "json"):
+            try:
+                os.remove(_path(meta["id"], ext))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Метаданные сохранённых профилей, новые первыми."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    out: List[Dict[str, Any]] = []
+    for name in os.listdir(settings.PROFILE_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(settings.PROFILE_DIR, name), encoding="utf-8") as f:
+                out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(out, key=lambda m: str(m.get("id", "")), reverse=True)
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    if not _valid_id(profile_id):
+        return None
+    path = _path(profile_id, "prof")
+    return path if os.path.exists(path) else None
+
+
+def profile_text(path: str, sort: str = "cumulative", limit: int = 60) -> str:
+    """Таблица pstats для чтения глазами."""
+    buf = io.StringIO()
+    pstats.Stats(path, stream=buf).strip_dirs().sort_stats(sort).print_stats(limit)
+    return buf.getvalue()
+
+
+def _label(code: CodeType) -> str:
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def sample_stacks(seconds: float, interval: float = 0.005) -> Counter[str]:
+    """
+    Семплировать стеки всех потоков процесса (кроме своего) каждые interval
+    секунд. Ключ — стек от корня к листу через ';' с именем потока в корне.
+    Это wall-clock профиль: ждущие потоки тоже попадают в выборку.
+    """
+    if not _sampler_lock.acquire(blocking=False):
+        raise RuntimeError("sampling profile is already running")
+    try:
+        me = threading.get_ident()
+        counts: Counter[str] = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack: List[str] = []
+                f: Any = frame
+                while f is not None:
+                    stack.append(_label(f.f_code))
+                    f = f.f_back
+                stack.append(names.get(tid, f"thread-{tid}"))
+                counts[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        _sampler_lock.release()
+
+
+def collapsed(counts: Counter[str]) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in sorted(counts.items()))
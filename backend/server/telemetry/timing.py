@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Dict, Iterator, Optional
+
+from .metrics import stage_latency
+from .tracing import span
+
+# Длительности стадий текущего запроса, секунды. Словарь общий для запроса:
+# копии контекста (run_in_threadpool, задачи middleware) пишут в тот же объект.
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "stage_timings", default=None
+)
+
+
+def begin_request() -> Token[Optional[Dict[str, float]]]:
+    return _timings.set({})
+
+
+def end_request(token: Token[Optional[Dict[str, float]]]) -> None:
+    _timings.reset(token)
+
+
+def stage_timings() -> Dict[str, float]:
+    return dict(_timings.get() or {})
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[None]:
+    """
+    Стадия конвейера: гистограмма rag_stage_latency_seconds, спан OpenTelemetry
+    (если трейсинг включён) и, внутри HTTP-запроса, строка в Server-Timing.
+    """
+    timings = _timings.get()
+    start = time.perf_counter()
+    try:
+        with span(name, **attributes):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_latency.labels(name).observe(elapsed)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+
+
+def server_timing_header(timings: Dict[str, float], total: float | None = None) -> str:
+    """Значение заголовка Server-Timing (dur в миллисекундах)."""
+    parts = [f"{name};dur={sec * 1000:.2f}" for name, sec in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import logging
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+try:  # pragma: no cover - module availability depends on environment
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import (
+        BatchSpanProcessor,
+        SimpleSpanProcessor,
+        SpanExporter,
+    )
+
+    _HAS_OTEL = True
+except Exception:  # noqa: BLE001 - без OpenTelemetry спаны просто не пишутся
+    _HAS_OTEL = False
+
+logger = logging.getLogger(__name__)
+
+_tracer: Any = None
+
+
+def configure_tracing(
+    exporter: "Optional[SpanExporter]" = None,
+    *,
+    service_name: str = "rag-api",
+    batch: bool = True,
+) -> bool:
+    """
+    Включить трейсинг со своим TracerProvider (глобальный не трогаем, чтобы
+    тесты могли переключать экспортер). Без exporter спаны отправляются по
+    OTLP, если установлен opentelemetry-exporter-otlp. Возвращает, включился ли он.
+    """
+    global _tracer
+    if not _HAS_OTEL:
+        logger.warning("opentelemetry-sdk is not installed, tracing disabled")
+        return False
+    if exporter is None:
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+                OTLPSpanExporter,
+            )
+        except ImportError:
+            logger.warning(
+                "opentelemetry-exporter-otlp is not installed, tracing disabled"
+            )
+            return False
+        exporter = OTLPSpanExporter()  # endpoint из OTEL_EXPORTER_OTLP_ENDPOINT
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    processor = BatchSpanProcessor(exporter) if batch else SimpleSpanProcessor(exporter)
+    provider.add_span_processor(processor)
+    _tracer = provider.get_tracer("server")
+    return True
+
+
+def disable_tracing() -> None:
+    global _tracer
+    _tracer = None
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Спан вокруг блока; без configure_tracing — no-op."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes or None) as current:
+        yield current
@@ -0,0 +1,17 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_docstore(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    # docstore каждого теста — во временном каталоге, а не в ./data/chunks
+    from server import db
+    from server.core import config as core_config
+
+    path = str(tmp_path / "chunks")
+    monkeypatch.setenv("DOCSTORE_PATH", path)
+    monkeypatch.setattr(core_config.settings, "DOCSTORE_PATH", path)
+    db.reset_docstore()
+    yield
+    db.reset_docstore()
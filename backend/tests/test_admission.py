@@ -0,0 +1,94 @@
+import asyncio
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server.services.admission import AdmissionController, Overloaded
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    async def scenario() -> List[str]:
+        ac = AdmissionController(max_concurrency=1, max_queue=4, queue_timeout=5)
+        order: List[str] = []
+        gate = asyncio.Event()
+
+        async def job(name: str, priority: str) -> None:
+            async with ac.slot(priority):
+                order.append(name)
+                if name == "first":
+                    await gate.wait()
+
+        tasks = [asyncio.create_task(job("first", "normal"))]
+        await asyncio.sleep(0)
+        for name, priority in [
+            ("low", "low"),
+            ("normal-1", "normal"),
+            ("high", "high"),
+        ]:
+            tasks.append(asyncio.create_task(job(name, priority)))
+            await asyncio.sleep(0)
+        assert ac.active == 1 and ac.queued == 3
+        gate.set()
+        await asyncio.gather(*tasks)
+        assert ac.active == 0 and ac.queued == 0
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "high", "normal-1", "low"]
+
+
+def test_full_queue_sheds_with_retry_after_and_high_priority_preempts():
+    async def scenario() -> None:
+        ac = AdmissionController(max_concurrency=1, max_queue=1, queue_timeout=5)
+        await ac.acquire("normal")
+        low = asyncio.create_task(ac.acquire("low"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Overloaded) as rejected:
+            ac.check("low")
+        assert rejected.value.status_code == 429 and rejected.value.retry_after >= 1
+
+        high = asyncio.create_task(ac.acquire("high"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as preempted:
+            await low
+        assert preempted.value.status_code == 503
+
+        ac.release()
+        await high
+        assert ac.active == 1 and ac.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_returns_503_and_frees_the_place():
+    async def scenario() -> None:
+        ac = AdmissionController(max_concurrency=1, max_queue=2, queue_timeout=0.05)
+        await ac.acquire("normal")
+        with pytest.raises(Overloaded) as timed_out:
+            await ac.acquire("normal")
+        assert timed_out.value.status_code == 503
+        assert ac.queued == 0
+        ac.release()
+        assert ac.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_chat_is_rejected_before_retrieval_when_llm_is_saturated(monkeypatch):
+    from server.api.routers import chat as chat_router
+    from server.main import app
+
+    saturated = AdmissionController(max_concurrency=1, max_queue=0, queue_timeout=1)
+    saturated.active = 1
+    monkeypatch.setattr(chat_router, "get_admission", lambda: saturated)
+    monkeypatch.setattr(
+        chat_router,
+        "HybridRetriever",
+        lambda *a, **k: pytest.fail("retrieval must not run"),
+    )
+
+    response = TestClient(app).post("/chat", json={"question": "что такое RAG?"})
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
@@ -0,0 +1,33 @@
+from bench.corpus import documents, passages
+from bench.suite import compare
+
+
+def test_corpus_is_deterministic_and_mixed():
+    first = documents(6, 2048, seed=3)
+    assert first == documents(6, 2048, seed=3)
+    assert first != documents(6, 2048, seed=4)
+    assert {ctype for _, _, ctype in first} == {
+        "text/markdown",
+        "text/html",
+        "text/plain",
+    }
+    assert any("-ru." in name for name, _, _ in first) and any(
+        "-en." in name for name, _, _ in first
+    )
+    assert passages(5, seed=1) == passages(5, seed=1)
+
+
+def test_compare_flags_only_regressions_over_threshold():
+    def run(qps: float, p50: float) -> dict:
+        return {
+            "metrics": {
+                "x.qps": {"value": qps, "unit": "q/s", "higher_is_better": True},
+                "x.p50_ms": {"value": p50, "unit": "ms", "higher_is_better": False},
+            }
+        }
+
+    baseline = run(100.0, 10.0)
+    assert compare(baseline, run(95.0, 10.5), threshold=0.1) == []
+    assert compare(baseline, run(150.0, 5.0), threshold=0.1) == []
+    regressions = compare(baseline, run(80.0, 12.0), threshold=0.1)
+    assert [r.split(":")[0] for r in regressions] == ["x.qps", "x.p50_ms"]
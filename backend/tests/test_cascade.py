@@ -0,0 +1,155 @@
+import io
+from typing import List, Sequence
+
+from fastapi.testclient import TestClient
+
+from server.services.cascade import first_stage_scores, rerank_cascade
+from server.services.packing import Candidate
+
+
+class CountingReranker:
+    def __init__(self) -> None:
+        self.batches: List[List[str]] = []
+
+    def __call__(self, question: str, candidates: Sequence[Candidate]) -> List[float]:
+        texts = [c.text for c in candidates]
+        self.batches.append(texts)
+        # «CrossEncoder» предпочитает тексты со словом «точно»
+        return [10.0 if "точно" in t else float(len(t) % 7) for t in texts]
+
+
+def _cands(scores: List[float], texts: List[str]) -> List[Candidate]:
+    return [Candidate(f"c{i}", t, {}, s) for i, (s, t) in enumerate(zip(scores, texts))]
+
+
+def test_first_stage_mixes_dense_and_lexical():
+    cands = _cands(
+        [0.9, 0.88], ["про погоду и отпуск", "кэш эмбеддингов ускоряет поиск"]
+    )
+    dense_only = first_stage_scores("кэш эмбеддингов", cands, lexical_weight=0.0)
+    mixed = first_stage_scores("кэш эмбеддингов", cands, lexical_weight=0.6)
+    assert dense_only.argmax() == 0 and mixed.argmax() == 1
+
+
+def test_decisive_margin_skips_the_cross_encoder():
+    rerank = CountingReranker()
+    # два явных лидера, дальше — провал по dense-скору
+    cands = _cands([0.95, 0.93, 0.2, 0.19, 0.18], [f"текст {i}" for i in range(5)])
+    out = rerank_cascade(
+        "вопрос", cands, 2, rerank, keep=4, margin=0.2, lexical_weight=0.0
+    )
+    assert out.outcome == "early_exit" and out.reranked == 0 and rerank.batches == []
+    assert [c.chunk_id for c in out.candidates] == ["c0", "c1", "c2", "c3"]
+
+
+def test_only_the_uncertain_head_is_reranked():
+    rerank = CountingReranker()
+    scores = [0.90, 0.89, 0.88, 0.87, 0.40, 0.39, 0.10, 0.05]
+    texts = [
+        "альфа",
+        "бета",
+        "гамма",
+        "точно дельта",
+        "эпсилон",
+        "дзета",
+        "эта",
+        "тета",
+    ]
+    out = rerank_cascade(
+        "вопрос",
+        _cands(scores, texts),
+        2,
+        rerank,
+        keep=6,
+        margin=0.1,
+        lexical_weight=0.0,
+    )
+    # в CrossEncoder ушли только четыре близких к границе кандидата, а не все шесть
+    assert out.outcome == "reranked" and out.reranked == 4
+    assert rerank.batches == [texts[:4]]
+    assert out.candidates[0].chunk_id == "c3"
+    assert [c.chunk_id for c in out.candidates[4:]] == ["c4", "c5"]
+    assert out.candidates[3].score > out.candidates[4].score
+
+
+def test_settled_leader_stays_out_of_the_band_and_scores_keep_their_scale():
+    rerank = CountingReranker()
+    scores = [0.99, 0.70, 0.69, 0.68, 0.30]
+    texts = ["лидер", "бета", "гамма", "точно дельта", "эпсилон"]
+    out = rerank_cascade(
+        "вопрос",
+        _cands(scores, texts),
+        3,
+        rerank,
+        keep=5,
+        margin=0.1,
+        lexical_weight=0.0,
+    )
+    # лидер обгоняет 4-го больше чем на margin — в реранкер идёт только полоса у границы
+    assert out.outcome == "reranked" and rerank.batches == [texts[1:4]]
+    assert [c.chunk_id for c in out.candidates] == ["c0", "c3", "c2", "c1", "c4"]
+    # логиты реранкера (до 10.0) не попадают в score: он в [0, 1] и убывает
+    got = [c.score for c in out.candidates]
+    assert all(0.0 <= s <= 1.0 for s in got) and got == sorted(got, reverse=True)
+
+
+def test_chat_honours_request_top_k(monkeypatch):
+    from server.api.routers import chat as chat_router
+    from server.main import app
+
+    class FakeLLM:
+        async def generate(self, prompt: str) -> str:
+            return "ответ"
+
+    monkeypatch.setattr(chat_router, "get_llm", lambda: FakeLLM())
+    client = TestClient(app)
+    for i in range(4):
+        body = (
+            f"# Раздел {i}\n\n"
+            + f"Тема {i}: каскад ранжирования и выбор глубины. " * 40
+        )
+        files = {
+            "file": (
+                f"cascade{i}.md",
+                io.BytesIO(body.encode("utf-8")),
+                "text/markdown",
+            )
+        }
+        assert client.post("/ingest", files=files).status_code == 200
+
+    one = client.post(
+        "/chat", json={"question": "каскад ранжирования", "top_k": 1}
+    ).json()
+    many = client.post(
+        "/chat", json={"question": "каскад ранжирования", "top_k": 50}
+    ).json()
+    assert len(one["references"]) == 1
+    assert 1 < len(many["references"]) <= 12
+
+
+def test_chat_retrieval_runs_off_the_event_loop(monkeypatch):
+    import asyncio
+
+    from server.api.routers import chat as chat_router
+    from server.main import app
+
+    class FakeLLM:
+        async def generate(self, prompt: str) -> str:
+            return "ответ"
+
+    on_loop: List[bool] = []
+    collect = chat_router._collect_candidates
+
+    def spy(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return collect(*args, **kwargs)
+
+    monkeypatch.setattr(chat_router, "get_llm", lambda: FakeLLM())
+    monkeypatch.setattr(chat_router, "_collect_candidates", spy)
+    r = TestClient(app).post("/chat", json={"question": "каскад ранжирования"})
+    # поиск и эмбеддинг (ожидание EmbeddingPool) не держат event loop
+    assert r.status_code == 200 and on_loop == [False]
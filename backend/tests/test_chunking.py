@@ -0,0 +1,74 @@
+from server.services import chunking
+from server.services.chunking import split_with_metadata
+
+
+def _long_section(sentences: int = 60) -> str:
+    body = " ".join(
+        f"Предложение номер {i} описывает работу гибридного поиска и переранжирования."
+        for i in range(sentences)
+    )
+    return f"# Раздел\n\n{body}\n"
+
+
+def test_pack_by_tokens_carries_exact_overlap():
+    text = _long_section()
+    starts = chunking._token_starts(text)
+    breaks = chunking._break_points(text, starts)
+
+    ranges = chunking._pack_by_tokens(len(starts), breaks, chunk_size=50, overlap=12)
+
+    assert len(ranges) > 3
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(starts)
+    for (s1, e1), (s2, _) in zip(ranges, ranges[1:]):
+        assert e1 - s1 <= 50
+        assert s2 == e1 - 12
+    # все чанки, кроме последнего, заканчиваются на границе предложения
+    assert all(e in breaks for _, e in ranges)
+
+
+def test_pack_by_tokens_hard_cuts_without_breaks():
+    assert chunking._pack_by_tokens(25, [25], chunk_size=10, overlap=3) == [
+        (0, 10),
+        (7, 17),
+        (14, 24),
+        (21, 25),
+    ]
+
+
+def test_each_section_is_tokenized_once(monkeypatch):
+    calls = []
+    original = chunking._token_starts
+
+    def counting(txt):
+        calls.append(txt)
+        return original(txt)
+
+    monkeypatch.setattr(chunking, "_token_starts", counting)
+    text = _long_section() + "\n" + _long_section().replace("# Раздел", "## Ещё раздел")
+    chunks = split_with_metadata(text, chunk_size=50, overlap=10)
+
+    assert len(chunks) > 4
+    assert len(calls) == 2
+
+
+def test_chunks_are_verbatim_slices_with_overlap():
+    text = _long_section()
+    chunks = split_with_metadata(text, chunk_size=50, overlap=12)
+    normalized = chunking.prepare_text(text)
+
+    for c in chunks:
+        start, end = c["span"]
+        assert normalized[start:end] == c["text"]
+    for prev, nxt in zip(chunks, chunks[1:]):
+        # хвост предыдущего чанка повторяется в начале следующего
+        assert prev["text"][-15:] in nxt["text"]
+
+
+def test_text_before_first_heading_is_kept():
+    text = (
+        "Вступление до первого заголовка тоже должно попадать в индекс целиком.\n\n"
+        "# Раздел\n\nТекст раздела, который идёт после заголовка документа."
+    )
+    chunks = split_with_metadata(text)
+    assert chunks[0]["heading"] == ""
+    assert chunks[0]["text"].startswith("Вступление")
@@ -0,0 +1,54 @@
+from server.services.chunking import count_tokens
+from server.services.compression import GAP, compress_contexts
+from server.services.embeddings import HashEmbeddings
+
+FILLER = [
+    "Команда обсуждала планы на квартал и распределение отпусков между сотрудниками.",
+    "Погода в офисе была тёплой, а кофемашина снова требовала чистки от накипи.",
+    "Бухгалтерия напомнила о сроках сдачи отчётов и подписании актов с подрядчиками.",
+    "Новый стажёр изучал структуру репозитория и задавал много вопросов коллегам.",
+]
+
+
+def test_keeps_sentences_closest_to_the_question_with_neighbours():
+    relevant = "Кэш эмбеддингов хранит векторы запросов и ускоряет поиск по индексу."
+    context = " ".join(FILLER[:2] + [relevant] + FILLER[2:])
+    other = " ".join(reversed(FILLER))
+
+    out, stats = compress_contexts(
+        "как кэш эмбеддингов ускоряет поиск по индексу",
+        [context, other],
+        HashEmbeddings(256),
+        ratio=0.5,
+        neighbours=1,
+    )
+
+    assert relevant in out[0]
+    # соседи лучшего предложения идут с ним одним связным куском
+    assert f"{FILLER[1]} {relevant} {FILLER[2]}" in out[0]
+    assert stats.tokens_after < stats.tokens_before
+    assert sum(count_tokens(c) for c in out) < count_tokens(context) + count_tokens(
+        other
+    )
+
+
+def test_token_target_and_gaps():
+    sentences = [f"Раздел {i}: {FILLER[i % len(FILLER)]}" for i in range(12)]
+    context = " ".join(sentences)
+
+    out, stats = compress_contexts(
+        sentences[7], [context], HashEmbeddings(256), target_tokens=40, neighbours=0
+    )
+
+    assert sentences[7] in out[0]
+    assert stats.tokens_after <= 40
+    assert stats.ratio < 1.0
+    # несмежные предложения разделены пропуском
+    assert out[0].count("Раздел") == out[0].count(GAP) + 1
+
+
+def test_nothing_to_cut_returns_contexts_unchanged():
+    contexts = ["Коротко.", ""]
+    out, stats = compress_contexts("вопрос", contexts, HashEmbeddings(64), ratio=1.0)
+    assert out == contexts
+    assert stats.ratio == 1.0
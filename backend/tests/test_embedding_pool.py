@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+import pytest
+
+from server.services.embedding_pool import EmbeddingPool
+from server.services.embeddings import HashEmbeddings
+from server.telemetry.metrics import embedding_queue_depth
+
+
+def test_pool_matches_in_process_embeddings(monkeypatch: pytest.MonkeyPatch):
+    # воркеры стартуют через spawn и читают настройки из окружения
+    monkeypatch.setenv("EMBED_PROVIDER", "hash")
+    monkeypatch.setenv("EMBED_DIM", "32")
+    texts = [f"фрагмент {i} про поиск и индекс {i % 7}" for i in range(150)]
+
+    pool = EmbeddingPool(2)
+    try:
+        assert pool.dim == 32
+        got = pool.embed_array(texts)
+        assert got.dtype == np.float32 and got.shape == (150, 32)
+        np.testing.assert_allclose(got, HashEmbeddings(32).embed(texts), atol=1e-6)
+        assert pool.embed([]) == []
+        # токены для late interaction считает тот же пул, матрицы разной длины
+        tokens = pool.embed_tokens(texts[:5])
+        expected = HashEmbeddings(32).embed_tokens(texts[:5])
+        assert [t.shape for t in tokens] == [e.shape for e in expected]
+        for got_t, exp_t in zip(tokens, expected):
+            np.testing.assert_allclose(got_t, exp_t, atol=1e-6)
+        assert embedding_queue_depth._value.get() == 0
+    finally:
+        pool.close()
+
+    with pytest.raises(RuntimeError):
+        pool.embed(["после close"])
+
+
+def test_killed_worker_only_fails_its_own_jobs_and_is_restarted(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setenv("EMBED_PROVIDER", "hash")
+    monkeypatch.setenv("EMBED_DIM", "16")
+    pool = EmbeddingPool(2)
+    try:
+        victim = pool._procs[0]
+        victim.terminate()
+        victim.join()
+        # второй воркер здоров: пачки считаются, пока первый перезапускается
+        for _ in range(5):
+            assert pool.embed_array(["текст"] * 8).shape == (8, 16)
+        deadline = time.monotonic() + 60
+        while not all(pool._started) and time.monotonic() < deadline:
+            time.sleep(0.2)
+        assert pool._procs[0] is not victim and all(pool._started)
+        assert pool.embed_array(["после рестарта"] * 4).shape == (4, 16)
+    finally:
+        pool.close()
+
+
+def test_pool_gives_up_on_workers_that_cannot_load_the_model(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    from server.services import embeddings
+
+    monkeypatch.setenv("EMBED_PROVIDER", "hash")
+    monkeypatch.setenv("EMBED_DIM", "16")
+    pool = EmbeddingPool(1, max_start_failures=2)
+    try:
+        assert pool.embed_array(["до сбоя"]).shape == (1, 16)
+        # замены воркера стартуют уже с неизвестным провайдером и падают при загрузке
+        monkeypatch.setenv("EMBED_PROVIDER", "missing")
+        pool._procs[0].terminate()
+        deadline = time.monotonic() + 60
+        while not pool.broken and time.monotonic() < deadline:
+            time.sleep(0.2)
+        assert pool.broken and "missing" in pool.broken
+        with pytest.raises(RuntimeError, match="broken"):
+            pool.embed_array(["после сбоя"])
+
+        monkeypatch.setattr(embeddings, "_embeddings_singleton", pool)
+        fallback = embeddings.get_embeddings()
+        assert fallback is not pool and fallback.embed_array(["текст"]).shape[0] == 1
+    finally:
+        pool.close()
+        embeddings.reset_embeddings()
@@ -1,5 +1,7 @@
 import hashlib
 
+import numpy as np
+
 from server.services.embeddings import HashEmbeddings
 
 
@@ -33,3 +35,14 @@ def test_hash_embeddings_consistent_for_multiple_inputs():
     vec3 = embedder.embed(["раз  два   три"])[0]
 
     assert vec1 == vec2 == vec3
+
+
+def test_hash_embeddings_array_matches_lists():
+    embedder = HashEmbeddings(16)
+    texts = ["первый текст", "", "второй  текст про поиск"]
+
+    arr = embedder.embed_array(texts)
+
+    assert arr.dtype == np.float32 and arr.shape == (3, 16)
+    np.testing.assert_allclose(arr, embedder.embed(texts), atol=1e-7)
+    assert not arr[1].any()
@@ -0,0 +1,59 @@
+"""
+Бюджет времени импорта: API, воркер и тесты не должны платить за torch,
+sentence-transformers и qdrant_client, пока те не понадобились.
+
+Бюджет в секундах задаётся IMPORT_TIME_BUDGET (по умолчанию 2.0); меряется
+лучший из двух запусков в чистом интерпретаторе.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parents[1]
+HEAVY = (
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "qdrant_client",
+    "onnxruntime",
+)
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _measure(module: str) -> dict:
+    env = {k: v for k, v in os.environ.items() if k != "PYTEST_CURRENT_TEST"}
+    env["PYTHONPATH"] = str(BACKEND)
+    runs = []
+    for _ in range(2):
+        out = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+            cwd=BACKEND,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return min(runs, key=lambda r: r["seconds"])
+
+
+@pytest.mark.parametrize("module", ["server.main", "server.tasks.celery_app"])
+def test_import_stays_within_budget(module):
+    budget = float(os.environ.get("IMPORT_TIME_BUDGET", "2.0"))
+    result = _measure(module)
+    assert result["heavy"] == [], f"{module} eagerly imports {result['heavy']}"
+    assert (
+        result["seconds"] <= budget
+    ), f"{module} imports in {result['seconds']:.2f}s > {budget}s"
@@ -22,14 +22,18 @@ def _client(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> TestClient:
     return TestClient(app)
 
 
-def _ingest(client: TestClient, filename: str, content: bytes, content_type: str = "text/plain"):
+def _ingest(
+    client: TestClient, filename: str, content: bytes, content_type: str = "text/plain"
+):
     files = {"file": (filename, io.BytesIO(content), content_type)}
     response = client.post("/ingest", files=files)
     assert response.status_code == 200, response.text
     return response.json()
 
 
-def test_document_identity_is_deterministic(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+def test_document_identity_is_deterministic(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
     client = _client(monkeypatch, tmp_path)
 
     payload_text = (
@@ -78,3 +82,242 @@ def test_metadata_written_to_docstore(monkeypatch: pytest.MonkeyPatch, tmp_path:
     assert meta["chunk_total"] == response["chunks"]
     assert meta["document_size"] == len(payload)
     assert meta["content_type"] == "text/markdown"
+
+
+def _sections(*bodies: str) -> str:
+    return "\n\n".join(
+        f"## Раздел {i}\n\n{body}" for i, body in enumerate(bodies, start=1)
+    )
+
+
+def test_reingest_identical_document_is_noop(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    client = _client(monkeypatch, tmp_path)
+
+    payload = _sections(
+        "Первый раздел описывает загрузку документов и разбиение их на фрагменты.",
+        "Второй раздел рассказывает о векторном поиске и переранжировании.",
+    ).encode("utf-8")
+    first = _ingest(client, "wiki.md", payload, content_type="text/markdown")
+    assert first["status"] == "created"
+    assert first["embedded"] == first["chunks"]
+
+    second = _ingest(client, "wiki.md", payload, content_type="text/markdown")
+    assert second["status"] == "unchanged"
+    assert second["embedded"] == 0
+    assert second["chunks"] == first["chunks"]
+
+
+def test_reingest_restores_points_lost_by_the_index(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    client = _client(monkeypatch, tmp_path)
+
+    kept = "Раздел о том, что манифест в docstore переживает локальный индекс."
+    payload = _sections(kept, "Второй раздел про восстановление точек.").encode("utf-8")
+    first = _ingest(client, "restart.md", payload, content_type="text/markdown")
+
+    from server.services import vectorstore
+    from server.services.embeddings import get_embeddings
+
+    # рестарт с памятью вместо Qdrant: docstore на месте, индекс пуст
+    vectorstore.reset_vectorstore()
+    again = _ingest(client, "restart.md", payload, content_type="text/markdown")
+    assert again["status"] == "reindexed" and again["embedded"] == first["chunks"]
+    hits = vectorstore.get_vectorstore().search(
+        get_embeddings().embed([kept])[0], top_k=5
+    )
+    assert any(p.get("document_id") == first["document_id"] for p, _ in hits)
+
+    assert (
+        _ingest(client, "restart.md", payload, "text/markdown")["status"] == "unchanged"
+    )
+
+
+def test_changed_document_embeds_only_delta(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    client = _client(monkeypatch, tmp_path)
+
+    kept = "Этот раздел не меняется между версиями и не должен эмбеддиться повторно."
+    old = _sections(
+        kept, "Устаревший раздел, который будет удалён в следующей версии вики."
+    )
+    new = _sections(
+        kept, "Совершенно новый раздел, появившийся при ночной синхронизации вики."
+    )
+
+    first = _ingest(
+        client, "wiki.md", old.encode("utf-8"), content_type="text/markdown"
+    )
+    second = _ingest(
+        client, "wiki.md", new.encode("utf-8"), content_type="text/markdown"
+    )
+
+    assert second["document_id"] == first["document_id"]
+    assert second["status"] == "updated"
+    assert second["embedded"] == 1
+    assert second["retired"] == 1
+
+    from server import db
+
+    store = db.get_docstore()
+    texts = [
+        store.get(cid)["text"] for cid in store.list_by_document(second["document_id"])
+    ]
+    assert len(texts) == second["chunks"]
+    assert not any("Устаревший" in t for t in texts)
+
+
+def test_unchanged_chunks_get_current_meta_in_the_index(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    client = _client(monkeypatch, tmp_path)
+
+    kept = "Раздел про сроки хранения логов остаётся в обеих версиях документа."
+    old = _sections(kept)
+    new = _sections(kept, "Добавленный раздел про ротацию логов сдвигает число чанков.")
+    _ingest(client, "logs.md", old.encode("utf-8"), content_type="text/markdown")
+    second = _ingest(
+        client, "logs.md", new.encode("utf-8"), content_type="text/markdown"
+    )
+    assert second["embedded"] == 1
+
+    from server.services.embeddings import get_embeddings
+    from server.services.vectorstore import get_vectorstore
+
+    query = get_embeddings().embed([kept])[0]
+    hits = get_vectorstore().search(query, top_k=50)
+    payloads = [p for p, _ in hits if p.get("document_id") == second["document_id"]]
+    assert len(payloads) == second["chunks"] == 2
+    # вектор неизменённого чанка не пересчитывался, но payload — от новой версии
+    assert all(p["document_sha256"] == second["document_hash"] for p in payloads)
+    assert all(p["chunk_total"] == 2 for p in payloads)
+
+
+def test_chunks_are_stored_as_offsets_into_one_source(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    client = _client(monkeypatch, tmp_path)
+
+    old = _sections(
+        "Первая версия раздела про хранение чанков в виде смещений в документе."
+    )
+    new = _sections(
+        "Вторая версия: текст документа хранится один раз, а чанки — только смещения.",
+        "Ещё один раздел с кириллицей, чтобы байтовые смещения отличались от символьных.",
+    )
+    _ingest(client, "views.md", old.encode("utf-8"), content_type="text/markdown")
+    created = _ingest(
+        client, "views.md", new.encode("utf-8"), content_type="text/markdown"
+    )
+
+    from server import db
+
+    store = db.get_docstore()
+    # старая версия исходника удалена, осталась одна
+    sources = Path(store.source_dir)
+    assert (
+        len(
+            [
+                p
+                for p in sources.iterdir()
+                if p.name.startswith(str(created["document_id"]))
+            ]
+        )
+        == 1
+    )
+    for cid in store.list_by_document(created["document_id"]):
+        raw = (Path(store.base_dir) / f"{cid}.json").read_text(encoding="utf-8")
+        assert '"text"' not in raw
+        record = store.get(cid)
+        start, end = record["meta"]["span"]
+        assert record["text"] == new.strip()[start:end]
+        window = store.get_window(cid, before=10, after=10)
+        assert record["text"] in window and len(window) > len(record["text"])
+
+    client.delete(f"/documents/{created['document_id']}")
+    assert not [
+        p for p in sources.iterdir() if p.name.startswith(str(created["document_id"]))
+    ]
+
+
+def test_delete_document_removes_chunks_and_vectors(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    client = _client(monkeypatch, tmp_path)
+
+    payload = _sections(
+        "Документ, который будет удалён целиком вместе с векторами и манифестом.",
+    ).encode("utf-8")
+    created = _ingest(client, "obsolete.md", payload, content_type="text/markdown")
+    document_id = created["document_id"]
+
+    response = client.delete(f"/documents/{document_id}")
+    assert response.status_code == 200, response.text
+    assert response.json()["chunks"] == created["chunks"]
+
+    from server import db
+    from server.services.embeddings import get_embeddings
+    from server.services.vectorstore import get_vectorstore
+
+    assert db.get_docstore().list_by_document(document_id) == []
+    query = get_embeddings().embed(["удалён целиком"])[0]
+    hits = get_vectorstore().search(query, top_k=50)
+    assert all(p.get("document_id") != document_id for p, _ in hits)
+
+    assert client.delete(f"/documents/{document_id}").status_code == 404
+    # после удаления тот же файл индексируется заново, а не считается неизменным
+    assert (
+        _ingest(client, "obsolete.md", payload, "text/markdown")["status"] == "created"
+    )
+
+
+def test_bulk_ingest_expands_archives_and_reports_per_file(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    import zipfile
+
+    client = _client(monkeypatch, tmp_path)
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr(
+            "kb/one.md", _sections("Первый документ из архива про индексацию и поиск.")
+        )
+        zf.writestr(
+            "kb/two.md", _sections("Второй документ из архива про переранжирование.")
+        )
+        zf.writestr("kb/.hidden.md", "служебный файл, который нужно пропустить")
+        zf.writestr("kb/empty.md", "")
+
+    files = [
+        ("files", ("kb.zip", archive.getvalue(), "application/zip")),
+        (
+            "files",
+            (
+                "three.md",
+                _sections("Третий документ загружен рядом с архивом.").encode(),
+                "text/markdown",
+            ),
+        ),
+    ]
+    response = client.post("/ingest/bulk", files=files)
+    assert response.status_code == 200, response.text
+    data = response.json()
+
+    by_name = {f["filename"]: f for f in data["files"]}
+    assert set(by_name) == {"kb/one.md", "kb/two.md", "kb/empty.md", "three.md"}
+    assert by_name["kb/empty.md"]["status"] == "error"
+    assert all(
+        by_name[n]["status"] == "created"
+        for n in ("kb/one.md", "kb/two.md", "three.md")
+    )
+    assert data["documents"] == 3
+    assert data["embedded"] == sum(f["embedded"] for f in data["files"])
+
+    # повторная загрузка того же архива ничего не эмбеддит
+    again = client.post("/ingest/bulk", files=files[:1]).json()
+    assert {f["status"] for f in again["files"] if f["ok"]} == {"unchanged"}
+    assert again["embedded"] == 0
@@ -0,0 +1,102 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from server.db.docstore import LocalDocStore
+from server.services.embeddings import HashEmbeddings
+from server.services.late_interaction import (
+    LateInteractionReranker,
+    dequantize,
+    maxsim,
+    quantize,
+)
+from server.services.packing import Candidate
+
+
+def _random_tokens(rng: np.random.Generator, n: int, dim: int = 32) -> np.ndarray:
+    mat = rng.normal(size=(n, dim)).astype(np.float32)
+    return mat / np.linalg.norm(mat, axis=1, keepdims=True)
+
+
+def test_vectorized_maxsim_matches_the_per_document_loop():
+    rng = np.random.default_rng(0)
+    query = _random_tokens(rng, 5)
+    docs = [_random_tokens(rng, n) for n in (7, 1, 0, 12)]
+
+    scores = maxsim(query, [quantize(d, "float32") for d in docs])
+
+    expected = [(query @ d.T).max(axis=1).mean() if len(d) else 0.0 for d in docs]
+    np.testing.assert_allclose(scores, expected, rtol=1e-6, atol=1e-6)
+
+
+def test_int8_tokens_are_four_times_smaller_and_score_almost_the_same():
+    rng = np.random.default_rng(1)
+    query = _random_tokens(rng, 6)
+    docs = [_random_tokens(rng, 40) for _ in range(20)]
+
+    exact = maxsim(query, [quantize(d, "float32") for d in docs])
+    packed = [quantize(d, "int8") for d in docs]
+    approx = maxsim(query, packed)
+
+    assert packed[0][0].nbytes * 4 == docs[0].nbytes
+    assert np.abs(dequantize(packed[0]) - docs[0]).max() < 0.01
+    assert np.abs(approx - exact).max() < 0.01
+    assert approx.argmax() == exact.argmax()
+
+
+def test_reranker_uses_stored_tokens_and_encodes_missing_ones(tmp_path: Path):
+    docstore = LocalDocStore(str(tmp_path))
+    reranker = LateInteractionReranker(HashEmbeddings(64), docstore, dtype="int8")
+    texts = ["кэш эмбеддингов ускоряет поиск", "про погоду и отпуск", "поиск по кэшу"]
+    reranker.store(["d:0", "d:1"], texts[:2])
+    assert docstore.get_tokens("d:0") is not None
+
+    cands = [Candidate(f"d:{i}", t, {}, 0.0) for i, t in enumerate(texts)]
+    scores = reranker.score("кэш эмбеддингов", cands)
+
+    # d:2 токенов в docstore не имеет — закодирован на лету
+    assert scores[0] == pytest.approx(1.0, abs=0.01)
+    assert scores[1] == pytest.approx(0.0, abs=0.01)
+    assert 0.0 <= scores[2] < scores[0]
+
+    docstore.delete("d:0")
+    assert docstore.get_tokens("d:0") is None
+
+
+def test_late_mode_stores_tokens_at_ingest_and_reranks_chat(monkeypatch):
+    from server.api.routers import chat as chat_router
+    from server.db import get_docstore
+    from server.main import app
+    from server.services import late_interaction
+
+    class FakeLLM:
+        async def generate(self, prompt: str) -> str:
+            return "ответ"
+
+    # другие тесты подменяют core_config.settings — патчим те объекты, что видят модули
+    for settings in (chat_router.settings, late_interaction.settings):
+        monkeypatch.setattr(settings, "RERANK_MODE", "late")
+        monkeypatch.setattr(
+            settings, "RERANK_MARGIN", 1.0
+        )  # реранкер вызывается всегда
+    monkeypatch.setattr(chat_router, "get_llm", lambda: FakeLLM())
+    late_interaction.reset_late_reranker()
+    client = TestClient(app)
+
+    body = (
+        "# Late\n\n" + "Late interaction сравнивает токены вопроса и фрагмента. " * 30
+    )
+    files = {"file": ("late.md", io.BytesIO(body.encode("utf-8")), "text/markdown")}
+    ingested = client.post("/ingest", files=files).json()
+    chunk_ids = get_docstore().list_by_document(ingested["document_id"])
+    assert chunk_ids and all(
+        get_docstore().get_tokens(cid) is not None for cid in chunk_ids
+    )
+
+    response = client.post("/chat", json={"question": "токены вопроса", "top_k": 2})
+    assert response.status_code == 200
+    assert response.json()["references"]
+    late_interaction.reset_late_reranker()
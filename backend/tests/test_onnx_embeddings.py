@@ -0,0 +1,80 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+tokenizers = pytest.importorskip("tokenizers")
+
+from onnx import TensorProto, helper, numpy_helper  # noqa: E402
+
+from server.services.embeddings import OnnxEmbeddings  # noqa: E402
+
+_VOCAB = ["[PAD]", "[UNK]", "поиск", "вектор", "документ", "ответ", "модель", "индекс"]
+
+
+def _tiny_model(path: Path, hidden: int = 8) -> np.ndarray:
+    """Случайная «модель»: lookup эмбеддингов токенов, обнулённых маской."""
+    table = (
+        np.random.default_rng(0).normal(size=(len(_VOCAB), hidden)).astype(np.float32)
+    )
+    nodes = [
+        helper.make_node("Gather", ["table", "input_ids"], ["tok"]),
+        helper.make_node("Cast", ["attention_mask"], ["mask_f"], to=TensorProto.FLOAT),
+        helper.make_node("Unsqueeze", ["mask_f", "axes"], ["mask_3d"]),
+        helper.make_node("Mul", ["tok", "mask_3d"], ["last_hidden_state"]),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        "tiny",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["b", "s"]),
+            helper.make_tensor_value_info(
+                "attention_mask", TensorProto.INT64, ["b", "s"]
+            ),
+        ],
+        [
+            helper.make_tensor_value_info(
+                "last_hidden_state", TensorProto.FLOAT, ["b", "s", hidden]
+            )
+        ],
+        initializer=[
+            numpy_helper.from_array(table, "table"),
+            numpy_helper.from_array(np.array([2], dtype=np.int64), "axes"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.save(model, str(path / "model.onnx"))
+
+    tok = tokenizers.Tokenizer(
+        tokenizers.models.WordLevel(
+            {w: i for i, w in enumerate(_VOCAB)}, unk_token="[UNK]"
+        )
+    )
+    tok.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tok.save(str(path / "tokenizer.json"))
+    return table
+
+
+def test_mean_pooling_matches_reference_and_ignores_padding(tmp_path: Path):
+    table = _tiny_model(tmp_path)
+    embedder = OnnxEmbeddings(str(tmp_path), threads=1)
+
+    single = np.array(embedder.embed(["поиск вектор"])[0])
+    batch = np.array(
+        embedder.embed(["поиск вектор", "документ ответ модель индекс поиск"])
+    )
+
+    expected = table[[2, 3]].mean(axis=0)
+    expected /= np.linalg.norm(expected)
+    np.testing.assert_allclose(single, expected, atol=1e-6)
+    # короткий текст в батче с длинным дополняется паддингом — вектор не меняется
+    np.testing.assert_allclose(batch[0], single, atol=1e-6)
+    np.testing.assert_allclose(np.linalg.norm(batch, axis=1), 1.0, atol=1e-6)
+
+
+def test_missing_model_raises(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        OnnxEmbeddings(str(tmp_path))
@@ -0,0 +1,70 @@
+import numpy as np
+
+from server.db.docstore import LocalDocStore
+from server.services.chunking import count_tokens
+from server.services.packing import Candidate, merge_adjacent, pack_contexts, select_mmr
+
+
+def _vec(*xs: float) -> np.ndarray:
+    v = np.asarray(xs, dtype=np.float32)
+    return v / np.linalg.norm(v)
+
+
+def test_overlapping_chunks_of_one_source_are_read_once(tmp_path):
+    store = LocalDocStore(str(tmp_path))
+    text = "Первый абзац про индекс. Второй абзац про поиск. Третий абзац про кэш."
+    store.put_source("doc", text)
+    raw = text.encode("utf-8")
+    a_end = raw.index("поиск".encode("utf-8"))
+    b_start = raw.index("Второй".encode("utf-8"))
+    cands = [
+        Candidate(
+            "1:a", raw[:a_end].decode(), {"document_id": 1}, 0.9, "doc", (0, a_end)
+        ),
+        Candidate(
+            "1:b",
+            raw[b_start:].decode(),
+            {"document_id": 1},
+            0.5,
+            "doc",
+            (b_start, len(raw)),
+        ),
+        Candidate("2:x", "Другой документ.", {"document_id": 2}, 0.7),
+    ]
+
+    passages = merge_adjacent(cands, store.read_source)
+
+    assert [p.text for p in passages] == [text, "Другой документ."]
+    assert passages[0].score == 0.9
+    assert {c.chunk_id for c in passages[0].members} == {"1:a", "1:b"}
+
+
+def test_mmr_drops_near_duplicates_and_prefers_diverse_passages():
+    cands = [
+        Candidate("a", "индекс и поиск по векторам", {}, 0.95, vector=_vec(1, 0, 0)),
+        Candidate(
+            "a2", "поиск по векторам и индекс", {}, 0.94, vector=_vec(1, 0.01, 0)
+        ),
+        Candidate("b", "кэш ответов модели", {}, 0.6, vector=_vec(0, 1, 0)),
+    ]
+
+    picked = pack_contexts(cands, budget=1000, dedup_threshold=0.95)
+
+    assert [p.best.chunk_id for p in picked] == ["a", "b"]
+
+
+def test_budget_is_respected_and_first_passage_is_truncated():
+    words = " ".join(f"слово{i}" for i in range(400))
+    cands = [
+        Candidate("big", words, {}, 1.0),
+        Candidate("small", "короткий фрагмент", {}, 0.5),
+    ]
+
+    picked = select_mmr(merge_adjacent(cands, None), budget=50)
+
+    assert [p.best.chunk_id for p in picked] == ["big"]
+    assert count_tokens(picked[0].text) <= 50
+
+    picked = select_mmr(merge_adjacent(cands, None), budget=1000)
+    assert sum(p.tokens for p in picked) <= 1000
+    assert len(picked) == 2
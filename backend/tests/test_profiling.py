@@ -0,0 +1,69 @@
+import re
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server.telemetry import profiling
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling.settings, "PROFILE_TOKEN", "s3cret")
+    monkeypatch.setattr(profiling.settings, "PROFILE_DIR", str(tmp_path))
+    from server.main import app
+
+    return TestClient(app)
+
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+def test_profile_header_stores_downloadable_profile(client):
+    plain = client.post("/chat", json={"question": "что такое индекс?"})
+    assert "x-profile-id" not in plain.headers
+    wrong = client.post(
+        "/chat", json={"question": "что такое индекс?"}, headers={"X-Profile": "x"}
+    )
+    assert "x-profile-id" not in wrong.headers
+
+    r = client.post(
+        "/chat", json={"question": "что такое индекс?"}, headers={"X-Profile": "s3cret"}
+    )
+    profile_id = r.headers["x-profile-id"]
+
+    listed = client.get("/admin/profiles", headers=AUTH).json()
+    assert listed[0]["id"] == profile_id and listed[0]["route"] == "/chat"
+    text = client.get(
+        f"/admin/profiles/{profile_id}", params={"format": "text"}, headers=AUTH
+    ).text
+    assert "chat.py" in text
+    raw = client.get(f"/admin/profiles/{profile_id}", headers=AUTH)
+    assert raw.status_code == 200 and len(raw.content) > 0
+    assert client.get("/admin/profiles/..%2Fsecret", headers=AUTH).status_code == 404
+
+
+def test_profile_endpoints_require_the_token(client, monkeypatch):
+    assert client.get("/admin/profiles").status_code == 403
+    bad = {"Authorization": "Bearer nope"}
+    assert (
+        client.post("/admin/profile", params={"seconds": 0.1}, headers=bad).status_code
+        == 403
+    )
+    # без PROFILE_TOKEN эндпоинты выключены, даже если профили пишет PROFILE_SAMPLE_RATE
+    monkeypatch.setattr(profiling.settings, "PROFILE_TOKEN", "")
+    monkeypatch.setattr(profiling.settings, "PROFILE_SAMPLE_RATE", 0.5)
+    assert client.get("/admin/profiles", headers=AUTH).status_code == 404
+
+
+def test_profiling_is_off_by_default():
+    assert not profiling.profiling_enabled()
+
+
+def test_sampling_profile_returns_collapsed_stacks(client):
+    r = client.post(
+        "/admin/profile", params={"seconds": 0.2, "interval_ms": 5}, headers=AUTH
+    )
+    assert r.status_code == 200
+    lines = r.text.strip().splitlines()
+    assert lines and all(re.fullmatch(r".+ \d+", line) for line in lines)
+    assert any(";" in line for line in lines)
@@ -0,0 +1,98 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from server.services.projection import Projection, fit_projection, recall_at_k
+
+
+def _low_rank(n: int = 400, dim: int = 64, rank: int = 8) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    mat = rng.normal(size=(n, rank)) @ rng.normal(size=(rank, dim))
+    return (mat + 0.01 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_pca_keeps_variance_and_neighbours(tmp_path: Path):
+    sample = _low_rank()
+    projection = fit_projection(sample, target_dim=16)
+
+    assert projection.target_dim == 16 and projection.retained_variance > 0.99
+    assert recall_at_k(sample, projection, k=10) > 0.9
+    reduced = projection.apply(sample)
+    assert reduced.shape == (400, 16) and reduced.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1.0, atol=1e-5)
+
+    path = str(tmp_path / "projection.npz")
+    projection.save(path)
+    loaded = Projection.load(path)
+    np.testing.assert_allclose(loaded.apply(sample[0]), reduced[0], atol=1e-6)
+
+
+def test_truncate_takes_prefix():
+    sample = _low_rank()
+    projection = fit_projection(sample, target_dim=8, kind="truncate")
+    head = sample[:, :8] / np.linalg.norm(sample[:, :8], axis=1, keepdims=True)
+    np.testing.assert_allclose(projection.apply(sample), head, atol=1e-6)
+    with pytest.raises(ValueError):
+        fit_projection(sample, target_dim=64)
+
+
+def test_reindex_fits_projection_and_swaps_dimensions(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    monkeypatch.setenv("DOCSTORE_PATH", str(tmp_path / "chunks"))
+    monkeypatch.setenv("VECTOR_BACKEND", "memory")
+    monkeypatch.setenv("EMBED_PROJECTION", "pca")
+    monkeypatch.setenv("EMBED_PROJECTION_DIM", "16")
+    monkeypatch.setenv("EMBED_PROJECTION_PATH", str(tmp_path / "projection.npz"))
+
+    from server.core import config as core_config
+
+    core_config.get_settings.cache_clear()
+    core_config.settings = core_config.get_settings()
+    for module in ("vectorstore", "projection", "reindex"):
+        monkeypatch.setattr(f"server.services.{module}.settings", core_config.settings)
+
+    from server import db
+    from server.services import vectorstore
+    from server.services.embeddings import get_embeddings
+    from server.services.indexing import Indexer
+    from server.services.retriever import HybridRetriever
+    from server.services.reindex import start_reindex
+
+    db.reset_docstore()
+    vectorstore.reset_vectorstore()
+    try:
+        records = [
+            (
+                f"5:{i}",
+                {
+                    "meta": {"chunk_id": f"5:{i}"},
+                    "text": f"тема-{i} раздел-{i} пункт-{i}",
+                },
+            )
+            for i in range(40)
+        ]
+        db.get_docstore().bulk_put(records)
+        Indexer(get_embeddings(), vectorstore.get_vectorstore()).upsert_chunks(
+            [r["text"] for _, r in records], [r["meta"] for _, r in records]
+        )
+
+        job = start_reindex(batch_size=8)
+        deadline = time.time() + 10
+        while job.state in {"pending", "running"} and time.time() < deadline:
+            time.sleep(0.01)
+
+        status = job.status()
+        assert status["state"] == "done", status
+        assert status["projection"]["target_dim"] == 16
+        assert (tmp_path / "projection.npz").exists()
+        assert vectorstore.get_vectorstore().dim == 16
+
+        # запрос проецируется так же, как документы
+        retriever = HybridRetriever(get_embeddings(), vectorstore.get_vectorstore())
+        assert retriever.search("тема-7 раздел-7 пункт-7", top_k=1)[0][0] == "5:7"
+    finally:
+        vectorstore.reset_vectorstore()
+        db.reset_docstore()
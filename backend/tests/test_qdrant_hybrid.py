@@ -0,0 +1,149 @@
+import hashlib
+from typing import List
+
+import numpy as np
+import pytest
+
+pytest.importorskip("qdrant_client")
+
+from qdrant_client import QdrantClient  # noqa: E402
+
+from server.services.indexing import Indexer  # noqa: E402
+from server.services.interfaces import Embeddings  # noqa: E402
+from server.services.retriever import HybridRetriever  # noqa: E402
+from server.services.sparse import encode_document, encode_query  # noqa: E402
+from server.services.vectorstore import QdrantVS  # noqa: E402
+
+TEXTS = [
+    "Отпуск оформляется заявлением за две недели.",
+    "Пароль от Wi-Fi в переговорной висит у двери.",
+    "Ошибка E4021 означает, что истёк сертификат прокси.",
+    "Парковка для гостей — на втором уровне.",
+]
+
+
+class NoiseEmbeddings(Embeddings):
+    """Dense-модель, которая ничего не знает о терминах: вектор — шум от хеша текста."""
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(texts).tolist()
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        seeds = [
+            int.from_bytes(hashlib.sha256(t.encode()).digest()[:4], "big")
+            for t in texts
+        ]
+        return np.stack(
+            [np.random.default_rng(s).normal(size=32) for s in seeds]
+        ).astype(np.float32)
+
+
+def _index(store: QdrantVS) -> None:
+    Indexer(NoiseEmbeddings(), store).upsert_chunks(
+        TEXTS, [{"chunk_id": f"1:{i}", "document_id": 1} for i in range(len(TEXTS))]
+    )
+
+
+def test_bm25_weights_saturate_and_queries_are_binary():
+    once = encode_document("сертификат прокси", avgdl=2)[1]
+    many = encode_document("сертификат сертификат сертификат прокси", avgdl=2)[1]
+    assert max(many) > max(once) and max(many) < 3 * max(once)
+    indices, values = encode_query("Истёк сертификат, сертификат!")
+    assert indices == sorted(set(indices)) and values == [1.0, 1.0]
+
+
+def test_hybrid_query_finds_exact_terms_in_one_round_trip(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    client = QdrantClient(":memory:")
+    store = QdrantVS("", "kb", 32, client=client, hybrid=True)
+    assert store.supports_sparse
+    _index(store)
+
+    calls: List[str] = []
+    for name in ("search", "query_points"):
+        original = getattr(client, name)
+        monkeypatch.setattr(
+            client,
+            name,
+            lambda *a, _n=name, _f=original, **k: calls.append(_n) or _f(*a, **k),
+        )
+
+    hits, vectors = HybridRetriever(NoiseEmbeddings(), store).search_with_vectors(
+        "что значит ошибка E4021", top_k=2
+    )
+    assert hits[0][0] == "1:2"
+    assert vectors is not None and vectors.shape == (len(hits), 32)
+    assert calls == ["query_points"]
+
+
+def test_legacy_dense_collection_gains_sparse_vectors_after_reindex():
+    client = QdrantClient(":memory:")
+    _index(QdrantVS("", "kb", 32, client=client, hybrid=False))
+
+    live = QdrantVS("", "kb", 32, client=client, hybrid=True)
+    assert not live.supports_sparse  # старая коллекция без bm25 — только dense
+    hits, _ = live.hybrid_search_with_vectors(
+        NoiseEmbeddings().embed_array(["E4021"])[0], encode_query("E4021"), 4
+    )
+    assert len(hits) == 4
+
+    shadow = live.create_shadow(32)
+    _index(shadow)
+    live.promote(shadow)
+
+    assert live.supports_sparse
+    top, _ = HybridRetriever(NoiseEmbeddings(), live).search_with_vectors(
+        "E4021", top_k=1
+    )
+    assert top[0][0] == "1:2"
+
+
+def test_set_payload_updates_existing_points_and_skips_missing():
+    store = QdrantVS("", "kb", 32, client=QdrantClient(":memory:"), hybrid=True)
+    _index(store)
+    indexer = Indexer(NoiseEmbeddings(), store)
+    indexer.update_chunk_meta(
+        [{"chunk_id": "1:2", "chunk_index": 7}, {"chunk_id": "1:404", "chunk_index": 0}]
+    )
+    hits = store.search(NoiseEmbeddings().embed_array([TEXTS[2]])[0], top_k=1)
+    payload = hits[0][0]
+    assert payload["chunk_id"] == "1:2" and payload["chunk_index"] == 7
+    assert payload["document_id"] == 1  # остальные поля payload сохранились
+    assert indexer.missing_chunks(["1:2", "1:404"]) == ["1:404"]
+
+
+def test_legacy_collection_keeps_serving_while_it_becomes_an_alias(
+    monkeypatch: pytest.MonkeyPatch,
+):
+    from qdrant_client.http import models as qm
+
+    client = QdrantClient(":memory:")
+    # коллекция из схемы до alias: имя QDRANT_COLLECTION — сама коллекция
+    client.create_collection(
+        "kb", vectors_config=qm.VectorParams(size=32, distance=qm.Distance.COSINE)
+    )
+    live = QdrantVS("", "kb", 32, client=client, hybrid=False)
+    _index(live)
+    shadow = live.create_shadow(32)
+    _index(shadow)
+
+    query = NoiseEmbeddings().embed_array([TEXTS[2]])[0]
+    during: List[int] = []
+    delete = client.delete_collection
+
+    def delete_and_search(name, *a, **k):
+        # legacy-коллекцию удаляют, когда alias с её именем уже смотрит на новую
+        assert live._aliases() == {"kb": shadow.collection}
+        out = delete(name, *a, **k)
+        during.append(len(live.search(query, top_k=4)))
+        # другие реплики обращаются по имени и тоже получают ответ
+        during.append(len(client.search("kb", query_vector=query.tolist(), limit=4)))
+        return out
+
+    monkeypatch.setattr(client, "delete_collection", delete_and_search)
+    live.promote(shadow)
+
+    assert during == [4, 4]
+    assert live.collection == "kb" and live._aliases() == {"kb": shadow.collection}
+    assert live.search(query, top_k=1)[0][0]["chunk_id"] == "1:2"
@@ -0,0 +1,142 @@
+import time
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture()
+def local_index(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
+    monkeypatch.setenv("DOCSTORE_PATH", str(tmp_path))
+    monkeypatch.setenv("VECTOR_BACKEND", "memory")
+
+    from server.core import config as core_config
+
+    core_config.get_settings.cache_clear()
+    core_config.settings = core_config.get_settings()
+    monkeypatch.setattr("server.services.vectorstore.settings", core_config.settings)
+
+    from server import db
+    from server.services import vectorstore
+
+    db.reset_docstore()
+    vectorstore.reset_vectorstore()
+    yield
+    vectorstore.reset_vectorstore()
+    db.reset_docstore()
+
+
+def _seed(n: int) -> None:
+    from server import db
+    from server.services.embeddings import get_embeddings
+    from server.services.indexing import Indexer
+    from server.services.vectorstore import get_vectorstore
+
+    records = [
+        (
+            f"7:{i}",
+            {
+                "meta": {"chunk_id": f"7:{i}", "document_id": 7},
+                "text": f"фрагмент {i} раздел-{i} пункт-{i}",
+            },
+        )
+        for i in range(n)
+    ]
+    db.get_docstore().bulk_put(records)
+    Indexer(get_embeddings(), get_vectorstore()).upsert_chunks(
+        [r["text"] for _, r in records], [r["meta"] for _, r in records]
+    )
+
+
+def _wait(job, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while job.state in {"pending", "running"} and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_reindex_builds_shadow_and_swaps(local_index):
+    from server.services.embeddings import get_embeddings
+    from server.services.reindex import start_reindex
+    from server.services.vectorstore import get_shadow_vectorstore, get_vectorstore
+
+    _seed(25)
+    before = get_vectorstore()
+
+    job = start_reindex(batch_size=4)
+    _wait(job)
+
+    status = job.status()
+    assert status["state"] == "done", status
+    assert status["processed"] == status["total"] == 25
+    assert get_shadow_vectorstore() is None
+
+    after = get_vectorstore()
+    assert after is not before
+    hits = after.search(
+        get_embeddings().embed(["фрагмент 3 раздел-3 пункт-3"])[0], top_k=1
+    )
+    assert hits[0][0]["chunk_id"] == "7:3"
+
+
+def test_writes_during_reindex_reach_shadow(local_index):
+    from server.services.embeddings import get_embeddings
+    from server.services.indexing import Indexer
+    from server.services.vectorstore import (
+        begin_shadow_vectorstore,
+        get_vectorstore,
+        promote_shadow_vectorstore,
+    )
+
+    shadow = begin_shadow_vectorstore()
+    Indexer(get_embeddings(), get_vectorstore()).upsert_chunks(
+        ["свежий документ во время переиндексации"],
+        [{"chunk_id": "9:0", "document_id": 9}],
+    )
+    assert shadow.stats()["alive"] == 1
+
+    promote_shadow_vectorstore()
+    assert get_vectorstore() is shadow
+
+
+def test_deletes_during_reindex_do_not_come_back_after_promote(local_index):
+    from server.services.embeddings import get_embeddings
+    from server.services.indexing import Indexer
+    from server.services.vectorstore import (
+        begin_shadow_vectorstore,
+        get_vectorstore,
+        promote_shadow_vectorstore,
+    )
+
+    _seed(2)
+    shadow = begin_shadow_vectorstore()
+    live = Indexer(get_embeddings(), get_vectorstore())
+    live.delete_document(7, ["7:0", "7:1"])
+    # переиндексация прочитала чанки из docstore до удаления и пишет их в тень после
+    stale = ["фрагмент 0 раздел-0 пункт-0", "фрагмент 1 раздел-1 пункт-1"]
+    Indexer(get_embeddings(), shadow).upsert_chunks(
+        stale, [{"chunk_id": f"7:{i}", "document_id": 7} for i in range(2)]
+    )
+    # а этот чанк удалили и загрузили заново — он должен остаться
+    live.delete_chunks(["7:1"])
+    live.upsert_chunks([stale[1]], [{"chunk_id": "7:1", "document_id": 7}])
+
+    promote_shadow_vectorstore()
+    hits = get_vectorstore().search(get_embeddings().embed([stale[0]])[0], top_k=5)
+    assert [p["chunk_id"] for p, _ in hits] == ["7:1"]
+
+
+def test_admin_reindex_endpoint_reports_progress(local_index):
+    from fastapi.testclient import TestClient
+
+    from server.main import app
+
+    _seed(3)
+    client = TestClient(app)
+    started = client.post("/admin/reindex")
+    assert started.status_code == 200, started.text
+
+    from server.services.reindex import get_reindex_job
+
+    _wait(get_reindex_job())
+    status = client.get("/admin/reindex").json()
+    assert status["state"] == "done"
+    assert status["processed"] == 3
@@ -0,0 +1,92 @@
+import io
+from typing import List, Optional, Tuple
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server.services.interfaces import LLM
+from server.services.prompting import get_system_instruction
+from server.services.sessions import Session, build_session_prompt, reset_session_store
+
+
+class RecordingLLM(LLM):
+    """Как Ollama: context — токены всего диалога, растут с каждым ходом."""
+
+    def __init__(self) -> None:
+        self.calls: List[Tuple[str, Optional[List[int]]]] = []
+
+    async def generate(self, prompt: str) -> str:
+        return (await self.generate_with_context(prompt))[0]
+
+    async def generate_with_context(
+        self, prompt: str, context: Optional[List[int]] = None
+    ) -> Tuple[str, Optional[List[int]]]:
+        self.calls.append((prompt, context))
+        answer = f"Ответ номер {len(self.calls)}."
+        return answer, list(context or []) + list(range(len((prompt + answer).split())))
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    from server.api.routers import chat as chat_router
+
+    fake = RecordingLLM()
+    monkeypatch.setattr(chat_router, "get_llm", lambda: fake)
+    reset_session_store()
+    yield fake
+    reset_session_store()
+
+
+def test_follow_up_reuses_llm_context_and_sends_only_new_text(llm):
+    from server.main import app
+
+    client = TestClient(app)
+    content = (
+        "# Кэш\n\n" + "Кэш эмбеддингов ускоряет поиск по индексу документов. " * 10
+    )
+    files = {
+        "file": ("session.md", io.BytesIO(content.encode("utf-8")), "text/markdown")
+    }
+    assert client.post("/ingest", files=files).status_code == 200
+
+    first = client.post(
+        "/chat", json={"question": "что ускоряет поиск?", "session_id": "s1"}
+    )
+    second = client.post("/chat", json={"question": "а ещё что?", "session_id": "s1"})
+    assert first.json()["session_id"] == second.json()["session_id"] == "s1"
+
+    (p1, ctx1), (p2, ctx2) = llm.calls
+    assert ctx1 is None and p1.startswith(get_system_instruction())
+    # второй ход продолжает диалог: context от первого, без инструкции и старых фрагментов
+    assert ctx2 is not None and len(ctx2) > 0
+    assert get_system_instruction() not in p2
+    assert "Кэш эмбеддингов" not in p2
+    assert p2.endswith("Вопрос: а ещё что?\n\nОтвет:")
+
+    assert client.delete("/chat/sessions/s1").json()["deleted"] is True
+
+
+def test_history_over_budget_is_summarised_and_prompt_rebuilt():
+    session = Session("s")
+    for i in range(5):
+        answer = f"Ответ {i} достаточно длинный для отдельного предложения. Подробности {i} — второе."
+        session.record(f"вопрос {i}", answer, [f"фрагмент {i}"], [1] * 100)
+
+    session.compact(keep_turns=2, summary_tokens=128)
+
+    assert [t.question for t in session.turns] == ["вопрос 3", "вопрос 4"]
+    assert "вопрос 0" in session.summary and "Подробности 0" not in session.summary
+    assert [text for _, text in session.contexts] == ["фрагмент 3", "фрагмент 4"]
+    assert session.llm_context is None
+
+    prompt, context = build_session_prompt(
+        session, "новый", ["фрагмент 4", "фрагмент 5"], "SYS"
+    )
+    assert context is None
+    assert prompt.startswith("SYS\n\nКраткое содержание предыдущего диалога:")
+    assert (
+        prompt.index("фрагмент 3")
+        < prompt.index("фрагмент 5")
+        < prompt.index("вопрос 3")
+    )
+    assert prompt.count("фрагмент 4") == 1
@@ -0,0 +1,43 @@
+import io
+
+from fastapi.testclient import TestClient
+
+from bench.loadtest import parse_server_timing
+from server.telemetry.timing import begin_request, end_request, stage, stage_timings
+
+
+def test_stages_accumulate_only_inside_request():
+    with stage("outside"):
+        pass
+    assert stage_timings() == {}
+
+    token = begin_request()
+    try:
+        for _ in range(2):
+            with stage("embed"):
+                pass
+        assert list(stage_timings()) == ["embed"]
+    finally:
+        end_request(token)
+    assert stage_timings() == {}
+
+
+def test_responses_carry_server_timing_per_stage():
+    from server.main import app
+
+    client = TestClient(app)
+    content = "# Раздел\n\n" + "Текст про хранение векторов и поиск по индексу. " * 5
+    files = {
+        "file": ("timing.md", io.BytesIO(content.encode("utf-8")), "text/markdown")
+    }
+    ingest = client.post("/ingest", files=files)
+    assert {"chunk", "embed", "total"} <= set(
+        parse_server_timing(ingest.headers["server-timing"])
+    )
+
+    chat = client.post("/chat", json={"question": "как устроен поиск?"})
+    timings = parse_server_timing(chat.headers["server-timing"])
+    assert {"query_embed", "vector_search", "docstore", "pack", "llm", "total"} <= set(
+        timings
+    )
+    assert all(v >= 0 for v in timings.values())
@@ -0,0 +1,56 @@
+import pytest
+from fastapi.testclient import TestClient
+
+pytest.importorskip("opentelemetry.sdk.trace")
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (  # noqa: E402
+    InMemorySpanExporter,
+)
+
+from server.telemetry import tracing  # noqa: E402
+
+
+@pytest.fixture
+def exporter():
+    exp = InMemorySpanExporter()
+    assert tracing.configure_tracing(exp, batch=False)
+    yield exp
+    tracing.disable_tracing()
+
+
+def test_chat_request_has_stage_spans_under_route_span(exporter):
+    from server.main import app
+
+    client = TestClient(app)
+    client.post("/chat", json={"question": "как устроен поиск?"})
+
+    spans = exporter.get_finished_spans()
+    root = next(s for s in spans if s.name == "POST /chat")
+    children = {
+        s.name for s in spans if s.parent and s.parent.span_id == root.context.span_id
+    }
+    assert {"query_embed", "vector_search", "docstore", "llm"} <= children
+
+
+def test_http_metrics_use_route_template():
+    from prometheus_client import REGISTRY
+
+    from server.main import app
+
+    client = TestClient(app)
+    client.delete("/documents/987654")
+
+    def count(route: str) -> float:
+        total = 0.0
+        for metric in REGISTRY.collect():
+            if metric.name != "api_requests":
+                continue
+            for sample in metric.samples:
+                if (
+                    sample.name == "api_requests_total"
+                    and sample.labels["route"] == route
+                ):
+                    total += sample.value
+        return total
+
+    assert count("/documents/{document_id}") >= 1
+    assert count("/documents/987654") == 0
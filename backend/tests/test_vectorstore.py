@@ -0,0 +1,103 @@
+import threading
+
+import numpy as np
+
+from server.services.vectorstore import InMemoryVectorStore, ShardedVectorStore
+
+
+def _store(threshold: float = 0.9) -> InMemoryVectorStore:
+    store = InMemoryVectorStore(dim=3, compact_threshold=threshold)
+    store.upsert(
+        ids=["a", "b", "c", "d"],
+        vectors=[[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0, 0, 1]],
+        payloads=[
+            {"chunk_id": x, "document_id": 1 if x in "ab" else 2} for x in "abcd"
+        ],
+    )
+    return store
+
+
+def test_search_ranks_by_cosine_and_upsert_overwrites():
+    store = _store()
+    hits = store.search([1, 0, 0], top_k=2)
+    assert [p["chunk_id"] for p, _ in hits] == ["a", "b"]
+
+    vecs = store._vecs
+    store.upsert(ids=["a"], vectors=[[0, 0, 2]], payloads=[{"chunk_id": "a"}])
+    assert store.search([0, 0, 1], top_k=1)[0][0]["chunk_id"] in {"a", "d"}
+    assert [p["chunk_id"] for p, _ in store.search([1, 0, 0], top_k=4)].count("a") == 1
+    # перезапись не копирует матрицу: новая версия — новая строка, старая — tombstone
+    assert store._vecs is vecs
+    assert store.stats() == {"rows": 5, "alive": 4, "dead": 1}
+
+
+def test_deleted_points_are_skipped_by_search():
+    store = _store()
+    store.delete(["a", "missing"])
+    hits = store.search([1, 0, 0], top_k=10)
+    assert [p["chunk_id"] for p, _ in hits][0] == "b"
+    assert "a" not in {p["chunk_id"] for p, _ in hits}
+    assert store.stats()["dead"] == 1
+
+    store.delete_by_filter({"document_id": 2})
+    assert [p["chunk_id"] for p, _ in store.search([0, 1, 0], top_k=10)] == ["b"]
+
+
+def test_compaction_reclaims_tombstones():
+    store = _store()
+    store.delete(["a", "c"])
+    assert store.compact() == 2
+    assert store.stats() == {"rows": 2, "alive": 2, "dead": 0}
+    assert {p["chunk_id"] for p, _ in store.search([1, 1, 1], top_k=10)} == {"b", "d"}
+
+    # после компакции старые id можно снова вставить
+    store.upsert(ids=["a"], vectors=[[1, 0, 0]], payloads=[{"chunk_id": "a"}])
+    assert store.search([1, 0, 0], top_k=1)[0][0]["chunk_id"] == "a"
+
+
+def test_upsert_takes_float32_matrix():
+    store = InMemoryVectorStore(dim=3)
+    mat = np.array([[2, 0, 0], [0, 3, 0]], dtype=np.float32)
+    store.upsert(
+        ids=["x", "y"], vectors=mat, payloads=[{"chunk_id": "x"}, {"chunk_id": "y"}]
+    )
+
+    # вход не изменён, а в индексе лежат нормированные строки
+    assert mat[0, 0] == 2
+    hits = store.search(np.array([0, 1, 0], dtype=np.float32), top_k=1)
+    assert hits[0][0]["chunk_id"] == "y" and abs(hits[0][1] - 1.0) < 1e-6
+
+
+def test_sharded_store_matches_single_store():
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(300, 16)).astype(np.float32)
+    ids = [f"p{i}" for i in range(300)]
+    payloads = [{"chunk_id": vid, "document_id": i % 7} for i, vid in enumerate(ids)]
+    single, sharded = InMemoryVectorStore(16), ShardedVectorStore(16, shards=4)
+    for store in (single, sharded):
+        store.upsert(ids, vecs, payloads)
+        store.delete(ids[:10])
+        store.delete_by_filter({"document_id": 3})
+
+    assert sharded.stats()["alive"] == single.stats()["alive"]
+    assert all(shard.stats()["alive"] > 0 for shard in sharded.shards)
+    for q in rng.normal(size=(5, 16)):
+        expected, expected_vecs = single.search_with_vectors(q, top_k=12)
+        got, got_vecs = sharded.search_with_vectors(q, top_k=12)
+        assert [p["chunk_id"] for p, _ in got] == [p["chunk_id"] for p, _ in expected]
+        assert np.allclose([s for _, s in got], [s for _, s in expected], atol=1e-5)
+        assert np.allclose(got_vecs, expected_vecs, atol=1e-6)
+    sharded.close()
+
+
+def test_search_does_not_wait_for_writers():
+    store = _store()
+    result = []
+    # писатель держит блокировку (например, долгий upsert) — поиск идёт по снимку
+    with store._lock:
+        reader = threading.Thread(
+            target=lambda: result.append(store.search([1, 0, 0], top_k=1))
+        )
+        reader.start()
+        reader.join(timeout=5)
+    assert result and result[0][0][0]["chunk_id"] == "a"
@@ -0,0 +1,55 @@
+import threading
+
+from fastapi.testclient import TestClient
+
+from server.services.warmup import Warmup, WarmupStep, reset_warmup
+
+
+def test_readyz_fails_until_warmup_finishes():
+    gate = threading.Event()
+    warmup = Warmup(
+        [
+            WarmupStep("slow", lambda: gate.wait(5)),
+            WarmupStep("optional", lambda: 1 / 0, critical=False),
+            WarmupStep("absent", lambda: False),
+        ]
+    )
+    warmup.start()
+    assert not warmup.ready and warmup.status()["status"] == "warming_up"
+
+    gate.set()
+    assert warmup.wait(5)
+    status = warmup.status()
+    assert warmup.ready and status["status"] == "ready"
+    assert status["components"]["optional"]["state"] == "failed"
+    assert status["components"]["absent"]["state"] == "skipped"
+    assert status["components"]["slow"]["seconds"] >= 0
+
+
+def test_critical_failure_keeps_service_unready():
+    warmup = Warmup([WarmupStep("embeddings", lambda: 1 / 0)])
+    warmup.run()
+    assert warmup.done and not warmup.ready
+    assert warmup.status()["status"] == "failed"
+
+
+def test_lifespan_warms_components_and_readyz_reports_them():
+    from server.main import app
+    from server.services.warmup import get_warmup
+
+    reset_warmup()
+    try:
+        with TestClient(app) as client:
+            assert get_warmup().wait(30)
+            r = client.get("/readyz")
+            assert r.status_code == 200, r.text
+            components = r.json()["components"]
+            assert components["embeddings"]["state"] == "ok"
+            assert components["vectorstore"]["state"] == "ok"
+            assert (
+                components["reranker"]["state"] == "skipped"
+            )  # под pytest реранкера нет
+            metrics = client.get("/metrics").text
+            assert 'warmup_duration_seconds{component="embeddings"}' in metrics
+    finally:
+        reset_warmup()
@@ -0,0 +1,165 @@
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pytest
+
+from server.db.docstore import LocalDocStore
+from server.services.embeddings import HashEmbeddings
+from server.services.indexing import Indexer
+from server.services.ingestion import ingest_many
+from server.services.vectorstore import InMemoryVectorStore
+from server.tasks import batching
+from server.tasks.batching import IngestBatcher
+
+
+class CountingEmbeddings(HashEmbeddings):
+    def __init__(self, dim: int) -> None:
+        super().__init__(dim)
+        self.calls: List[int] = []
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        self.calls.append(len(texts))
+        return super().embed_array(texts)
+
+
+def _document(i: int) -> str:
+    return (
+        f"# Документ {i}\n\n"
+        + f"Раздел {i} описывает батчинг эмбеддингов в воркере. " * 20
+    )
+
+
+def test_concurrent_tasks_share_one_embedding_batch(tmp_path: Path):
+    embed = CountingEmbeddings(64)
+    indexer = Indexer(embed, InMemoryVectorStore(64))
+    docstore = LocalDocStore(str(tmp_path))
+    batcher = IngestBatcher(
+        lambda uploads: ingest_many(uploads, docstore=docstore, indexer=indexer),
+        max_docs=8,
+        max_wait=0.5,
+    )
+    results: List[Dict[str, Any]] = [{} for _ in range(8)]
+
+    def task(i: int) -> None:
+        results[i] = batcher.ingest_one(
+            (f"doc{i}.md", _document(i).encode(), "text/markdown")
+        )
+
+    threads = [threading.Thread(target=task, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    batcher.close()
+
+    assert [r["filename"] for r in results] == [f"doc{i}.md" for i in range(8)]
+    assert all(r["status"] == "created" for r in results)
+    # восемь задач — один вызов модели на все их чанки
+    assert embed.calls == [sum(r["embedded"] for r in results)]
+
+
+def test_batch_failure_is_raised_in_every_task():
+    def broken(uploads):
+        raise RuntimeError("qdrant is down")
+
+    batcher = IngestBatcher(broken, max_docs=4, max_wait=0.2)
+    futures = [batcher.submit((f"{i}.txt", b"text", "text/plain")) for i in range(3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="qdrant is down"):
+            future.result(timeout=5)
+    batcher.close()
+
+
+def test_hung_batch_times_out_and_frees_the_batcher():
+    release = threading.Event()
+
+    def ingest(uploads):
+        if uploads[0][0] == "hang.txt":
+            release.wait(10)
+        return [{"filename": u[0], "status": "created"} for u in uploads]
+
+    batcher = IngestBatcher(ingest, max_docs=1, max_wait=0.0, timeout=0.2)
+    try:
+        with pytest.raises(TimeoutError, match="exceeded"):
+            batcher.ingest_one(("hang.txt", b"text", "text/plain"), timeout=5)
+        # зависший вызов не держит батчер: пачка с другим документом проходит
+        result = batcher.ingest_one(("ok.txt", b"text", "text/plain"), timeout=5)
+        assert result["status"] == "created"
+    finally:
+        release.set()
+        batcher.close()
+
+
+def test_slow_batch_outliving_the_timeout_does_not_overlap_the_same_document():
+    release = threading.Event()
+    finished = threading.Event()
+    active: List[str] = []
+    overlaps: List[str] = []
+    lock = threading.Lock()
+
+    def ingest(uploads):
+        names = [u[0] for u in uploads]
+        with lock:
+            overlaps.extend(n for n in names if n in active)
+            active.extend(names)
+        try:
+            if uploads[0][1] == b"v1":
+                release.wait(10)
+            return [{"filename": n, "status": "created"} for n in names]
+        finally:
+            with lock:
+                for n in names:
+                    active.remove(n)
+            if uploads[0][1] == b"v1":
+                finished.set()
+
+    batcher = IngestBatcher(ingest, max_docs=1, max_wait=0.0, timeout=0.2)
+    try:
+        with pytest.raises(TimeoutError, match="exceeded"):
+            batcher.ingest_one(("slow.txt", b"v1", "text/plain"), timeout=5)
+        # поток первой пачки ещё пишет slow.txt: вторую версию не пускаем рядом с ним
+        with pytest.raises(batching.DocumentBusyError, match="slow.txt"):
+            batcher.ingest_one(("slow.txt", b"v2", "text/plain"), timeout=5)
+        assert (
+            batcher.ingest_one(("other.txt", b"x", "text/plain"), timeout=5)["status"]
+            == "created"
+        )
+
+        release.set()
+        assert finished.wait(5)
+        deadline = time.monotonic() + 5
+        while batcher._busy and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # зомби доработал — документ снова принимается
+        assert (
+            batcher.ingest_one(("slow.txt", b"v2", "text/plain"), timeout=5)["status"]
+            == "created"
+        )
+    finally:
+        release.set()
+        batcher.close()
+    assert overlaps == []
+
+
+def test_celery_task_goes_through_the_batcher(monkeypatch: pytest.MonkeyPatch):
+    from server.tasks.celery_app import celery_app
+    from server.tasks.ingest import ingest_text
+
+    seen = []
+
+    def ingest(uploads):
+        seen.extend(uploads)
+        return [{"document_id": 7, "chunks": 3, "status": "created"} for _ in uploads]
+
+    batcher = IngestBatcher(ingest, max_wait=0.0)
+    monkeypatch.setattr(batching, "_batcher", batcher)
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+
+    out = ingest_text.delay(1, "a.txt", "привет").get(timeout=5)
+
+    assert out == {"ok": True, "doc_id": 7, "chunks": 3}
+    assert seen == [("a.txt", "привет".encode("utf-8"), "text/plain")]
+    batcher.close()
@@ -12,6 +12,22 @@ type ConversationEntry = {
 }
 
 const HISTORY_KEY = 'rag-ui-chat-history'
+const SESSION_KEY = 'rag-ui-chat-session'
+
+// id серверной сессии: уточняющие вопросы идут в тот же диалог
+const sessionId = (): string | undefined => {
+  if (typeof window === 'undefined') return undefined
+  try {
+    let id = window.localStorage.getItem(SESSION_KEY)
+    if (!id) {
+      id = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 10)}`
+      window.localStorage.setItem(SESSION_KEY, id)
+    }
+    return id
+  } catch {
+    return undefined
+  }
+}
 
 const loadHistory = (): ConversationEntry[] => {
   if (typeof window === 'undefined') {
@@ -67,7 +83,11 @@ export default function Chat() {
     ]))
     setQ('')
     try {
-      const { data } = await api.post<ChatResponse>('/chat', { question, top_k: 6 })
+      const { data } = await api.post<ChatResponse>('/chat', {
+        question,
+        top_k: 6,
+        session_id: sessionId()
+      })
       setHistory(prev => prev.map(item => item.id === entryId ? {
         ...item,
         answer: data.answer ?? '',
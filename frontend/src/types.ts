@@ -9,4 +9,5 @@ export type Reference = {
 export type ChatResponse = {
   answer: string;
   references: Reference[];
+  session_id?: string | null;
 };